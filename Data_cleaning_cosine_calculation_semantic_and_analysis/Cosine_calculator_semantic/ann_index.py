@@ -0,0 +1,280 @@
+import os
+import re
+import argparse
+import numpy as np
+import pandas as pd
+
+# Inverted-file (IVF) nearest-neighbour index over the solution and reasoning embeddings, in plain NumPy.
+# Vectors are L2-normalised, so inner product is cosine similarity. A spherical k-means quantizer splits
+# them into nlist cells; a query only scores the vectors of its nprobe closest cells.
+# Each embedding model has its own vector space: build one index per model, never mix MathBERT and mpnet.
+
+# Minimum number of vectors per cell before the quantizer is trained; below that, search is exact
+MIN_POINTS_PER_CELL = 39
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+def _group_top_k(query_ids, item_ids, scores, n_queries, k):
+    """Best k (score, item) pairs per query from flat candidate triplets, as (n_queries, k) arrays padded with -1."""
+    out_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    out_items = np.full((n_queries, k), -1, dtype=np.int64)
+    if len(scores) == 0:
+        return out_scores, out_items
+    order = np.lexsort((-scores, query_ids))
+    query_ids, item_ids, scores = query_ids[order], item_ids[order], scores[order]
+    starts = np.searchsorted(query_ids, query_ids, side="left")
+    rank = np.arange(len(query_ids)) - starts
+    keep = rank < k
+    out_scores[query_ids[keep], rank[keep]] = scores[keep]
+    out_items[query_ids[keep], rank[keep]] = item_ids[keep]
+    return out_scores, out_items
+
+
+class IVFIndex:
+    """
+    Approximate top-k cosine search with metadata filters and incremental inserts.
+
+    Every vector carries a task (e.g. "math"), a model (a reasoning model or "solution") and an item id
+    (uuid / QuestionID). Until enough vectors are added to train the quantizer, search is exact.
+    """
+
+    def __init__(self, dim, nlist=64, nprobe=8, seed=0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = None
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._cells = np.empty(0, dtype=np.int64)
+        self._lists = None
+        self.tasks = np.empty(0, dtype=object)
+        self.models = np.empty(0, dtype=object)
+        self.item_ids = np.empty(0, dtype=object)
+
+    def __len__(self):
+        return len(self._vectors)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors, n_iter=20, max_samples=None):
+        """Spherical k-means on (a sample of) the vectors."""
+        vectors = _normalize(vectors)
+        rng = np.random.default_rng(self.seed)
+        max_samples = max_samples or self.nlist * 256
+        if len(vectors) > max_samples:
+            vectors = vectors[rng.choice(len(vectors), max_samples, replace=False)]
+        nlist = min(self.nlist, len(vectors))
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+        for _ in range(n_iter):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            empty = np.bincount(assign, minlength=nlist) == 0
+            # Re-seed empty cells with random vectors instead of leaving them dead
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            centroids = _normalize(sums)
+        self.centroids = centroids
+        self._cells = self._assign(self._vectors)
+        self._lists = None
+
+    def _assign(self, vectors):
+        if self.centroids is None or len(vectors) == 0:
+            return np.full(len(vectors), -1, dtype=np.int64)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int64)
+
+    def add(self, vectors, tasks, models, item_ids):
+        """Inserts new vectors; the quantizer is trained automatically once there are enough of them."""
+        vectors = _normalize(vectors)
+        n = len(vectors)
+        self._vectors = np.concatenate([self._vectors, vectors])
+        self._cells = np.concatenate([self._cells, self._assign(vectors)])
+        self.tasks = np.concatenate([self.tasks, np.broadcast_to(np.asarray(tasks, dtype=object), (n,))])
+        self.models = np.concatenate([self.models, np.broadcast_to(np.asarray(models, dtype=object), (n,))])
+        self.item_ids = np.concatenate([self.item_ids, np.asarray(item_ids, dtype=object)])
+        self._lists = None
+        if not self.is_trained and len(self) >= self.nlist * MIN_POINTS_PER_CELL:
+            self.train(self._vectors)
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            order = np.argsort(self._cells, kind="stable")
+            bounds = np.searchsorted(self._cells[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+        return self._lists
+
+    def _allowed(self, task=None, model=None):
+        allowed = np.ones(len(self), dtype=bool)
+        if task is not None:
+            allowed &= np.isin(self.tasks, np.atleast_1d(task))
+        if model is not None:
+            allowed &= np.isin(self.models, np.atleast_1d(model))
+        return allowed
+
+    def search(self, queries, k=10, task=None, model=None, nprobe=None):
+        """
+        Top-k most similar stored vectors for every query, optionally restricted to some tasks/models.
+        Returns (scores, positions), both of shape (n_queries, k); missing results have position -1.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        allowed = self._allowed(task, model)
+
+        if not self.is_trained:
+            candidates = np.flatnonzero(allowed)
+            scores = queries @ self._vectors[candidates].T
+            query_ids = np.repeat(np.arange(len(queries)), len(candidates))
+            return _group_top_k(query_ids, np.tile(candidates, len(queries)), scores.ravel(), len(queries), k)
+
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        lists = self._inverted_lists()
+        query_parts, item_parts, score_parts = [], [], []
+        # Score cell by cell: every query probing a cell is handled in a single matrix product
+        for cell in np.unique(probes):
+            members = lists[cell]
+            members = members[allowed[members]]
+            if len(members) == 0:
+                continue
+            cell_queries = np.flatnonzero((probes == cell).any(axis=1))
+            scores = queries[cell_queries] @ self._vectors[members].T
+            query_parts.append(np.repeat(cell_queries, len(members)))
+            item_parts.append(np.tile(members, len(cell_queries)))
+            score_parts.append(scores.ravel())
+        if not score_parts:
+            return _group_top_k(np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32), len(queries), k)
+        return _group_top_k(
+            np.concatenate(query_parts), np.concatenate(item_parts), np.concatenate(score_parts), len(queries), k
+        )
+
+    def metadata(self, positions):
+        # An empty selection comes as an object array, which cannot index
+        positions = np.asarray(positions, dtype=np.int64)
+        return pd.DataFrame({
+            "task": self.tasks[positions],
+            "model": self.models[positions],
+            "item_id": self.item_ids[positions],
+        })
+
+    def near_duplicates(self, threshold=0.95, k=5, task=None, model=None, batch_size=1024):
+        """
+        Pairs of stored vectors with cosine similarity >= threshold (each pair reported once). With task and/or
+        model both sides of every pair belong to them: only the matching vectors are queried and returned.
+        """
+        rows = []
+        queries = np.flatnonzero(self._allowed(task, model))
+        for start in range(0, len(queries), batch_size):
+            positions = queries[start:start + batch_size]
+            # One extra neighbour, because every vector finds itself first
+            scores, neighbours = self.search(self._vectors[positions], k + 1, task=task, model=model)
+            for i, pos in enumerate(positions):
+                for score, other in zip(scores[i], neighbours[i]):
+                    if other >= 0 and other != pos and score >= threshold:
+                        rows.append((min(pos, other), max(pos, other), float(score)))
+        pairs = pd.DataFrame(rows, columns=["left", "right", "cosine"]).drop_duplicates(["left", "right"])
+        pairs = pairs.reset_index(drop=True).astype({"left": np.int64, "right": np.int64, "cosine": float})
+        left = self.metadata(pairs["left"]).add_prefix("left_")
+        right = self.metadata(pairs["right"]).add_prefix("right_")
+        return pd.concat([left, right, pairs[["cosine"]]], axis=1).sort_values("cosine", ascending=False)
+
+    def save(self, path):
+        # Through a file handle, so that np.savez does not append ".npz" to the path
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                params=np.array([self.dim, self.nlist, self.nprobe, self.seed]),
+                centroids=self.centroids if self.is_trained else np.empty((0, self.dim), dtype=np.float32),
+                vectors=self._vectors,
+                cells=self._cells,
+                tasks=self.tasks.astype(str),
+                models=self.models.astype(str),
+                item_ids=self.item_ids.astype(str),
+            )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        dim, nlist, nprobe, seed = (int(x) for x in data["params"])
+        index = cls(dim, nlist, nprobe, seed)
+        index.centroids = data["centroids"] if len(data["centroids"]) else None
+        index._vectors = data["vectors"]
+        index._cells = data["cells"]
+        index.tasks = data["tasks"].astype(object)
+        index.models = data["models"].astype(object)
+        index.item_ids = data["item_ids"].astype(object)
+        return index
+
+
+def task_name(input_csv):
+    return re.sub(r"_analysis$", "", os.path.splitext(os.path.basename(input_csv))[0])
+
+def vectors_from_store(df, store, task):
+    """Stored embeddings of the solution and every reasoning column of an NLP_analysis table, with metadata."""
+    from cosine_similarity_calculator import REASONING_MODELS, find_solution_column, safe_strip
+
+    id_col = "uuid" if "uuid" in df.columns else "QuestionID" if "QuestionID" in df.columns else None
+    item_ids = df[id_col].astype(str).values if id_col else df.index.astype(str).values
+    columns = {"solution": find_solution_column(df)}
+    columns.update({m: f"{m}_reasoning" for m in REASONING_MODELS if f"{m}_reasoning" in df.columns})
+
+    vectors, models, ids = [], [], []
+    for model_name, col in columns.items():
+        keep = np.array([bool(safe_strip(t)) for t in df[col]])
+        embeddings, found = store.get(list(df[col][keep]))
+        vectors.append(embeddings[found])
+        models.extend([model_name] * int(found.sum()))
+        ids.extend(item_ids[keep][found])
+    if not models:
+        raise ValueError(f"No stored embeddings for the {task} table: embed it first with cosine_similarity_calculator.py, "
+                         "using the same --embedding_model, --backend, --max_tokens and --stride.")
+    return np.concatenate(vectors), task, models, ids
+
+def main():
+    from cosine_similarity_calculator import DEFAULT_STORE_DIR, BACKENDS, open_store, chunking_config
+
+    parser = argparse.ArgumentParser(description="Build an IVF index from stored embeddings and list near-duplicate answers.")
+    parser.add_argument('--inputs', nargs='+', required=True, help='NLP_analysis CSV files embedded with the same model')
+    parser.add_argument('--embedding_model', required=True, help='Hugging Face model name used for the embeddings')
+    parser.add_argument('--backend', default='eager', choices=BACKENDS, help='Inference backend the embeddings were computed with')
+    parser.add_argument('--max_tokens', type=int, default=512, help='Chunk length in tokens the embeddings were computed with')
+    parser.add_argument('--stride', type=int, default=0, help='Chunk stride the embeddings were computed with')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='Embedding store directory')
+    parser.add_argument('--index', default=None, help='Index file to update (created if missing)')
+    parser.add_argument('--nlist', type=int, default=64, help='Number of IVF cells')
+    parser.add_argument('--nprobe', type=int, default=8, help='Cells scanned per query')
+    parser.add_argument('--near_duplicates', type=float, default=None, metavar='THRESHOLD', help='Write pairs above this cosine to CSV')
+    parser.add_argument('--task', nargs='+', default=None, help='Only list near-duplicate pairs within these tasks')
+    parser.add_argument('--model', nargs='+', default=None, help='Only list near-duplicate pairs within these models (or solution)')
+    parser.add_argument('--output', default='near_duplicates.csv', help='Output CSV for near-duplicate pairs')
+    args = parser.parse_args()
+
+    # The store key depends on the backend and the chunking: they must match the run that filled the store
+    store = open_store(args.store, args.embedding_model, chunking=chunking_config(args.max_tokens, args.stride),
+                       backend=args.backend)
+    index = IVFIndex.load(args.index) if args.index and os.path.exists(args.index) else None
+    for input_csv in args.inputs:
+        vectors, task, models, ids = vectors_from_store(pd.read_csv(input_csv), store, task_name(input_csv))
+        if index is None:
+            index = IVFIndex(vectors.shape[1], args.nlist, args.nprobe)
+        elif vectors.shape[1] != index.dim:
+            raise ValueError(f"{input_csv}: embeddings of dimension {vectors.shape[1]}, the index holds dimension {index.dim}.")
+        # Only insert what the index does not hold yet, so new model answers can be added incrementally
+        known = set(zip(index.tasks[index.tasks == task], index.models[index.tasks == task], index.item_ids[index.tasks == task]))
+        new = np.array([(task, m, i) not in known for m, i in zip(models, ids)], dtype=bool)
+        index.add(vectors[new], task, np.asarray(models, dtype=object)[new], np.asarray(ids, dtype=object)[new])
+        print(f"{input_csv}: {int(new.sum())} vectors added, {len(index)} in index")
+
+    if args.index:
+        index.save(args.index)
+    if args.near_duplicates is not None:
+        pairs = index.near_duplicates(args.near_duplicates, task=args.task, model=args.model)
+        pairs.to_csv(args.output, index=False)
+        print(f"{len(pairs)} near-duplicate pairs saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
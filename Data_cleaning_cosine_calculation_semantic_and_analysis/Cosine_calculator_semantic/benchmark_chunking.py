@@ -0,0 +1,65 @@
+import time
+import argparse
+import pandas as pd
+from transformers import AutoTokenizer
+from cosine_similarity_calculator import REASONING_MODELS, chunk_text, safe_strip
+
+# Compares the tokenization cost of the old string round-trip chunking with the token-id chunking
+# used by cosine_similarity_calculator.py, on the longest reasoning traces of an NLP_analysis file.
+
+
+def legacy_chunk_strings(text, tokenizer, max_tokens=512):
+    tokens = tokenizer.tokenize(text)
+    chunks = [tokens[i:i + max_tokens] for i in range(0, len(tokens), max_tokens)]
+    return [tokenizer.convert_tokens_to_string(chunk) for chunk in chunks]
+
+def legacy_chunk_and_encode(text, tokenizer, max_tokens=512):
+    # Previous behaviour: tokenize, slice, turn tokens back into strings, then tokenize every chunk again
+    return [tokenizer(chunk, truncation=True, max_length=max_tokens)["input_ids"]
+            for chunk in legacy_chunk_strings(text, tokenizer, max_tokens)]
+
+def legacy_truncated(text, tokenizer, max_tokens=512):
+    """Chunks of the string round-trip longer than max_tokens once re-tokenized, which truncation then cut."""
+    return sum(1 for chunk in legacy_chunk_strings(text, tokenizer, max_tokens)
+               if len(tokenizer(chunk)["input_ids"]) > max_tokens)
+
+def time_it(fn, texts, repeats):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = [fn(text) for text in texts]
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark token-id chunking against the string round-trip.")
+    parser.add_argument('--input', required=True, help='Path to an NLP_analysis CSV file')
+    parser.add_argument('--embedding_model', required=True, help='Hugging Face model name')
+    parser.add_argument('--n_texts', type=int, default=200, help='Number of longest reasoning traces to use')
+    parser.add_argument('--repeats', type=int, default=3, help='Repetitions, the best time is reported')
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.embedding_model)
+    df = pd.read_csv(args.input)
+    texts = []
+    for model_name in REASONING_MODELS:
+        col = f"{model_name}_reasoning"
+        if col in df.columns:
+            texts.extend(t for t in df[col] if safe_strip(t))
+    texts = sorted(set(texts), key=len, reverse=True)[:args.n_texts]
+    print(f"Benchmarking {len(texts)} reasoning traces, {sum(map(len, texts))} characters in total")
+
+    legacy_time, legacy_chunks = time_it(lambda t: legacy_chunk_and_encode(t, tokenizer), texts, args.repeats)
+    new_time, new_chunks = time_it(lambda t: chunk_text(t, tokenizer), texts, args.repeats)
+
+    n_legacy = sum(len(c) for c in legacy_chunks)
+    n_new = sum(len(c) for c in new_chunks)
+    # Counted outside the timed runs: a chunk of exactly 512 ids may never have been cut
+    truncated = sum(legacy_truncated(t, tokenizer) for t in texts)
+    print(f"String round-trip: {legacy_time:.3f}s, {n_legacy} chunks, {truncated} chunks cut to the 512-token limit on re-tokenization")
+    print(f"Token-id chunking: {new_time:.3f}s, {n_new} chunks")
+    print(f"Speed-up: {legacy_time / new_time:.2f}x, {legacy_time - new_time:.3f}s saved")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 import os
-import subprocess
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import cosine_similarity_calculator as csc
+from cosine_similarity_calculator import instrumentation
 
-os.chdir(os.path.expanduser("~"))
-
-INPUT_DIR = "NLP_analysis"
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUT_DIR = os.path.join(BASE_DIR, "NLP_analysis")
+BERTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "berts.txt")
 
 EMBEDDING_MAP = {
     "math_analysis.csv": "MathBERT",
@@ -13,21 +18,147 @@ EMBEDDING_MAP = {
     "reading_comprehension_analysis.csv": "SBERT"
 }
 
-with open("cosine_calculator_semantic/berts.txt", "r") as f:
-    bert_models = [line.strip() for line in f if line.strip()]
+# Rough peak memory of one file in flight, as a multiple of its CSV size (dataframe, texts, embeddings, output)
+MEMORY_PER_CSV_BYTE = 4
+
+
+def load_bert_models():
+    with open(BERTS_FILE, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def group_files_by_model(input_dir):
+    """Groups the input files by the embedding model they need, so that every model is loaded once."""
+    bert_models = load_bert_models()
+    groups = {}
+    for input_csv, embedding_type in EMBEDDING_MAP.items():
+        if embedding_type == "MathBERT":
+            embedding_model = bert_models[0]
+        else:
+            embedding_model = bert_models[1]
+        groups.setdefault(embedding_model, []).append(os.path.join(input_dir, input_csv))
+    return groups
 
-for input_csv, embedding_type in EMBEDDING_MAP.items():
-    if embedding_type == "MathBERT":
-        embedding_model = bert_models[0] 
+def available_memory():
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def concurrent_files(input_paths, max_jobs):
+    """
+    Number of files to process at the same time: at most max_jobs, reduced when the
+    estimated memory of the largest files in flight would not fit in the available memory.
+    """
+    free = available_memory()
+    if free is None or max_jobs <= 1:
+        return max(1, max_jobs)
+    sizes = sorted((os.path.getsize(p) for p in input_paths if os.path.exists(p)), reverse=True)
+    jobs = max_jobs
+    while jobs > 1 and sum(sizes[:jobs]) * MEMORY_PER_CSV_BYTE > free:
+        jobs -= 1
+    return jobs
+
+def process_file(input_csv, tokenizer, model, device, store, pool=None, chunksize=None, chunking=csc.CHUNKING,
+                 token_budget=csc.TOKEN_BUDGET, matrices=False):
+    """One file as cosine_similarity_calculator.py would process it with the same options."""
+    start = time.perf_counter()
+    output_csv = os.path.splitext(input_csv)[0] + "_cosine.csv"
+    kwargs = dict(store=store, chunking=chunking, pool=pool, token_budget=token_budget)
+    if chunksize:
+        csc.stream_similarity_table(input_csv, output_csv, tokenizer, model, device, chunksize=chunksize, matrices=matrices,
+                                    **kwargs)
     else:
-        embedding_model = bert_models[1]  
+        with instrumentation.span("io", file=os.path.basename(input_csv)):
+            df = pd.read_csv(input_csv)
+        embedded = csc.embed_table(df, tokenizer, model, device, **kwargs)
+        output_df = csc.similarity_table(df, input_csv, *embedded)
+        with instrumentation.span("io", file=os.path.basename(input_csv)):
+            output_df.to_csv(output_csv, index=False)
+            if matrices:
+                csc.write_similarity_matrices(input_csv, [csc.agreement_matrices(df, *embedded)])
+    return output_csv, time.perf_counter() - start
+
+def run(input_dir=INPUT_DIR, max_jobs=2, store_dir=csc.DEFAULT_STORE_DIR, backend="eager", workers=1, threads_per_worker=None,
+        chunksize=None, chunking=csc.CHUNKING, token_budget=csc.TOKEN_BUDGET, matrices=False, store_dtype="float32"):
+    total_start = time.perf_counter()
+    timings = []
+
+    for embedding_model, input_paths in group_files_by_model(input_dir).items():
+        for p in input_paths:
+            if not os.path.exists(p):
+                print(f"Skipping missing file {p}")
+        input_paths = [p for p in input_paths if os.path.exists(p)]
+        if not input_paths:
+            continue
+
+        load_start = time.perf_counter()
+        with instrumentation.span("load", embedding_model=embedding_model):
+            if workers > 1:
+                # The worker processes hold the model: files only share the pool
+                tokenizer, model, device = None, None, None
+                pool = csc.EmbeddingPool(embedding_model, backend, workers, threads_per_worker, chunking, token_budget)
+            else:
+                tokenizer, model, device = csc.load_embedding_model(embedding_model, backend)
+                pool = None
+            # Same key as cosine_similarity_calculator.py run with these options, so both share the stored embeddings
+            store = csc.open_store(store_dir, embedding_model, store_dtype, chunking, backend)
+        load_time = time.perf_counter() - load_start
+        print(f"Loaded {embedding_model} in {load_time:.1f}s")
+        timings.append({"file": "(model load)", "embedding_model": embedding_model, "seconds": load_time})
+
+        jobs = concurrent_files(input_paths, max_jobs)
+        print(f"Processing {len(input_paths)} files with model {embedding_model} ({jobs} at a time)")
+        # Torch releases the GIL during inference, so files sharing the model can run in threads
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                p: executor.submit(process_file, p, tokenizer, model, device, store, pool, chunksize, chunking, token_budget,
+                                   matrices)
+                for p in input_paths
+            }
+            for input_csv, future in futures.items():
+                with instrumentation.span("queue_wait", target="files"):
+                    output_csv, seconds = future.result()
+                instrumentation.count("files", embedding_model=embedding_model)
+                print(f"Processed {os.path.basename(input_csv)} in {seconds:.1f}s -> {output_csv}")
+                timings.append({"file": os.path.basename(input_csv), "embedding_model": embedding_model, "seconds": seconds})
+
+        if pool is not None:
+            pool.close()
+        del tokenizer, model
+
+    total_time = time.perf_counter() - total_start
+    timings.append({"file": "(total)", "embedding_model": "", "seconds": total_time})
+    timings_df = pd.DataFrame(timings)
+    print("\nTimings:")
+    print(timings_df.to_string(index=False, float_format=lambda x: f"{x:.1f}"))
+    return timings_df
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute semantic cosine similarities for every NLP_analysis file in one process.")
+    parser.add_argument('--input_dir', default=INPUT_DIR, help='Folder containing the *_analysis.csv files')
+    parser.add_argument('--jobs', type=int, default=2, help='Maximum number of files sharing a model processed concurrently')
+    parser.add_argument('--store', default=csc.DEFAULT_STORE_DIR, help='Embedding store directory, reused across runs')
+    parser.add_argument('--backend', default='eager', choices=csc.BACKENDS, help='Inference backend: eager fp32, dynamic int8 or ONNX Runtime')
+    parser.add_argument('--workers', type=int, default=1, help='Number of embedding worker processes per model (1 = embed in this process)')
+    parser.add_argument('--threads_per_worker', type=int, default=None, help='Torch threads per worker process (default: cores / workers)')
+    parser.add_argument('--token_budget', type=int, default=csc.TOKEN_BUDGET, help='Maximum padded tokens per forward pass')
+    parser.add_argument('--max_tokens', type=int, default=512, help='Chunk length in tokens, special tokens included')
+    parser.add_argument('--stride', type=int, default=0, help='Number of tokens shared by consecutive chunks')
+    parser.add_argument('--matrices', action='store_true', help='Also write solution + model cosine matrices for every question')
+    parser.add_argument('--stream', action='store_true', help='Stream every file in chunks with resumable checkpoints')
+    parser.add_argument('--chunksize', type=int, default=2000, help='Rows per chunk in streaming mode')
+    parser.add_argument('--no_store', action='store_true', help='Do not read or write the embedding store')
+    parser.add_argument('--store_dtype', default='float32', choices=['float32', 'float16'], help='Dtype of newly created stores')
+    parser.add_argument('--metrics_dir', default=None, help='Directory for timing metrics: JSONL events and a Prometheus text file')
+    parser.add_argument('--profile', default=None, choices=instrumentation.PROFILERS, help='With --metrics_dir, also profile the run')
+    args = parser.parse_args()
 
-    print(f"Processing {input_csv} with model {embedding_model}")
+    if args.metrics_dir:
+        instrumentation.configure(args.metrics_dir, "cosine_calculator", profile=args.profile, backend=args.backend)
 
-    cmd = [
-        "python", "cosine_calculator_semantic/cosine_similarity_calculator.py",
-        "--input", os.path.join(INPUT_DIR, input_csv),
-        "--embedding_model", embedding_model,
-    ]
+    run(args.input_dir, args.jobs, None if args.no_store else args.store, args.backend, args.workers, args.threads_per_worker,
+        args.chunksize if args.stream else None, csc.chunking_config(args.max_tokens, args.stride), args.token_budget,
+        args.matrices, args.store_dtype)
 
-    subprocess.run(cmd, check=True)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
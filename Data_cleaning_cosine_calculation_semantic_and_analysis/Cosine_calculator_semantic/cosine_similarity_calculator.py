@@ -1,64 +1,177 @@
 import os
+import sys
+import json
+import time
 import argparse
-import torch
-import torch.nn.functional as F
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from transformers import AutoTokenizer, AutoModel
+from embedding_store import EmbeddingStore
+from embedding_backends import BACKENDS, load_backend, store_model_key
+from parallel_embedding import EmbeddingPool
 
-# Parse the command line arguments 
-parser = argparse.ArgumentParser()
-parser.add_argument('--input', required=True, help='Path to input CSV file')
-parser.add_argument('--embedding_model', required=True, help='Hugging Face model name')
-args = parser.parse_args()
+# instrumentation.py lives in scripts/ and is shared with the generators and the judge
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "scripts"))
+import instrumentation
 
-INPUT_CSV = args.input
-EMBEDDING_MODEL_NAME = args.embedding_model
-OUTPUT_CSV = os.path.splitext(INPUT_CSV)[0] + "_cosine.csv"
 REASONING_MODELS = ["deepseek-r1:1.5b", "deepseek-r1:14b", "qwen2.5:1.5b", "qwen2.5:14b"]
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "embedding_store")
+# Describe how embeddings are produced, so that the embedding store never mixes vectors from different setups
+POOLING = "cls_mean"
+CHUNKING = {"method": "token_ids", "max_tokens": 512, "stride": 0}
+# Maximum number of (padded) tokens per forward pass: 32 full 512-token chunks, or many more short ones
+TOKEN_BUDGET = 16384
 
 
-# Load the embedding model and tokenizer correpsponding to the provided model name
-tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
-model = AutoModel.from_pretrained(EMBEDDING_MODEL_NAME)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = model.to(device).eval()
-
-#  Load the input csv file, containing the texts to compare
-df = pd.read_csv(INPUT_CSV)
-solution_candidates = [col for col in df.columns if col.lower() == "solution"]
-if not solution_candidates:
-    raise ValueError("No 'solution' column found (case-insensitive).")
-SOLUTION_COL = solution_candidates[0]
-similarity_data = {}
-
-# Add the corresponding id columns and, for math and proofs, the problem type
-id_col = "uuid" if "uuid" in df.columns else "QuestionID" if "QuestionID" in df.columns else None
-if id_col:
-    similarity_data[id_col] = df[id_col].reset_index(drop=True)
-if ("math" in INPUT_CSV.lower() or "proofs" in INPUT_CSV.lower()) and "problem_type" in df.columns:
-    similarity_data["problem_type"] = df["problem_type"].reset_index(drop=True)
-
-# Function to chunk text into smaller parts for embedding: some text matches may exceed the model's max token limit
-def chunk_text(text, max_tokens=512):
-    tokens = tokenizer.tokenize(text)
-    chunks = [tokens[i:i + max_tokens] for i in range(0, len(tokens), max_tokens)]
-    return [tokenizer.convert_tokens_to_string(chunk) for chunk in chunks]
-
-def get_embedding(text_or_chunks):
-    if isinstance(text_or_chunks, str):
-        text_or_chunks = [text_or_chunks]
-
-    embeddings = []
-    for chunk in text_or_chunks:
-        inputs = tokenizer(chunk, return_tensors="pt", truncation=True, max_length=512)
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        with torch.no_grad():
-            outputs = model(**inputs)
-        emb = outputs.last_hidden_state[:, 0, :]
-        embeddings.append(emb)
-    embeddings = torch.cat(embeddings, dim=0)
-    return embeddings.mean(dim=0, keepdim=True)
+# Load the embedding model and tokenizer correpsponding to the provided model name, with the chosen inference backend.
+# torch and transformers are imported where they are first needed, so --help and the quick checks start fast
+def load_embedding_model(embedding_model_name, backend="eager"):
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(embedding_model_name)
+    model, device = load_backend(embedding_model_name, backend)
+    return tokenizer, model, device
+
+def special_tokens(tokenizer):
+    """
+    Ids the tokenizer adds before and after a single sequence ([CLS]/[SEP] for MathBERT, <s>/</s> for mpnet),
+    found by encoding a probe text with and without special tokens.
+    """
+    if tokenizer not in _special_tokens_cache:
+        plain = tokenizer("a", add_special_tokens=False)["input_ids"]
+        full = tokenizer("a", add_special_tokens=True)["input_ids"]
+        start = next(i for i in range(len(full)) if full[i:i + len(plain)] == plain)
+        _special_tokens_cache[tokenizer] = (full[:start], full[start + len(plain):])
+    return _special_tokens_cache[tokenizer]
+
+_special_tokens_cache = {}
+
+# Function to chunk text into smaller parts for embedding: some text matches may exceed the model's max token limit.
+# The text is tokenized once and split on token ids, so chunk lengths are exact and nothing is re-tokenized.
+def chunk_text(text, tokenizer, max_tokens=512, stride=0):
+    ids = tokenizer(text, add_special_tokens=False, return_attention_mask=False, verbose=False)["input_ids"]
+    if not ids:
+        return []
+
+    # Leave room for the special tokens added around every chunk
+    prefix, suffix = special_tokens(tokenizer)
+    body = max_tokens - len(prefix) - len(suffix)
+    if stride < 0 or stride >= body:
+        raise ValueError(f"stride must be in [0, {body}), got {stride}.")
+
+    chunks = []
+    start = 0
+    while True:
+        chunks.append(prefix + ids[start:start + body] + suffix)
+        if start + body >= len(ids):
+            break
+        start += body - stride
+    return chunks
+
+def rss_mb():
+    """Current resident memory of the process in MB, NaN where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return float("nan")
+
+def batch_memory(device, rss_before):
+    """
+    (stats key, MB) of the memory one batch took: on GPU the peak allocated since the counter was reset before
+    the batch, on CPU the resident memory the forward pass added, measured while its outputs are still alive.
+    """
+    if device is not None and device.type == "cuda":
+        import torch
+        return "gpu_peak_mb", torch.cuda.max_memory_allocated(device) / 2**20
+    return "rss_growth_mb", rss_mb() - rss_before
+
+def build_batches(lengths, token_budget=TOKEN_BUDGET):
+    """
+    Sorts chunks by length and groups them so that batch size x longest chunk stays within the token budget.
+    Returns lists of chunk positions; similar lengths end up together, so little of each batch is padding.
+    """
+    batches, current = [], []
+    for j in sorted(range(len(lengths)), key=lambda j: lengths[j]):
+        # Lengths are ascending, so the new chunk is the longest of the batch it joins
+        if current and (len(current) + 1) * lengths[j] > token_budget:
+            batches.append(current)
+            current = []
+        current.append(j)
+    if current:
+        batches.append(current)
+    return batches
+
+def embed_batches(texts, tokenizer, model, device, chunking=CHUNKING, token_budget=TOKEN_BUDGET):
+    """
+    Embeds texts by chunking all of them, batching the chunks by length under a token budget and averaging
+    the [CLS] vectors of each text's chunks back in the original order. Texts whose chunks fail are NaN rows.
+    Also returns one stats dict per batch (size, real and padded tokens, memory taken by the batch).
+    """
+    import torch
+
+    hidden_size = model.config.hidden_size
+    chunks, owners = [], []
+    with instrumentation.span("tokenize"):
+        for i, text in enumerate(texts):
+            for ids in chunk_text(text, tokenizer, chunking["max_tokens"], chunking["stride"]):
+                chunks.append(ids)
+                owners.append(i)
+    owners = np.asarray(owners, dtype=np.int64)
+
+    sums = np.zeros((len(texts), hidden_size), dtype=np.float64)
+    counts = np.zeros(len(texts), dtype=np.int64)
+    failed = np.zeros(len(texts), dtype=bool)
+    stats = []
+    for batch in build_batches([len(c) for c in chunks], token_budget):
+        batch_owners = owners[batch]
+        if device is not None and device.type == "cuda":
+            torch.cuda.reset_peak_memory_stats(device)
+        rss_before = rss_mb()
+        try:
+            inputs = tokenizer.pad({"input_ids": [chunks[j] for j in batch]}, return_tensors="pt")
+            inputs = {k: v.to(device) for k, v in inputs.items()}
+            with instrumentation.span("infer"), torch.no_grad():
+                outputs = model(**inputs)
+            memory_key, memory_mb = batch_memory(device, rss_before)
+            cls = outputs.last_hidden_state[:, 0, :].float().cpu().numpy()
+            np.add.at(sums, batch_owners, cls)
+            np.add.at(counts, batch_owners, 1)
+        except Exception as e:
+            print(f"Error embedding a batch of {len(batch)} chunks: {e}")
+            instrumentation.count("failed_batches")
+            failed[batch_owners] = True
+            continue
+        real_tokens = sum(len(chunks[j]) for j in batch)
+        instrumentation.count("embedded_chunks", len(batch))
+        instrumentation.count("padded_tokens", len(batch) * len(chunks[batch[-1]]) - real_tokens)
+        stats.append({
+            "chunks": len(batch),
+            "max_len": len(chunks[batch[-1]]),
+            "real_tokens": real_tokens,
+            "padded_tokens": len(batch) * len(chunks[batch[-1]]),
+            memory_key: memory_mb,
+        })
+
+    embeddings = np.full((len(texts), hidden_size), np.nan, dtype=np.float32)
+    ok = (counts > 0) & ~failed
+    embeddings[ok] = (sums[ok] / counts[ok, None]).astype(np.float32)
+    return embeddings, stats
+
+def report_batches(stats):
+    if not stats:
+        return
+    stats_df = pd.DataFrame(stats)
+    efficiency = stats_df["real_tokens"].sum() / stats_df["padded_tokens"].sum()
+    if "gpu_peak_mb" in stats_df.columns:
+        memory = f"largest GPU peak of a batch: {stats_df['gpu_peak_mb'].max():.0f} MB"
+    else:
+        memory = f"largest RSS growth of a batch: {stats_df['rss_growth_mb'].max():.0f} MB"
+    print(
+        f"Batches: {len(stats_df)}, chunks: {stats_df['chunks'].sum()}, "
+        f"padding efficiency: {efficiency:.1%}, {memory}"
+    )
+    return stats_df
 
 def safe_strip(x):
     if isinstance(x, str):
@@ -66,43 +179,392 @@ def safe_strip(x):
     else:
         return ""
 
+def normalize_rows(matrix):
+    """
+    L2-normalises every row of a 2-D array. Rows with zero norm or NaN values become NaN,
+    so that any similarity computed from them is NaN as well.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normalized = matrix / norms
+    normalized[~np.isfinite(norms[:, 0]) | (norms[:, 0] == 0)] = np.nan
+    return normalized
 
-# Main loop to calculate cosine similarity for each reasoning model answer against the solution
-for model_name in tqdm(REASONING_MODELS, desc="Processing models"):
-    cosine_values = []
+def rowwise_cosine(normalized, left_idx, right_idx):
+    """
+    Cosine similarity between the rows left_idx[i] and right_idx[i] of an already
+    normalised embedding matrix. A negative index marks a missing text and yields NaN.
+    """
+    left_idx = np.asarray(left_idx, dtype=np.int64)
+    right_idx = np.asarray(right_idx, dtype=np.int64)
+    valid = (left_idx >= 0) & (right_idx >= 0)
+    sims = np.full(len(left_idx), np.nan, dtype=np.float64)
+    if valid.any():
+        left = normalized[left_idx[valid]]
+        right = normalized[right_idx[valid]]
+        sims[valid] = np.einsum("ij,ij->i", left, right)
+    return sims
 
-    for i, row in df.iterrows():
-        if i % 100 == 0:
-            print(f"Processing row {i} for model {model_name}")
-            
-        reasoning_text = row.get(f"{model_name}_reasoning", "")
-        solution_text = row.get(SOLUTION_COL, "")
+def find_solution_column(df):
+    solution_candidates = [col for col in df.columns if col.lower() == "solution"]
+    if not solution_candidates:
+        raise ValueError("No 'solution' column found (case-insensitive).")
+    return solution_candidates[0]
 
-        if not safe_strip(reasoning_text) or not safe_strip(solution_text):
-            cosine_values.append(float("nan"))
-            continue    
+def collect_texts(df, solution_col):
+    """
+    Maps every distinct non-empty solution/reasoning text in the dataframe to a row of the
+    embedding matrix, and returns the per-column index arrays (-1 where the text is empty).
+    """
+    text_index = {}
+    column_indices = {}
+    columns = [solution_col] + [f"{model_name}_reasoning" for model_name in REASONING_MODELS]
+    for col in columns:
+        values = df[col] if col in df.columns else pd.Series([""] * len(df))
+        indices = np.full(len(df), -1, dtype=np.int64)
+        for i, text in enumerate(values):
+            if not safe_strip(text):
+                continue
+            if text not in text_index:
+                text_index[text] = len(text_index)
+            indices[i] = text_index[text]
+        column_indices[col] = indices
+    return list(text_index), column_indices
 
-        try:
-            emb_reasoning = get_embedding(chunk_text(reasoning_text))
-            emb_solution = get_embedding(chunk_text(solution_text))
-
-            if torch.isnan(emb_reasoning).any() or torch.isnan(emb_solution).any():
-                print(f"NaN detected at row {i}, model {model_name}")
-                sim = float("nan")
-            else:
-                sim = F.cosine_similarity(emb_reasoning, emb_solution).item()
-        except Exception as e:
-            print(f"Error at row {i}, model {model_name}: {e}")
-            sim = float("nan")
+def embed_texts(texts, tokenizer, model, device, store=None, chunking=CHUNKING, flush_every=1024, pool=None,
+                token_budget=TOKEN_BUDGET):
+    """
+    Embeds every text once. Texts already in the embedding store are read back instead of
+    recomputed, and new embeddings are appended to it. Texts whose embedding fails are left as NaN rows.
+    With an EmbeddingPool the texts are embedded by its worker processes instead of the local model.
+    """
+    hidden_size = pool.hidden_size if pool is not None else model.config.hidden_size
+    embeddings = np.full((len(texts), hidden_size), np.nan, dtype=np.float32)
+    todo = list(range(len(texts)))
+    if store is not None:
+        with instrumentation.span("io", target="store"):
+            cached, found = store.get(texts)
+        instrumentation.count("store_hits", int(found.sum()))
+        if found.any():
+            embeddings[found] = cached[found]
+        todo = [i for i in todo if not found[i]]
+        print(f"Embedding store: {int(found.sum())} cached, {len(todo)} to compute")
+
+    if pool is not None:
+        block = flush_every * pool.workers
+        for start in tqdm(range(0, len(todo), block), desc="Embedding unique texts (blocks)"):
+            indices = todo[start:start + block]
+            # The workers tokenize and infer: from here the block is one wait on the pool's queue
+            with instrumentation.span("queue_wait", target="pool"):
+                embeddings[indices] = pool.embed([texts[i] for i in indices])
+            instrumentation.count("embedded_texts", len(indices))
+            if store is not None:
+                with instrumentation.span("io", target="store"):
+                    store.add([texts[i] for i in indices], embeddings[indices])
+        return embeddings
+
+    # Texts are embedded block by block: chunks are length-bucketed within a block, and each block
+    # is flushed to the store so that a crash does not lose the work done so far
+    stats = []
+    for start in tqdm(range(0, len(todo), flush_every), desc="Embedding unique texts (blocks)"):
+        indices = todo[start:start + flush_every]
+        block_texts = [texts[i] for i in indices]
+        embeddings[indices], block_stats = embed_batches(block_texts, tokenizer, model, device, chunking, token_budget)
+        stats.extend(block_stats)
+        instrumentation.count("embedded_texts", len(indices))
+        if store is not None:
+            with instrumentation.span("io", target="store"):
+                store.add(block_texts, embeddings[indices])
+    report_batches(stats)
+    return embeddings
+
+def chunking_config(max_tokens=512, stride=0):
+    return {"method": "token_ids", "max_tokens": max_tokens, "stride": stride}
+
+def open_store(store_dir, embedding_model_name, dtype="float32", chunking=CHUNKING, backend="eager"):
+    if not store_dir:
+        return None
+    model_key = store_model_key(embedding_model_name, backend)
+    return EmbeddingStore(store_dir, model_key, pooling=POOLING, chunking=chunking, dtype=dtype)
 
-        cosine_values.append(sim)
+def embed_table(df, tokenizer, model, device, store=None, chunking=CHUNKING, pool=None, token_budget=TOKEN_BUDGET):
+    """
+    Embeds every distinct solution and reasoning text of the dataframe exactly once.
+    Returns (solution column, per-column index arrays, normalised embeddings), shared by the cosine table
+    and the similarity matrices.
+    """
+    solution_col = find_solution_column(df)
+    texts, column_indices = collect_texts(df, solution_col)
+    print(f"Embedding {len(texts)} unique texts for {len(df)} rows")
+    normalized = normalize_rows(embed_texts(
+        texts, tokenizer, model, device, store=store, chunking=chunking, pool=pool, token_budget=token_budget
+    ))
+    return solution_col, column_indices, normalized
 
-    similarity_data[f"{model_name}_cosine"] = cosine_values
+def compute_similarity_table(df, input_csv, tokenizer, model, device, store=None, chunking=CHUNKING, pool=None,
+                             token_budget=TOKEN_BUDGET):
+    embedded = embed_table(df, tokenizer, model, device, store=store, chunking=chunking, pool=pool, token_budget=token_budget)
+    return similarity_table(df, input_csv, *embedded)
 
-    if f"{model_name}_time" in df.columns:
-        similarity_data[f"{model_name}_time"] = df[f"{model_name}_time"].reset_index(drop=True)
+def similarity_table(df, input_csv, solution_col, column_indices, normalized):
+    """Row-wise cosine similarity of each reasoning model against the solution, from embed_table's output."""
+    similarity_data = {}
+
+    # Add the corresponding id columns and, for math and proofs, the problem type
+    id_col = "uuid" if "uuid" in df.columns else "QuestionID" if "QuestionID" in df.columns else None
+    if id_col:
+        similarity_data[id_col] = df[id_col].reset_index(drop=True)
+    if ("math" in input_csv.lower() or "proofs" in input_csv.lower()) and "problem_type" in df.columns:
+        similarity_data["problem_type"] = df["problem_type"].reset_index(drop=True)
+
+    solution_idx = column_indices[solution_col]
+    for model_name in REASONING_MODELS:
+        reasoning_idx = column_indices[f"{model_name}_reasoning"]
+        similarity_data[f"{model_name}_cosine"] = rowwise_cosine(normalized, reasoning_idx, solution_idx)
+
+        if f"{model_name}_time" in df.columns:
+            similarity_data[f"{model_name}_time"] = df[f"{model_name}_time"].reset_index(drop=True)
+
+    return pd.DataFrame(similarity_data)
+
+def similarity_matrices(normalized, index_arrays, block_size=4096):
+    """
+    Cosine matrix between all the texts of each row, as one batched normalised matmul per block of rows.
+    index_arrays holds one array of embedding rows per text column (-1 where missing, giving NaN entries).
+    Returns an array of shape (n_rows, n_columns, n_columns).
+    """
+    idx = np.stack(index_arrays, axis=1)
+    matrices = np.full((idx.shape[0], idx.shape[1], idx.shape[1]), np.nan, dtype=np.float32)
+    for start in range(0, len(idx), block_size):
+        block = idx[start:start + block_size]
+        vectors = np.full(block.shape + (normalized.shape[1],), np.nan, dtype=np.float32)
+        valid = block >= 0
+        vectors[valid] = normalized[block[valid]]
+        matrices[start:start + block_size] = np.matmul(vectors, vectors.transpose(0, 2, 1))
+    return matrices
+
+def compute_similarity_matrices(df, tokenizer, model, device, store=None, chunking=CHUNKING, pool=None,
+                                token_budget=TOKEN_BUDGET):
+    """Embeds the dataframe's texts (through the store when there is one) and returns agreement_matrices."""
+    embedded = embed_table(df, tokenizer, model, device, store=store, chunking=chunking, pool=pool, token_budget=token_budget)
+    return agreement_matrices(df, *embedded)
+
+def agreement_matrices(df, solution_col, column_indices, normalized):
+    """
+    Solution + reasoning-model cosine matrix for every question, from embed_table's output, so the cosine
+    table and the matrices share one embedding pass. Returns the labels of the matrix axes, the (n_rows, 5, 5)
+    matrices and a summary table with one column per pair of reasoning models and their mean agreement.
+    """
+    labels = ["solution"] + REASONING_MODELS
+    columns = [solution_col] + [f"{model_name}_reasoning" for model_name in REASONING_MODELS]
+    matrices = similarity_matrices(normalized, [column_indices[col] for col in columns])
+
+    summary = {}
+    id_col = "uuid" if "uuid" in df.columns else "QuestionID" if "QuestionID" in df.columns else None
+    if id_col:
+        summary[id_col] = df[id_col].reset_index(drop=True)
+    pairs = [(i, j) for i in range(1, len(labels)) for j in range(i + 1, len(labels))]
+    for i, j in pairs:
+        summary[f"{labels[i]}__{labels[j]}_cosine"] = matrices[:, i, j]
+    pair_values = np.stack([matrices[:, i, j] for i, j in pairs], axis=1)
+    counts = np.isfinite(pair_values).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        summary["mean_inter_model_cosine"] = np.where(counts > 0, np.nansum(pair_values, axis=1) / counts, np.nan)
+    return labels, matrices, pd.DataFrame(summary)
+
+def write_similarity_matrices(input_csv, parts):
+    """
+    Writes <input>_similarity_matrices.npz (matrices, axis labels, ids) and <input>_model_agreement.csv from
+    the (labels, matrices, summary) parts of agreement_matrices, one per chunk of the input in row order.
+    """
+    base = os.path.splitext(input_csv)[0]
+    labels = parts[0][0]
+    all_matrices = [matrices for _, matrices, _ in parts]
+    summaries = [summary for _, _, summary in parts]
+    summary = pd.concat(summaries, ignore_index=True)
+    id_col = summary.columns[0] if summary.columns[0] in ("uuid", "QuestionID") else None
+    np.savez_compressed(
+        base + "_similarity_matrices.npz",
+        matrices=np.concatenate(all_matrices),
+        labels=np.array(labels),
+        ids=np.asarray(summary[id_col] if id_col else np.arange(len(summary)), dtype=str),
+    )
+    summary.to_csv(base + "_model_agreement.csv", index=False)
+    print(f"Similarity matrices saved to: {base}_similarity_matrices.npz and {base}_model_agreement.csv")
+
+def checkpoint_path(output_csv):
+    return output_csv + ".checkpoint.json"
+
+def input_signature(input_csv):
+    stat = os.stat(input_csv)
+    return {"input": os.path.abspath(input_csv), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_checkpoint(output_csv, input_csv, chunking):
+    """
+    Returns the number of input rows already written to output_csv by an interrupted streaming run,
+    or 0 when there is no usable checkpoint (missing, or written for another input file or chunking).
+    The output is cut back to the size recorded in the checkpoint, dropping rows appended after it.
+    """
+    path = checkpoint_path(output_csv)
+    if not os.path.exists(path) or not os.path.exists(output_csv):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("signature") != input_signature(input_csv) or checkpoint.get("chunking") != chunking:
+        print("Checkpoint does not match the current input or chunking, starting over")
+        return 0
+    with open(output_csv, "r+b") as f:
+        f.truncate(checkpoint["output_bytes"])
+    return checkpoint["rows_done"]
+
+def save_checkpoint(output_csv, input_csv, chunking, rows_done):
+    checkpoint = {
+        "signature": input_signature(input_csv),
+        "chunking": chunking,
+        "rows_done": rows_done,
+        "output_bytes": os.path.getsize(output_csv),
+    }
+    # Write then rename, so that a crash never leaves a half-written checkpoint behind
+    tmp_path = checkpoint_path(output_csv) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path(output_csv))
+
+def stream_similarity_table(input_csv, output_csv, tokenizer, model, device, store=None, chunking=CHUNKING, pool=None,
+                            token_budget=TOKEN_BUDGET, chunksize=2000, restart=False, matrices=False):
+    """
+    Streaming version of compute_similarity_table: reads the input chunksize rows at a time, appends the
+    finished rows to output_csv and records a checkpoint after every chunk, so memory stays flat and an
+    interrupted run resumes from the last completed chunk. Texts repeated across chunks are served by the store.
+    With matrices the similarity matrices are built from each chunk's embeddings and written at the end; rows
+    done before a resume have to be embedded again for them (read back from the store when there is one).
+    """
+    kwargs = dict(store=store, chunking=chunking, pool=pool, token_budget=token_budget)
+    parts = []
+    rows_done = 0 if restart else load_checkpoint(output_csv, input_csv, chunking)
+    if rows_done:
+        print(f"Resuming {input_csv} after {rows_done} rows")
+    elif os.path.exists(output_csv):
+        os.remove(output_csv)
+
+    rows_seen = 0
+    for chunk in pd.read_csv(input_csv, chunksize=chunksize):
+        chunk_start = rows_seen
+        rows_seen += len(chunk)
+        if rows_seen <= rows_done:
+            if matrices:
+                parts.append(compute_similarity_matrices(chunk, tokenizer, model, device, **kwargs))
+            continue
+        # Only the part of the chunk past the checkpoint still has to be computed
+        done = max(rows_done - chunk_start, 0)
+        if matrices and done:
+            parts.append(compute_similarity_matrices(chunk.iloc[:done], tokenizer, model, device, **kwargs))
+        chunk = chunk.iloc[done:]
+        embedded = embed_table(chunk, tokenizer, model, device, **kwargs)
+        output_df = similarity_table(chunk, input_csv, *embedded)
+        if matrices:
+            parts.append(agreement_matrices(chunk, *embedded))
+        write_header = not os.path.exists(output_csv) or os.path.getsize(output_csv) == 0
+        with instrumentation.span("io", file=os.path.basename(input_csv)):
+            output_df.to_csv(output_csv, mode="a", header=write_header, index=False)
+        rows_done = rows_seen
+        save_checkpoint(output_csv, input_csv, chunking, rows_done)
+        print(f"Rows done: {rows_done}")
+
+    # The output is complete: a later run should recompute rather than resume
+    if os.path.exists(checkpoint_path(output_csv)):
+        os.remove(checkpoint_path(output_csv))
+    if matrices and parts:
+        write_similarity_matrices(input_csv, parts)
+    return rows_done
+
+def check_backend_accuracy(df, input_csv, embedding_model_name, backend, sample_size=200, chunking=CHUNKING):
+    """
+    Scores a random sample of rows with the eager fp32 model and with the given backend, and reports
+    how far the backend's cosine similarities drift from fp32 together with the embedding time of each.
+    """
+    sample = df.sample(n=min(sample_size, len(df)), random_state=0).reset_index(drop=True)
+    tables, seconds = {}, {}
+    for name in ["eager", backend]:
+        tokenizer, model, device = load_embedding_model(embedding_model_name, name)
+        start = time.perf_counter()
+        tables[name] = compute_similarity_table(sample, input_csv, tokenizer, model, device, chunking=chunking)
+        seconds[name] = time.perf_counter() - start
+
+    report = []
+    for model_name in REASONING_MODELS:
+        col = f"{model_name}_cosine"
+        diff = (tables[backend][col] - tables["eager"][col]).abs()
+        report.append({
+            "model": model_name,
+            "mean_abs_diff": diff.mean(),
+            "max_abs_diff": diff.max(),
+        })
+    report_df = pd.DataFrame(report)
+    print(f"\nAccuracy of backend '{backend}' against eager fp32 on {len(sample)} rows:")
+    print(report_df.to_string(index=False))
+    print(f"Time: eager {seconds['eager']:.1f}s, {backend} {seconds[backend]:.1f}s ({seconds['eager'] / seconds[backend]:.2f}x)")
+    return report_df
+
+def main():
+    # Parse the command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', required=True, help='Path to input CSV file')
+    parser.add_argument('--embedding_model', required=True, help='Hugging Face model name')
+    parser.add_argument('--backend', default='eager', choices=BACKENDS, help='Inference backend: eager fp32, dynamic int8 or ONNX Runtime')
+    parser.add_argument('--check_accuracy', type=int, default=0, metavar='N', help='Compare the backend against eager fp32 on N sampled rows first')
+    parser.add_argument('--workers', type=int, default=1, help='Number of embedding worker processes (1 = embed in this process)')
+    parser.add_argument('--threads_per_worker', type=int, default=None, help='Torch threads per worker process (default: cores / workers)')
+    parser.add_argument('--token_budget', type=int, default=TOKEN_BUDGET, help='Maximum padded tokens per forward pass')
+    parser.add_argument('--max_tokens', type=int, default=512, help='Chunk length in tokens, special tokens included')
+    parser.add_argument('--stride', type=int, default=0, help='Number of tokens shared by consecutive chunks')
+    parser.add_argument('--stream', action='store_true', help='Read the input in chunks, append results and checkpoint progress')
+    parser.add_argument('--chunksize', type=int, default=2000, help='Rows per chunk in streaming mode')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start from the first row')
+    parser.add_argument('--matrices', action='store_true', help='Also write solution + model cosine matrices for every question')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='Embedding store directory, reused across runs')
+    parser.add_argument('--no_store', action='store_true', help='Do not read or write the embedding store')
+    parser.add_argument('--store_dtype', default='float32', choices=['float32', 'float16'], help='Dtype of newly created stores')
+    args = parser.parse_args()
+
+    input_csv = args.input
+    output_csv = os.path.splitext(input_csv)[0] + "_cosine.csv"
+
+    chunking = chunking_config(args.max_tokens, args.stride)
+    if args.check_accuracy > 0 and args.backend != "eager":
+        # In streaming mode only the head of the file is read for the check
+        sample_df = pd.read_csv(input_csv, nrows=args.check_accuracy if args.stream else None)
+        check_backend_accuracy(sample_df, input_csv, args.embedding_model, args.backend, args.check_accuracy, chunking)
+
+    store = None if args.no_store else open_store(args.store, args.embedding_model, args.store_dtype, chunking, args.backend)
+    tokenizer, model, device, pool = None, None, None, None
+    if args.workers > 1:
+        # The workers hold the model, so it is not loaded in this process
+        pool = EmbeddingPool(args.embedding_model, args.backend, args.workers, args.threads_per_worker, chunking, args.token_budget)
+    else:
+        tokenizer, model, device = load_embedding_model(args.embedding_model, args.backend)
 
+    try:
+        if args.stream:
+            stream_similarity_table(
+                input_csv, output_csv, tokenizer, model, device, store=store, chunking=chunking, pool=pool,
+                token_budget=args.token_budget, chunksize=args.chunksize, restart=args.restart, matrices=args.matrices,
+            )
+        else:
+            #  Load the input csv file, containing the texts to compare
+            df = pd.read_csv(input_csv)
+            embedded = embed_table(
+                df, tokenizer, model, device, store=store, chunking=chunking, pool=pool, token_budget=args.token_budget
+            )
+            similarity_table(df, input_csv, *embedded).to_csv(output_csv, index=False)
+            if args.matrices:
+                # The matrices reuse the embeddings of the cosine table: no text is embedded twice
+                write_similarity_matrices(input_csv, [agreement_matrices(df, *embedded)])
+    finally:
+        if pool is not None:
+            pool.close()
+    print(f"\n✅ Done. Output saved to: {output_csv}")
 
-output_df = pd.DataFrame(similarity_data)
-output_df.to_csv(OUTPUT_CSV, index=False)
-print(f"\n✅ Done. Output saved to: {OUTPUT_CSV}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
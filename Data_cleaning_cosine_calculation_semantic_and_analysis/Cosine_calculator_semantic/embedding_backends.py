@@ -0,0 +1,107 @@
+import os
+import re
+
+# CPU inference backends for the embedding models in berts.txt. Every backend returns an object that is
+# called like a Hugging Face model (model(**inputs).last_hidden_state) and exposes model.config.hidden_size,
+# so the cosine calculator does not need to know which one it is using.
+# torch, transformers and onnxruntime are only imported when a model is loaded or exported.
+BACKENDS = ["eager", "int8", "onnx"]
+DEFAULT_ONNX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "onnx_models")
+
+
+class OnnxEncoder:
+    """ONNX Runtime session wrapped to look like a Hugging Face encoder."""
+
+    def __init__(self, onnx_path, config, num_threads=None):
+        import torch
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads or torch.get_num_threads()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.config = config
+
+    def __call__(self, input_ids, attention_mask, **kwargs):
+        import torch
+        from transformers.modeling_outputs import BaseModelOutput
+
+        feeds = {
+            "input_ids": input_ids.cpu().numpy().astype("int64"),
+            "attention_mask": attention_mask.cpu().numpy().astype("int64"),
+        }
+        (last_hidden_state,) = self.session.run(["last_hidden_state"], feeds)
+        return BaseModelOutput(last_hidden_state=torch.from_numpy(last_hidden_state))
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+
+def onnx_path_for(embedding_model_name, onnx_dir=DEFAULT_ONNX_DIR):
+    return os.path.join(onnx_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", embedding_model_name) + ".onnx")
+
+def export_onnx(model, onnx_path):
+    import torch
+
+    class _LastHiddenState(torch.nn.Module):
+        # The exported graph only needs the token embeddings, not the pooler or the output dataclass
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    dummy_ids = torch.ones((2, 16), dtype=torch.long)
+    dummy_mask = torch.ones((2, 16), dtype=torch.long)
+    torch.onnx.export(
+        _LastHiddenState(model).eval(),
+        (dummy_ids, dummy_mask),
+        onnx_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "last_hidden_state": {0: "batch", 1: "sequence"},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+
+def load_backend(embedding_model_name, backend="eager", device=None, onnx_dir=DEFAULT_ONNX_DIR):
+    """
+    Loads the embedding model with the requested backend:
+        eager -> PyTorch fp32, on GPU when available
+        int8  -> torch.ao dynamic int8 quantization of every nn.Linear, CPU only
+        onnx  -> graph exported once to onnx_dir and run with ONNX Runtime, CPU only
+    Returns the model and the device its inputs should be moved to.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}.")
+    import torch
+    from transformers import AutoModel
+
+    model = AutoModel.from_pretrained(embedding_model_name).eval()
+    if backend == "eager":
+        device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        return model.to(device), device
+
+    device = torch.device("cpu")
+    if backend == "int8":
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return quantized.eval(), device
+
+    onnx_path = onnx_path_for(embedding_model_name, onnx_dir)
+    if not os.path.exists(onnx_path):
+        print(f"Exporting {embedding_model_name} to {onnx_path}")
+        export_onnx(model, onnx_path)
+    return OnnxEncoder(onnx_path, model.config), device
+
+def store_model_key(embedding_model_name, backend="eager"):
+    # Quantized and exported models produce slightly different vectors: keep them apart in the embedding store
+    return embedding_model_name if backend == "eager" else f"{embedding_model_name}#{backend}"
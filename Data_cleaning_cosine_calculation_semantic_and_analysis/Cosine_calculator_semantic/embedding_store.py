@@ -0,0 +1,171 @@
+import os
+import json
+import threading
+import numpy as np
+import xxhash
+
+# Every (embedding model, pooling, chunking config) combination gets its own folder inside the store root:
+#   meta.json    -> the configuration, vector dimension and dtype
+#   vectors.bin  -> raw row-major vectors, read back through np.memmap
+#   index.txt    -> one text hash per line, line i describes row i of vectors.bin
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.bin"
+INDEX_FILE = "index.txt"
+
+
+def text_hash(text):
+    return xxhash.xxh3_128_hexdigest(text.encode("utf-8"))
+
+def config_key(model_name, pooling, chunking):
+    config = {"model": model_name, "pooling": pooling, "chunking": chunking}
+    return xxhash.xxh3_64_hexdigest(json.dumps(config, sort_keys=True).encode("utf-8"))
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed store of text embeddings.
+
+    Vectors are appended to a flat binary file and exposed as a read-only memory map, so
+    reruns of the cosine calculator and the analysis notebooks can reuse them without
+    re-running the embedding model or copying the whole matrix into memory.
+    """
+
+    def __init__(self, root, model_name, pooling="cls_mean", chunking=None, dtype="float32", dim=None):
+        self.model_name = model_name
+        self.pooling = pooling
+        self.chunking = chunking or {}
+        self.path = os.path.join(root, config_key(model_name, pooling, self.chunking))
+        os.makedirs(self.path, exist_ok=True)
+
+        meta_path = os.path.join(self.path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dtype = np.dtype(meta["dtype"])
+            self.dim = meta["dim"]
+        else:
+            self.dtype = np.dtype(dtype)
+            self.dim = dim
+            if dim is not None:
+                self._write_meta()
+
+        self._index = {}
+        # Several files embedded concurrently by the in-process driver share one store
+        self._lock = threading.Lock()
+        self._load_index()
+
+    @classmethod
+    def from_dir(cls, path):
+        """Opens an existing store folder, e.g. from a notebook, without knowing its configuration."""
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(os.path.dirname(os.path.abspath(path)), meta["model"], meta["pooling"], meta["chunking"])
+
+    def _write_meta(self):
+        meta = {
+            "model": self.model_name,
+            "pooling": self.pooling,
+            "chunking": self.chunking,
+            "dtype": self.dtype.name,
+            "dim": self.dim,
+        }
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    def _row_bytes(self):
+        return self.dim * self.dtype.itemsize
+
+    def _load_index(self):
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if not os.path.exists(index_path) or self.dim is None:
+            return
+        with open(index_path, "r", encoding="utf-8") as f:
+            hashes = f.read().split()
+        # A crash between writing vectors and the index can leave either file longer: cut both back to the shorter one
+        vectors_path = os.path.join(self.path, VECTORS_FILE)
+        n_vectors = os.path.getsize(vectors_path) // self._row_bytes() if os.path.exists(vectors_path) else 0
+        n_rows = min(n_vectors, len(hashes))
+        if os.path.exists(vectors_path) and os.path.getsize(vectors_path) != n_rows * self._row_bytes():
+            with open(vectors_path, "r+b") as f:
+                f.truncate(n_rows * self._row_bytes())
+        if len(hashes) != n_rows:
+            with open(index_path, "w", encoding="utf-8") as f:
+                f.write("".join(h + "\n" for h in hashes[:n_rows]))
+        for row, h in enumerate(hashes[:n_rows]):
+            self._index.setdefault(h, row)
+        self._n_rows = n_rows
+
+    def __len__(self):
+        return getattr(self, "_n_rows", 0)
+
+    def __contains__(self, text):
+        return text_hash(text) in self._index
+
+    def vectors(self):
+        """Read-only memory map of every stored vector, shape (len(store), dim)."""
+        if len(self) == 0:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return np.memmap(os.path.join(self.path, VECTORS_FILE), dtype=self.dtype, mode="r", shape=(len(self), self.dim))
+
+    def lookup(self, texts):
+        """Row of each text in vectors(), -1 for texts that are not stored yet."""
+        return np.array([self._index.get(text_hash(t), -1) for t in texts], dtype=np.int64)
+
+    def get(self, texts):
+        """
+        Returns a float32 matrix with the stored embedding of each text (NaN rows for unknown texts)
+        and a boolean mask of the texts that were found.
+        """
+        rows = self.lookup(texts)
+        found = rows >= 0
+        out = np.full((len(texts), self.dim or 0), np.nan, dtype=np.float32)
+        if found.any():
+            out[found] = self.vectors()[rows[found]]
+        return out, found
+
+    def add(self, texts, embeddings):
+        """Appends the embeddings of texts that are not stored yet. Rows containing NaN are skipped."""
+        with self._lock:
+            return self._add(texts, embeddings)
+
+    def _add(self, texts, embeddings):
+        embeddings = np.asarray(embeddings)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            self._write_meta()
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match store dimension {self.dim}.")
+
+        new_hashes, new_rows = {}, []
+        for text, emb in zip(texts, embeddings):
+            h = text_hash(text)
+            if h in self._index or h in new_hashes or not np.isfinite(emb).all():
+                continue
+            new_hashes[h] = len(self) + len(new_rows)
+            new_rows.append(emb)
+        if not new_rows:
+            return 0
+
+        with open(os.path.join(self.path, VECTORS_FILE), "ab") as f:
+            f.write(np.asarray(new_rows, dtype=self.dtype).tobytes())
+        with open(os.path.join(self.path, INDEX_FILE), "a", encoding="utf-8") as f:
+            f.write("".join(h + "\n" for h in new_hashes))
+        # Publish the new rows only once they are on disk, so concurrent readers never see a row past the end of the file
+        self._n_rows = len(self) + len(new_rows)
+        self._index.update(new_hashes)
+        return len(new_rows)
+
+
+def list_stores(root):
+    """Configuration of every store folder under root, useful to find the right one from a notebook."""
+    stores = []
+    if not os.path.isdir(root):
+        return stores
+    for name in sorted(os.listdir(root)):
+        meta_path = os.path.join(root, name, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            meta["path"] = os.path.join(root, name)
+            stores.append(meta)
+    return stores
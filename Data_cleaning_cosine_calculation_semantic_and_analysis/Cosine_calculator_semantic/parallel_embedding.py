@@ -0,0 +1,149 @@
+import os
+import time
+import argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+# Process-pool embedding for many-core CPU nodes. Every worker loads the model once and runs it with a
+# fixed number of torch threads; the texts are split into shards of SHARD_SIZE texts (longest first, so the
+# pool stays balanced) and each worker writes its vectors straight into a shared-memory matrix owned by the parent.
+
+SHARD_SIZE = 64
+
+_worker = {}
+
+
+def _init_worker(embedding_model_name, backend, num_threads, chunking, token_budget):
+    import torch
+    import cosine_similarity_calculator as csc
+
+    torch.set_num_threads(num_threads)
+    tokenizer, model, device = csc.load_embedding_model(embedding_model_name, backend)
+    _worker.update(
+        csc=csc, tokenizer=tokenizer, model=model, device=device, chunking=chunking, token_budget=token_budget, shm=None
+    )
+
+def _attach(shm_name, shape):
+    # Keep the attachment to the current output matrix for the following shards, and drop the previous one
+    current = _worker.get("shm")
+    if current is None or current.name != shm_name:
+        if current is not None:
+            current.close()
+        _worker["shm"] = shared_memory.SharedMemory(name=shm_name)
+    return np.ndarray(shape, dtype=np.float32, buffer=_worker["shm"].buf)
+
+def _embed_shard(shm_name, shape, shard):
+    out = _attach(shm_name, shape)
+    indices = [i for i, _ in shard]
+    out[indices], _ = _worker["csc"].embed_batches(
+        [text for _, text in shard], _worker["tokenizer"], _worker["model"], _worker["device"],
+        _worker["chunking"], _worker["token_budget"],
+    )
+    del out
+    return len(shard)
+
+
+class EmbeddingPool:
+    """
+    Pool of worker processes, each holding its own copy of the embedding model.
+    Use it as a context manager, or call close() when done.
+    """
+
+    def __init__(self, embedding_model_name, backend="eager", workers=2, threads_per_worker=None, chunking=None,
+                 token_budget=None):
+        from transformers import AutoConfig
+        from cosine_similarity_calculator import CHUNKING, TOKEN_BUDGET
+
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.hidden_size = AutoConfig.from_pretrained(embedding_model_name).hidden_size
+        # spawn rather than fork: forking a parent that already started torch's thread pools can deadlock
+        self._pool = mp.get_context("spawn").Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(
+                embedding_model_name, backend, self.threads_per_worker, chunking or CHUNKING, token_budget or TOKEN_BUDGET
+            ),
+        )
+
+    def embed(self, texts):
+        """Embeds texts across the workers. Texts whose embedding fails are left as NaN rows."""
+        shape = (len(texts), self.hidden_size)
+        if not texts:
+            return np.empty(shape, dtype=np.float32)
+
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        try:
+            out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+            out[:] = np.nan
+            order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+            shards = [
+                [(i, texts[i]) for i in order[start:start + SHARD_SIZE]]
+                for start in range(0, len(order), SHARD_SIZE)
+            ]
+            tasks = [self._pool.apply_async(_embed_shard, (shm.name, shape, shard)) for shard in shards]
+            for task in tasks:
+                task.get()
+            result = out.copy()
+            # The view must be released before the shared block can be closed
+            del out
+            return result
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def benchmark_scaling(texts, embedding_model_name, backend="eager", worker_counts=(1, 2, 4), threads_per_worker=None):
+    """Embeds the same texts with every worker count and reports throughput and speed-up over the first count."""
+    rows = []
+    for workers in worker_counts:
+        with EmbeddingPool(embedding_model_name, backend, workers, threads_per_worker) as pool:
+            # Warm-up so that model loading is not part of the measurement
+            pool.embed(texts[:workers])
+            start = time.perf_counter()
+            pool.embed(texts)
+            seconds = time.perf_counter() - start
+        rows.append({
+            "workers": workers,
+            "threads_per_worker": pool.threads_per_worker,
+            "seconds": seconds,
+            "texts_per_second": len(texts) / seconds,
+        })
+    report = pd.DataFrame(rows)
+    report["speedup"] = report["texts_per_second"] / report["texts_per_second"].iloc[0]
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+    return report
+
+def main():
+    from cosine_similarity_calculator import REASONING_MODELS, find_solution_column, safe_strip
+    from embedding_backends import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Measure how embedding throughput scales with the number of worker processes.")
+    parser.add_argument('--input', required=True, help='Path to an NLP_analysis CSV file')
+    parser.add_argument('--embedding_model', required=True, help='Hugging Face model name')
+    parser.add_argument('--backend', default='eager', choices=BACKENDS, help='Inference backend: eager fp32, dynamic int8 or ONNX Runtime')
+    parser.add_argument('--workers', default='1,2,4', help='Comma separated worker counts to compare')
+    parser.add_argument('--threads_per_worker', type=int, default=None, help='Torch threads per worker (default: cores / workers)')
+    parser.add_argument('--sample', type=int, default=500, help='Number of texts to embed')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    columns = [find_solution_column(df)] + [f"{m}_reasoning" for m in REASONING_MODELS if f"{m}_reasoning" in df.columns]
+    texts = list(dict.fromkeys(t for col in columns for t in df[col] if safe_strip(t)))[:args.sample]
+    worker_counts = [int(w) for w in args.workers.split(",")]
+    benchmark_scaling(texts, args.embedding_model, args.backend, worker_counts, args.threads_per_worker)
+
+if __name__ == "__main__":
+    main()
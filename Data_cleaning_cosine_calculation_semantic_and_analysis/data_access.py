@@ -0,0 +1,165 @@
+import os
+import glob
+import json
+import argparse
+import pandas as pd
+import pyarrow.parquet as pq
+import xxhash
+
+# Cached, typed access to the NLP_analysis and cosine_datasets tables.
+# The first read of a CSV materialises it as Parquet inside the cache directory, with model/problem_type
+# as categoricals and float scores as float32. Later reads load the Parquet file, optionally only the
+# requested columns, so metric-only reads never parse the long reasoning texts.
+# Every cache file has a sidecar JSON with the size, mtime and content hash of its source CSV:
+# a changed CSV is detected on the next read and its cache is rebuilt.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NLP_ANALYSIS_DIR = os.path.join(BASE_DIR, "NLP_analysis")
+COSINE_DIR = os.path.join(BASE_DIR, "cosine_datasets")
+DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, "parquet_cache")
+
+ID_COLUMNS = ["uuid", "QuestionID"]
+CATEGORICAL_COLUMNS = ["model", "problem_type", "type", "task"]
+TASKS = ["math", "proofs", "reading_comprehension", "critical_reasoning", "essay_evaluation"]
+
+
+def file_hash(path, block_size=1 << 20):
+    h = xxhash.xxh3_128()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def fingerprint(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def optimise_dtypes(df):
+    """Categorical model/problem_type columns and float32 scores. Id and text columns are left as they are."""
+    df = df.copy()
+    for col in df.columns:
+        if col in ID_COLUMNS:
+            continue
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype("float32")
+    return df
+
+def cache_paths(csv_path, cache_dir=DEFAULT_CACHE_DIR):
+    # Keep the source folder in the cache name: NLP_analysis/math_analysis.csv -> NLP_analysis/math_analysis.parquet
+    source = os.path.abspath(csv_path)
+    folder = os.path.basename(os.path.dirname(source))
+    name = os.path.splitext(os.path.basename(source))[0]
+    parquet_path = os.path.join(cache_dir, folder, name + ".parquet")
+    return parquet_path, parquet_path + ".json"
+
+def _read_meta(meta_path):
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write_meta(meta_path, meta):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+def is_fresh(csv_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    True when the Parquet cache of csv_path matches the CSV. Size and mtime are checked first; the content
+    hash is only computed when they differ (e.g. after a git checkout), and a matching hash refreshes them.
+    """
+    parquet_path, meta_path = cache_paths(csv_path, cache_dir)
+    meta = _read_meta(meta_path)
+    if meta is None or not os.path.exists(parquet_path):
+        return False
+    current = fingerprint(csv_path)
+    if current == meta["source"]:
+        return True
+    if current["size"] != meta["source"]["size"] or file_hash(csv_path) != meta["hash"]:
+        return False
+    meta["source"] = current
+    _write_meta(meta_path, meta)
+    return True
+
+def build_cache(csv_path, cache_dir=DEFAULT_CACHE_DIR):
+    """Reads csv_path, optimises its dtypes and writes the Parquet cache with its sidecar. Returns the frame."""
+    parquet_path, meta_path = cache_paths(csv_path, cache_dir)
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+    source = fingerprint(csv_path)
+    df = optimise_dtypes(pd.read_csv(csv_path))
+
+    # Through a temporary file, so that a crash never leaves a half-written cache behind
+    tmp_path = parquet_path + ".tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, parquet_path)
+    _write_meta(meta_path, {"source": source, "hash": file_hash(csv_path), "csv": os.path.abspath(csv_path)})
+    return df
+
+def load_table(csv_path, columns=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    The table of csv_path with optimised dtypes, read from its Parquet cache (rebuilt first if the CSV changed).
+    columns projects the read onto a subset of columns.
+    """
+    if cache_dir is None:
+        df = optimise_dtypes(pd.read_csv(csv_path, usecols=columns))
+        return df[columns] if columns is not None else df
+    if not is_fresh(csv_path, cache_dir):
+        df = build_cache(csv_path, cache_dir)
+        return df[columns] if columns is not None else df
+    return pd.read_parquet(cache_paths(csv_path, cache_dir)[0], columns=columns)
+
+def table_columns(csv_path, cache_dir=DEFAULT_CACHE_DIR):
+    """Column names and pandas-level dtypes of a cached table, from the Parquet schema only."""
+    if not is_fresh(csv_path, cache_dir):
+        build_cache(csv_path, cache_dir)
+    schema = pq.read_schema(cache_paths(csv_path, cache_dir)[0])
+    return {name: str(schema.field(name).type) for name in schema.names if not name.startswith("__")}
+
+def score_columns(csv_path, cache_dir=DEFAULT_CACHE_DIR):
+    """Id, categorical and numeric columns of a table: everything except the free-text columns."""
+    return [name for name, dtype in table_columns(csv_path, cache_dir).items()
+            if name in ID_COLUMNS or name in CATEGORICAL_COLUMNS or not (dtype.startswith("string") or dtype.startswith("large_string"))]
+
+def analysis_path(task):
+    return os.path.join(NLP_ANALYSIS_DIR, f"{task}_analysis.csv")
+
+def cosine_path(task):
+    return os.path.join(COSINE_DIR, f"{task}_analysis_cosine.csv")
+
+def load_analysis(task, columns=None, cache_dir=DEFAULT_CACHE_DIR):
+    return load_table(analysis_path(task), columns, cache_dir)
+
+def load_cosine(task, columns=None, cache_dir=DEFAULT_CACHE_DIR):
+    return load_table(cosine_path(task), columns, cache_dir)
+
+def merged(task, analysis_columns, cosine_columns=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Cosine table of a task left-merged with some NLP_analysis columns on the id column, as in
+    Data_visualization.ipynb. Only the requested columns are read from either table.
+    """
+    cosine = load_cosine(task, cosine_columns, cache_dir)
+    id_col = next(col for col in ID_COLUMNS if col in cosine.columns)
+    analysis_columns = [id_col] + [col for col in analysis_columns if col != id_col]
+    return pd.merge(cosine, load_analysis(task, analysis_columns, cache_dir), on=id_col, how="left")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or check the Parquet caches of the NLP_analysis and cosine_datasets tables.")
+    parser.add_argument('--inputs', nargs='+', default=None, help='CSV files (default: every CSV in NLP_analysis and cosine_datasets)')
+    parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, help='Directory of the Parquet caches')
+    parser.add_argument('--check', action='store_true', help='Only report which caches are stale')
+    args = parser.parse_args()
+
+    inputs = args.inputs or sorted(glob.glob(os.path.join(NLP_ANALYSIS_DIR, "*.csv")) + glob.glob(os.path.join(COSINE_DIR, "*.csv")))
+    for csv_path in inputs:
+        fresh = is_fresh(csv_path, args.cache_dir)
+        if args.check:
+            print(f"{'fresh' if fresh else 'stale'}: {csv_path}")
+        elif not fresh:
+            df = build_cache(csv_path, args.cache_dir)
+            print(f"Cached {os.path.basename(csv_path)}: {len(df)} rows, {len(df.columns)} columns")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+import os
+import re
+import math
+import signal
+import argparse
+import threading
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
+import pandas as pd
+import xxhash
+from response_parsing import REASONING_MODELS, ID_COLUMNS, TASKS, READING_COMPREHENSION_LETTER_RE, THINK_OPEN, THINK_CLOSE
+
+# Answer correctness beyond letter equality. The final answer of a model is taken from its last \boxed{...},
+# else from its ## Solution section, else from an "answer is"/**Answer:** line, and compared with the reference
+# after normalisation, in order of cost:
+#   exact    -> same normalised string (LaTeX spacing, \text{}, \left/\right, $...$ and case removed)
+#   letter   -> multiple-choice references: the letter found by the task's letter regex, as in clean_solution
+#   numeric  -> both sides are numbers (integers, decimals, fractions, percentages) equal within tolerance
+#   symbolic -> both sides parse as expressions whose difference simplifies to 0; needs the optional sympy
+# Symbolic checks run in a process pool, each one under a timeout since simplify() can take very long.
+# Every decided comparison is memoised under the hash of (settings, normalised prediction, normalised reference)
+# in a TSV next to the analysis tables, so reruns and other models giving the same answer are not checked again;
+# the settings (numeric tolerance, letter regex, symbolic check on or off) keep verdicts of other rules apart.
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, "correctness_cache", "correctness.tsv")
+ANSWER_COLUMNS = ["answer", "Answer"]
+REL_TOL = 1e-6
+DEFAULT_TIMEOUT = 5.0
+HAS_SYMPY = find_spec("sympy") is not None
+
+BOXED_START_RE = re.compile(r"\\(?:boxed|fbox)\s*\{")
+SOLUTION_SECTION_RE = re.compile(r"##\s*Solution\s*(.*)", re.DOTALL | re.IGNORECASE)
+FINAL_ANSWER_RE = re.compile(r"(?:\*\*Answer:\*\*|final answer is|the answer is)\s*:?\s*(.+)", re.IGNORECASE)
+TEXT_RE = re.compile(r"\\(?:text|textbf|mathrm|mbox)\s*\{([^{}]*)\}")
+SPACING_RE = re.compile(r"\\[,;:! ]|\\(?:left|right|displaystyle|quad|qquad)\b|\s+")
+THOUSANDS_RE = re.compile(r"^-?\d{1,3}(?:,\d{3})+(?:\.\d+)?$")
+NUMBER_RE = re.compile(r"^-?(?:\d+\.?\d*|\.\d+)$")
+FRACTION_RE = re.compile(r"^(-?)\\frac\{(-?\d+)\}\{(-?\d+)\}$|^(-?\d+)/(-?\d+)$")
+LETTER_REFERENCE_RE = re.compile(r"^[a-e]$")
+# Left-hand sides dropped when only one side is an equation: "x=3" against "3", "f(n)=n" against "n"
+LHS_RE = re.compile(r"^[a-z]\w*(?:\([a-z,]*\))?=(?!=)")
+# parse_expr evaluates its input: only names, number literals, operators and brackets get there. A dot is only
+# allowed inside a number, so no attribute access such as (1).real; no quotes, dunders or other characters.
+# Names and numbers are matched whole (the lookaheads), so a failing match does not backtrack through splits.
+SAFE_EXPRESSION_RE = re.compile(
+    r"^(?!.*__)(?:[A-Za-z_][A-Za-z0-9_]*(?![A-Za-z0-9_])|\d+\.\d+(?![\d.])|\d+\.(?![\w.])|\.\d+(?![\d.])|\d+(?![\d.])"
+    r"|[+\-*/(),!= ])*$"
+)
+
+# LaTeX -> sympy syntax, for the symbolic check
+LATEX_REPLACEMENTS = [
+    (re.compile(r"\\[dt]frac"), r"\\frac"),
+    (re.compile(r"\\(?:cdot|times)"), "*"),
+    (re.compile(r"\\div"), "/"),
+    (re.compile(r"\\pi"), "pi"),
+    (re.compile(r"\\infty"), "oo"),
+    (re.compile(r"\\(ln|log|sin|cos|tan|exp)"), r"\1"),
+    (re.compile(r"\^\{\\circ\}|\^\\circ|°"), ""),
+]
+INNER_FRAC_RE = re.compile(r"\\frac\{([^{}]*)\}\{([^{}]*)\}")
+INNER_ROOT_RE = re.compile(r"\\sqrt\[([^\[\]]*)\]\{([^{}]*)\}")
+INNER_SQRT_RE = re.compile(r"\\sqrt\{([^{}]*)\}")
+SHORT_SQRT_RE = re.compile(r"\\sqrt(\w)")
+
+
+def last_boxed(text):
+    """Content of the last \\boxed{...} of text, with nested braces, or None."""
+    starts = list(BOXED_START_RE.finditer(text))
+    if not starts:
+        return None
+    depth, begin = 1, starts[-1].end()
+    for i in range(begin, len(text)):
+        depth += {"{": 1, "}": -1}.get(text[i], 0)
+        if depth == 0:
+            return text[begin:i]
+    return None
+
+def extract_answer(text):
+    """Final answer of a solution or raw response: last \\boxed{}, else the ## Solution section, else an answer line."""
+    if not isinstance(text, str):
+        return None
+    # The <think> block is dropped as in split_think, so a \boxed{} drafted while thinking is not the answer
+    start = text.find(THINK_OPEN)
+    end = text.find(THINK_CLOSE, start + len(THINK_OPEN)) if start != -1 else -1
+    if end != -1:
+        text = text.replace(text[start:end + len(THINK_CLOSE)], "")
+    boxed = last_boxed(text)
+    if boxed is not None:
+        return boxed.strip()
+    for pattern in (SOLUTION_SECTION_RE, FINAL_ANSWER_RE):
+        match = pattern.search(text)
+        if match:
+            text = match.group(1)
+            break
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    return lines[0].strip() if lines else None
+
+def normalise(answer):
+    """Canonical string of an answer: no math delimiters, LaTeX spacing, \\text{} wrappers or case differences."""
+    if answer is None or (isinstance(answer, float) and math.isnan(answer)):
+        return ""
+    text = str(answer).strip().strip("$").strip()
+    text = re.sub(r"^\\\[|\\\]$|^\\\(|\\\)$", "", text)
+    text = TEXT_RE.sub(r"\1", text)
+    text = SPACING_RE.sub("", text)
+    text = text.replace("\\dfrac", "\\frac").replace("\\tfrac", "\\frac").replace("\\%", "%")
+    text = text.rstrip(".").lower()
+    if THOUSANDS_RE.match(text):
+        text = text.replace(",", "")
+    return text
+
+def to_number(text):
+    """Float of a normalised integer, decimal, simple fraction or percentage, or None."""
+    percent = text.endswith("%")
+    text = text.rstrip("%")
+    if NUMBER_RE.match(text):
+        value = float(text)
+    else:
+        match = FRACTION_RE.match(text)
+        if not match:
+            return None
+        sign, numerator, denominator = (match.group(1), match.group(2), match.group(3)) if match.group(2) else ("", match.group(4), match.group(5))
+        if int(denominator) == 0:
+            return None
+        value = (-1 if sign else 1) * int(numerator) / int(denominator)
+    return value / 100 if percent else value
+
+def numbers_equal(prediction, reference, rel_tol=REL_TOL):
+    """
+    True when both are numbers equal within rel_tol, or when a prediction with two or more decimals equals
+    the reference rounded to as many decimals (0.71 for 1/sqrt(2) written as a fraction is not accepted).
+    """
+    p, r = to_number(prediction), to_number(reference)
+    if p is None or r is None:
+        return None
+    if math.isclose(p, r, rel_tol=rel_tol, abs_tol=1e-12):
+        return True
+    decimals = len(prediction.rstrip("%").partition(".")[2])
+    return decimals >= 2 and round(r, decimals) == p
+
+def latex_to_sympy(text):
+    for pattern, replacement in LATEX_REPLACEMENTS:
+        text = pattern.sub(replacement, text)
+    # Innermost \frac and \sqrt first, until none is left
+    previous = None
+    while previous != text:
+        previous = text
+        text = INNER_FRAC_RE.sub(r"((\1)/(\2))", text)
+        text = INNER_ROOT_RE.sub(r"((\2)**(1/(\1)))", text)
+        text = INNER_SQRT_RE.sub(r"sqrt(\1)", text)
+    text = SHORT_SQRT_RE.sub(r"sqrt(\1)", text)
+    return text.replace("{", "(").replace("}", ")").replace("^", "**").replace("\\", "")
+
+def comparable(prediction, reference):
+    """An equation is compared with a bare expression through its right-hand side."""
+    if ("=" in prediction) != ("=" in reference):
+        return LHS_RE.sub("", prediction), LHS_RE.sub("", reference)
+    return prediction, reference
+
+def _parse(text):
+    from sympy.parsing.sympy_parser import (parse_expr, standard_transformations, implicit_multiplication_application,
+                                            convert_xor, factorial_notation)
+    transformations = standard_transformations + (implicit_multiplication_application, convert_xor, factorial_notation)
+    expression = latex_to_sympy(text)
+    if not SAFE_EXPRESSION_RE.match(expression):
+        raise ValueError(f"Not an arithmetic expression: {expression}")
+    return parse_expr(expression, global_dict=_sympy_namespace(), transformations=transformations, evaluate=True)
+
+_NAMESPACE = {}
+
+def _sympy_namespace():
+    # The sympy names only: parse_expr's default namespace also holds builtins such as eval, open and chr
+    if not _NAMESPACE:
+        exec("from sympy import *", _NAMESPACE)
+        _NAMESPACE["__builtins__"] = {}
+    return _NAMESPACE
+
+def symbolic_equal(prediction, reference):
+    """True/False when both sides parse and their difference simplifies (or not) to 0, None when they do not parse."""
+    import sympy
+
+    p_sides, r_sides = prediction.split("="), reference.split("=")
+    if len(p_sides) != len(r_sides):
+        return None
+    try:
+        # Answers that are not expressions (e.g. "(6,30),(10,10)") make compile() warn before they fail
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", SyntaxWarning)
+            for p, r in zip(p_sides, r_sides):
+                if sympy.simplify(_parse(p) - _parse(r)) != 0:
+                    return False
+        return True
+    except TimeoutError:
+        raise
+    except Exception:
+        return None
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError
+
+def _symbolic_worker(prediction, reference, timeout):
+    # SIGALRM interrupts a simplify() that runs past the timeout; without it (Windows, or outside the main
+    # thread) the check is unguarded
+    guarded = hasattr(signal, "SIGALRM") and timeout and threading.current_thread() is threading.main_thread()
+    # Imported before the timer starts: an import interrupted by the alarm would leave sympy half initialised
+    import sympy.parsing.sympy_parser
+    if guarded:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return symbolic_equal(prediction, reference), "symbolic"
+    except TimeoutError:
+        return None, "timeout"
+    finally:
+        if guarded:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class CorrectnessChecker:
+    """Compares answers with references, memoising every decided comparison in a persistent TSV."""
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, letter_re=READING_COMPREHENSION_LETTER_RE, rel_tol=REL_TOL,
+                 timeout=DEFAULT_TIMEOUT, workers=1, symbolic=HAS_SYMPY):
+        self.cache_path = os.path.abspath(cache_path) if cache_path else None
+        self.letter_re = letter_re
+        self.rel_tol = rel_tol
+        self.timeout = timeout
+        self.workers = workers
+        self.symbolic = symbolic
+        # Part of every memo key: a verdict only holds for the rules that made it
+        pattern = (letter_re.pattern, letter_re.flags) if letter_re is not None else None
+        self._settings = repr((float(rel_tol), pattern, bool(symbolic)))
+        self._memo = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "r+b") as f:
+                data = f.read()
+                # A crash while appending can leave an incomplete last line: drop it, it is simply checked again
+                if data and not data.endswith(b"\n"):
+                    data = data[:data.rfind(b"\n") + 1]
+                    f.truncate(len(data))
+            for line in data.decode("utf-8").splitlines():
+                key, correct, method = line.split("\t")
+                self._memo[key] = (int(correct), method)
+
+    def __len__(self):
+        return len(self._memo)
+
+    def key(self, prediction, reference):
+        return xxhash.xxh3_128_hexdigest(f"{self._settings}\0{prediction}\0{reference}".encode("utf-8"))
+
+    def letter(self, prediction):
+        match = self.letter_re.search(prediction) if self.letter_re is not None else None
+        groups = [g for g in match.groups() if g] if match else []
+        return groups[0].lower() if groups else None
+
+    def fast_check(self, prediction, reference):
+        """(correct, method) from the cheap comparisons, or None when only the symbolic check can decide."""
+        if not prediction or not reference:
+            return 0, "missing"
+        if prediction == reference:
+            return 1, "exact"
+        if LETTER_REFERENCE_RE.match(reference):
+            return int(prediction == reference or self.letter(prediction) == reference), "letter"
+        prediction, reference = comparable(prediction, reference)
+        if prediction == reference:
+            return 1, "exact"
+        numeric = numbers_equal(prediction, reference, self.rel_tol)
+        if numeric is not None:
+            return int(numeric), "numeric"
+        if not self.symbolic:
+            return 0, "unchecked"
+        return None
+
+    def check(self, predictions, references):
+        """(correct, method) for every prediction/reference pair of normalised answers, in order."""
+        pairs = list(zip(predictions, references))
+        results = {}
+        todo = {}
+        for prediction, reference in pairs:
+            key = self.key(prediction, reference)
+            if key in results or key in todo:
+                continue
+            if key in self._memo:
+                results[key] = self._memo[key]
+                continue
+            fast = self.fast_check(prediction, reference)
+            if fast is not None:
+                results[key] = fast
+            else:
+                todo[key] = comparable(prediction, reference)
+
+        if todo:
+            keys = list(todo)
+            args = ([todo[k][0] for k in keys], [todo[k][1] for k in keys], [self.timeout] * len(keys))
+            if self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    outcomes = list(executor.map(_symbolic_worker, *args, chunksize=max(1, len(keys) // (4 * self.workers))))
+            else:
+                outcomes = [_symbolic_worker(*a) for a in zip(*args)]
+            for key, (equal, method) in zip(keys, outcomes):
+                results[key] = (int(bool(equal)), method if equal is not None or method == "timeout" else "unparsed")
+
+        self._remember({k: v for k, v in results.items() if k not in self._memo})
+        return [results[self.key(p, r)] for p, r in pairs]
+
+    def _remember(self, decided):
+        # Timeouts and comparisons left unchecked without sympy are not memoised: a later run can still decide them
+        decided = {k: v for k, v in decided.items() if v[1] not in ("timeout", "unchecked")}
+        self._memo.update(decided)
+        if self.cache_path and decided:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, "a", encoding="utf-8") as f:
+                f.write("".join(f"{k}\t{c}\t{m}\n" for k, (c, m) in decided.items()))
+
+
+def prediction_texts(df, model):
+    """The solution column of a model when parsed, else its raw response column."""
+    if f"{model}_solution" in df.columns:
+        solutions = df[f"{model}_solution"].astype(object)
+        if model in df.columns:
+            solutions = solutions.where(solutions.map(lambda x: isinstance(x, str) and x.strip() != ""), df[model])
+        return solutions
+    return df[model].astype(object)
+
+def correctness_table(df, checker, answer_col=None, models=REASONING_MODELS):
+    """
+    Table with the id column and, per model, the extracted answer, '{model}_correct' (1/0) and the method
+    that decided it. All models are checked in one batch, so a repeated answer is compared once.
+    """
+    answer_col = answer_col or next((col for col in ANSWER_COLUMNS if col in df.columns), None)
+    if answer_col is None or answer_col not in df.columns:
+        expected = [answer_col] if answer_col else ANSWER_COLUMNS
+        raise ValueError(f"No reference answer column, expected one of {expected} (see --answer_col).")
+    models = [m for m in models if m in df.columns or f"{m}_solution" in df.columns]
+    references = [normalise(a) for a in df[answer_col]]
+    extracted = {m: [extract_answer(t) for t in prediction_texts(df, m)] for m in models}
+    predictions = [normalise(a) for m in models for a in extracted[m]]
+    results = checker.check(predictions, references * len(models))
+
+    table = {}
+    id_col = next((col for col in ID_COLUMNS if col in df.columns), None)
+    if id_col:
+        table[id_col] = df[id_col].to_numpy()
+    for k, model in enumerate(models):
+        block = results[k * len(df):(k + 1) * len(df)]
+        table[f"{model}_answer"] = extracted[model]
+        table[f"{model}_correct"] = [correct for correct, _ in block]
+        table[f"{model}_check"] = [method for _, method in block]
+    return pd.DataFrame(table)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the final answers of every model against the reference answers.")
+    parser.add_argument('--input', required=True, help='Wide analysis CSV with the reference answer and the model solution or response columns')
+    parser.add_argument('--task', required=True, choices=list(TASKS), help='Task, for its multiple-choice letter regex')
+    parser.add_argument('--answer_col', default=None, help=f'Reference answer column (default: the first of {ANSWER_COLUMNS})')
+    parser.add_argument('--output', default=None, help='Output CSV (default: <input>_correctness.csv)')
+    parser.add_argument('--workers', type=int, default=1, help='Processes for the symbolic checks')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds allowed for one symbolic check')
+    parser.add_argument('--rel_tol', type=float, default=REL_TOL, help='Relative tolerance of the numeric comparison')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help='Memo TSV of the decided comparisons')
+    parser.add_argument('--no_symbolic', action='store_true', help='Skip the sympy check even when sympy is installed')
+    args = parser.parse_args()
+
+    letter_re = TASKS[args.task]["letter_re"] or READING_COMPREHENSION_LETTER_RE
+    checker = CorrectnessChecker(args.cache, letter_re, args.rel_tol, args.timeout, args.workers,
+                                 symbolic=HAS_SYMPY and not args.no_symbolic)
+    df = pd.read_csv(args.input)
+    before = len(checker)
+    table = correctness_table(df, checker, args.answer_col)
+    output_csv = args.output or os.path.splitext(args.input)[0] + "_correctness.csv"
+    table.to_csv(output_csv, index=False)
+    correct = table[[c for c in table.columns if c.endswith("_correct")]].mean()
+    print(f"{len(df)} rows, {len(checker) - before} new comparisons memoised -> {output_csv}")
+    print(correct.to_string(float_format=lambda x: f"{x:.3f}"))
+
+if __name__ == "__main__":
+    main()
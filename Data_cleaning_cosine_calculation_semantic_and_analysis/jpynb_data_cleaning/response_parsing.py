@@ -0,0 +1,299 @@
+import os
+import re
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# Parsing of the model responses shared by the *_data_cleaning notebooks: <think> splitting, reasoning/solution
+# extraction with the structure score, and answer-letter cleaning. Every pattern is compiled once, the work is
+# done with pandas .str methods on a single Series holding all the model columns, and each task keeps the exact
+# rules of its notebook.
+
+REASONING_MODELS = ["deepseek-r1:1.5b", "deepseek-r1:14b", "qwen2.5:1.5b", "qwen2.5:14b"]
+ID_COLUMNS = ["uuid", "QuestionID"]
+
+THINK_OPEN, THINK_CLOSE = "<think>", "</think>"
+
+# math and proofs: "## Reasoning ... ## Solution X", with **Answer:** and \boxed{X} fallbacks. The notebooks'
+# lazy patterns "##\s*Reasoning\s*(.*?)(?=<stop>|$)" and "^(.*?)(?=<stop>)" are run as a search for the heading
+# followed by a search for the first stop marker, which gives the same text without trying the lookahead at every
+# character.
+REASONING_HEADING_RE = re.compile(r"##\s*Reasoning\s*", re.IGNORECASE)
+REASONING_STOP_RE = re.compile(r"##\s*Solution|\*\*Answer:|\\boxed\{[A-D]\}", re.IGNORECASE)
+SOLUTION_LINE_RE = re.compile(r"##\s*Solution\s*([A-D])\s*$", re.MULTILINE)
+ANSWER_RE = re.compile(r"\*\*Answer:\*\*\s*([A-D])", re.IGNORECASE)
+BOXED_RE = re.compile(r"\\boxed\{([A-D])\}")
+RAW_SOLUTION_RE = re.compile(r"(##\s*Solution|\*\*Answer:\*\*|\[\s*\\boxed\{[A-D]\}\s*\])\s*(.*)", re.DOTALL | re.IGNORECASE)
+
+# essay_evaluation: required sections and the band score, first matching pattern wins
+ESSAY_SECTIONS = [
+    "## Task Achievement",
+    "## Coherence and Cohesion",
+    "## Lexical Resource",
+    "## Grammatical Range and Accuracy",
+    "## Overall Band Score",
+    "## Feedback and Additional Comments",
+]
+BAND_SCORE_RES = [re.compile(p, re.IGNORECASE) for p in [
+    r"Suggested\s+(?:Overall\s+)?Band\s+Score\s*:\s*(?!\s*\()\**\s*([0-9](?:\.\d)?)\s*\**",
+    r"\*\*Overall\s+Band\s+Score:\*\*\s*<\s*(\d+(?:\.\d+)?)\s*>",
+    r"\**\s*Overall\s+Band\s+Score\s*:\s*<\s*(\d+(?:\.\d+)?)\s*>",
+    r"\boverall\s+(?:band\s+)?score\s*(?:is|was|=|of)?\s*[:\-]?\s*(\d+(?:\.\d+)?)",
+    r"\*\*Overall\s+Band\s+Score\*\*:\s*(?:.+?)\((\d+(?:\.\d+)?)\)",
+    r"(?:has|have|was|were|is|are)?\s*(?:awarded|received|achieved|got|obtained)?\s*(?:an?\s+)?([0-9](?:\.\d)?)\s+band\s+score",
+]]
+SOLUTION_BAND_SCORE_RE = re.compile(r"Suggested\s*Overall\s*Band\s*Score\s*:\s*\**\s*(\d+(?:\.\d+)?)\s*\**", re.IGNORECASE)
+
+# Answer letters, as in each notebook's clean_solution
+CRITICAL_REASONING_LETTER_RE = re.compile(
+    r'(?i)(?:\\boxed\{\\text\{([A-E])\}\}'
+    r'|\\text\{([A-E])\}'
+    r'|\*\*([A-E])\*\*'
+    r'|\(([A-E])\)'
+    r'|#\s*([A-E])'
+    r'|answer\s*[:\s]*([A-E])'
+    r'|final\s+answer\s*[:\s]*([A-E])'
+    r'|correct\s+answer\s+is\s*[:\s]*([A-E])'
+    r'|^([A-E])$'
+    r')'
+)
+READING_COMPREHENSION_LETTER_RE = re.compile(
+    r"""(?ix)
+    (?:\\boxed\{\\text\{([A-E])\}\})
+    |(?:\\text\{([A-E])\})
+    |(?:\*\*\s*([A-E])\s*\*\*)
+    |(?:\(\s*([A-E])\s*\))
+    |(?:[#>*\-]+\s*([A-E]))
+    |(?:(?:answer|solution|final\s+answer|correct\s+answer\s+is)[\s:\n\*]*([A-E]))
+    |(?:^([A-E])$)
+    """
+)
+MATH_LETTER_RE = re.compile(r'(?:\\boxed\{\\text\{([A-Da-d])\}\}|\\text\{([A-Da-d])\}|^([A-Da-d]):|([A-Da-d]))')
+
+# structure: how the response is split into reasoning and solution
+#   markers  -> text between the two markers is the reasoning, text after the second one the solution
+#   sections -> the math/proofs parser above
+#   essay    -> the whole response is the reasoning, scored on its sections and band score
+TASKS = {
+    "critical_reasoning": {"structure": "markers", "markers": ("# Argument Construction", "# Answer"),
+                           "letter_re": CRITICAL_REASONING_LETTER_RE},
+    "reading_comprehension": {"structure": "markers", "markers": ("## Reasoning", "## Solution"),
+                              "letter_re": READING_COMPREHENSION_LETTER_RE},
+    "math": {"structure": "sections", "letter_re": MATH_LETTER_RE},
+    "proofs": {"structure": "sections", "letter_re": None},
+    "essay_evaluation": {"structure": "essay", "letter_re": None},
+}
+
+
+def split_think(responses):
+    """Splits every response into its <think> block and the rest. Returns (think, response) Series."""
+    responses = responses.astype(object)
+    is_text = responses.map(lambda x: isinstance(x, str)).to_numpy()
+    text = responses[is_text]
+    start = text.str.find(THINK_OPEN)
+    end = [t.find(THINK_CLOSE, s + len(THINK_OPEN)) if s != -1 else -1 for t, s in zip(text, start)]
+    has_think = (start != -1).to_numpy() & (np.array(end, dtype=int) != -1)
+
+    think = pd.Series("", index=responses.index, dtype=object)
+    response = responses.copy()
+    rows = text.index[has_think]
+    think[rows] = [t[s + len(THINK_OPEN):e].strip() for t, s, e in zip(text[has_think], start[has_think], np.array(end)[has_think])]
+    # Like the notebooks, every copy of the matched block is removed from the response
+    response[rows] = [
+        t.replace(t[s:e + len(THINK_CLOSE)], "").strip()
+        for t, s, e in zip(text[has_think], start[has_think], np.array(end)[has_think])
+    ]
+    return think, response
+
+def split_markers(responses, reasoning_marker, solution_marker):
+    """Reasoning between the two markers and solution after the second one; the whole text and score 1 otherwise."""
+    text = responses.str.strip()
+    start = text.str.find(reasoning_marker).fillna(-1).astype(int)
+    end = text.str.find(solution_marker).fillna(-1).astype(int)
+    ok = ((start != -1) & (end != -1) & (start < end)).to_numpy()
+
+    reasoning = text.fillna("").copy()
+    solution = text.fillna("").copy()
+    reasoning[ok] = [t[s + len(reasoning_marker):e].strip() for t, s, e in zip(text[ok], start[ok], end[ok])]
+    solution[ok] = [t[e + len(solution_marker):].strip() for t, e in zip(text[ok], end[ok])]
+    return reasoning, solution, pd.Series(np.where(ok, 0, 1), index=responses.index)
+
+def _reasoning_section(text):
+    heading = REASONING_HEADING_RE.search(text)
+    if heading:
+        stop = REASONING_STOP_RE.search(text, heading.end())
+        return text[heading.end():stop.start() if stop else len(text)].strip()
+    return ""
+
+def _text_before_stop(text):
+    stop = REASONING_STOP_RE.search(text)
+    return text[:stop.start()].strip() if stop else ""
+
+def split_sections(responses):
+    """parse_and_score_model_column of the math and proofs notebooks, vectorised over a Series."""
+    text = responses.map(str)
+    has_reasoning = text.str.contains("## Reasoning", regex=False)
+    reasoning = pd.Series(
+        [_reasoning_section(t) if h else _text_before_stop(t) for t, h in zip(text, has_reasoning)],
+        index=text.index, dtype=object,
+    )
+
+    # Solution: "## Solution X" line, else **Answer:** X, else \boxed{X}, else the raw text after a heading,
+    # each pattern only searched in the rows still without a solution
+    solution_line = text.str.extract(SOLUTION_LINE_RE)[0]
+    solution = solution_line.astype(object)
+    for pattern, group in ((ANSWER_RE, 0), (BOXED_RE, 0), (RAW_SOLUTION_RE, 1)):
+        missing = solution.isna()
+        if not missing.any():
+            break
+        solution[missing] = text[missing].str.extract(pattern)[group]
+    solution = solution.str.strip().fillna("")
+    score = pd.Series(np.where(solution_line.notna() & has_reasoning, 0, 1), index=responses.index)
+
+    failed = (reasoning.str.strip() == "") | (solution.str.strip() == "")
+    reasoning[failed] = text[failed]
+    solution[failed] = text[failed]
+    score[failed] = 1
+    return reasoning, solution, score
+
+def first_match(text, patterns):
+    """Float of the first group of the first pattern that matches each text."""
+    result = pd.Series(np.nan, index=text.index)
+    for pattern in patterns:
+        result = result.combine_first(pd.to_numeric(text.str.extract(pattern)[0], errors="coerce"))
+    return result
+
+def essay_structure(responses):
+    """check_band_score_structure of the essay notebook: (structure score, band score) per response."""
+    is_text = responses.map(lambda x: isinstance(x, str))
+    text = responses.where(is_text, "")
+    complete = np.logical_and.reduce([text.str.contains(section, regex=False) for section in ESSAY_SECTIONS])
+    score = pd.Series(np.where(complete & is_text, 0, 1), index=responses.index)
+    return score, first_match(text.where(is_text), BAND_SCORE_RES)
+
+def solution_band_score(solutions):
+    """extract_band_score of the essay notebook, for the reference evaluations."""
+    text = solutions.str.replace("\xa0", " ", regex=False).str.replace(r"\s+", " ", regex=True).str.strip()
+    return first_match(text, [SOLUTION_BAND_SCORE_RE])
+
+def clean_solution(solutions, letter_re):
+    """Upper-case answer letter found by letter_re in each solution, NaN when there is none."""
+    text = solutions.where(solutions.map(lambda x: isinstance(x, str))).str.strip()
+    letters = text.str.extract(letter_re).astype(object)
+    return letters.bfill(axis=1).iloc[:, 0].str.upper()
+
+def parse_series(responses, task):
+    """
+    Parses one Series of raw responses (any mix of models) with the rules of task.
+    Returns a DataFrame with think, reasoning, solution and structure_score (band_score for essays).
+    """
+    if task not in TASKS:
+        raise ValueError(f"Unknown task '{task}', expected one of {list(TASKS)}.")
+    config = TASKS[task]
+    think, response = split_think(responses)
+    parsed = {"think": think}
+    if config["structure"] == "markers":
+        parsed["reasoning"], parsed["solution"], parsed["structure_score"] = split_markers(response, *config["markers"])
+    elif config["structure"] == "sections":
+        parsed["reasoning"], parsed["solution"], parsed["structure_score"] = split_sections(response)
+    else:
+        parsed["reasoning"] = response
+        parsed["structure_score"], parsed["band_score"] = essay_structure(response)
+    if config["letter_re"] is not None:
+        parsed["solution"] = clean_solution(parsed["solution"], config["letter_re"])
+    return pd.DataFrame(parsed, index=responses.index)
+
+def parse_responses(df, task, models=REASONING_MODELS):
+    """
+    Parses the wide table produced by the pivot (one raw response column per model) in one pass over all
+    the model columns, and adds the '{model}_reasoning', '{model}_solution' and '{model}_structure_score'
+    columns ('{model}_band_score' for essays). The raw response columns are kept.
+    """
+    models = [m for m in models if m in df.columns]
+    if not models:
+        return df.copy()
+    stacked = pd.concat([df[m] for m in models], keys=models)
+    parsed = parse_series(stacked, task)
+
+    df = df.copy()
+    for model_name in models:
+        for column in parsed.columns:
+            if column != "think":
+                df[f"{model_name}_{column}"] = parsed.loc[model_name, column].to_numpy()
+    return df
+
+def add_correct_columns(df, answer_col, models=REASONING_MODELS):
+    # 1 when the cleaned solution equals the reference answer, as in the notebooks
+    for model_name in models:
+        if f"{model_name}_solution" in df.columns:
+            df[f"{model_name}_correct"] = np.where(df[f"{model_name}_solution"] == df[answer_col], 1, 0)
+    return df
+
+
+def state_path(output_csv):
+    return output_csv + ".state.json"
+
+def stream_parse(input_csv, output_csv, task, chunksize=500, hold_last=False):
+    """
+    Parses the rows a generator has appended to input_csv since the last call and appends them to output_csv.
+    The number of rows already parsed is kept next to the output. With hold_last, the last row is left for
+    the next call, since a generator that is still running may not have finished writing it.
+    Returns the number of rows parsed.
+    """
+    state_file = state_path(output_csv)
+    done = 0
+    if os.path.exists(state_file) and os.path.exists(output_csv):
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        # A generator run with --reset-output rewrites the input from scratch
+        if os.path.getsize(input_csv) >= state["input_bytes"]:
+            done = state["rows"]
+            # Drop a chunk written after the last state update by an interrupted run
+            with open(output_csv, "r+b") as f:
+                f.truncate(state["output_bytes"])
+    if done == 0 and os.path.exists(output_csv):
+        os.remove(output_csv)
+
+    input_bytes = os.path.getsize(input_csv)
+    new_rows = pd.read_csv(input_csv, skiprows=range(1, done + 1))
+    if hold_last:
+        new_rows = new_rows.iloc[:-1]
+    for start in range(0, len(new_rows), chunksize):
+        chunk = new_rows.iloc[start:start + chunksize]
+        parsed = parse_series(chunk["response"], task)
+        keep = [c for c in chunk.columns if c != "response"]
+        out = pd.concat([chunk[keep], parsed], axis=1)
+        out.to_csv(output_csv, mode="a", header=not os.path.exists(output_csv), index=False)
+        done += len(chunk)
+        state = {
+            "rows": done, "input_bytes": input_bytes, "output_bytes": os.path.getsize(output_csv),
+            "input": os.path.abspath(input_csv), "task": task,
+        }
+        with open(state_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(state_file + ".tmp", state_file)
+    return len(new_rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse generated responses into think, reasoning, solution and structure score.")
+    parser.add_argument('--input', required=True, help='Generator output CSV (id, response, model, time_taken_seconds)')
+    parser.add_argument('--task', required=True, choices=list(TASKS), help='Task whose parsing rules are applied')
+    parser.add_argument('--output', default=None, help='Parsed CSV (default: <input>_parsed.csv)')
+    parser.add_argument('--chunksize', type=int, default=500, help='Rows parsed and written at a time')
+    parser.add_argument('--follow', action='store_true', help='Keep polling the input for rows appended by a running generator')
+    parser.add_argument('--interval', type=float, default=30, help='Seconds between polls with --follow')
+    args = parser.parse_args()
+
+    output_csv = args.output or os.path.splitext(args.input)[0] + "_parsed.csv"
+    while True:
+        parsed = stream_parse(args.input, output_csv, args.task, args.chunksize, hold_last=args.follow)
+        if parsed:
+            print(f"Parsed {parsed} new rows -> {output_csv}")
+        if not args.follow:
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+import argparse
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from data_access import BASE_DIR, ID_COLUMNS, TASKS, DEFAULT_CACHE_DIR, cosine_path, load_table, table_columns
+
+# Statistical comparison of the models on every metric of every task, as one tidy table.
+# For each family (task, problem type, metric) the scores of the four models are stacked into an
+# (n_rows, n_models) matrix, so the Shapiro-Wilk tests of all models are a single vectorised scipy call and
+# the bootstrap draws one (n_resamples, n_rows) index matrix that resamples every model and pair at once.
+# Large resample counts are split in chunks, each with its own child seed, and can be spread over processes;
+# the result does not depend on the number of workers.
+# Wilcoxon runs once per pair, since a batched call can pick one exact/normal method for every pair.
+
+MODELS = ["deepseek-r1:1.5b", "deepseek-r1:14b", "qwen2.5:1.5b", "qwen2.5:14b"]
+GROUP_COLUMNS = ["problem_type", "type"]
+BOOTSTRAP_STATISTICS = {"mean": np.mean, "median": np.median}
+RESULT_COLUMNS = ["task", "group", "metric", "test", "model_1", "model_2", "n",
+                  "statistic", "p_value", "p_adj", "estimate", "ci_low", "ci_high"]
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, "cosine_datasets", "model_comparisons.csv")
+
+
+def score_matrix(df, metric, models=MODELS):
+    """
+    Scores of every model on a metric as an (n_rows, n_models) float array, from a wide table with
+    '{model}_{metric}' columns or a long table with 'model' and metric columns. Returns (matrix, models).
+    """
+    if "model" in df.columns and metric in df.columns:
+        id_col = next(col for col in ID_COLUMNS if col in df.columns)
+        wide = df.pivot_table(index=id_col, columns="model", values=metric, aggfunc="first", observed=True)
+        models = [m for m in models if m in wide.columns]
+        return wide[models].to_numpy(dtype=float), models
+    models = [m for m in models if f"{m}_{metric}" in df.columns]
+    return df[[f"{m}_{metric}" for m in models]].to_numpy(dtype=float), models
+
+def _bootstrap_chunk(X, n_resamples, seed, statistics):
+    # One index matrix per chunk: row b of idx is the b-th resample of the rows of X
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, X.shape[0], size=(n_resamples, X.shape[0]))
+    resampled = X[idx]
+    return {name: BOOTSTRAP_STATISTICS[name](resampled, axis=1) for name in statistics}
+
+def bootstrap(X, n_resamples=10000, seed=0, statistics=("mean", "median"), chunk_size=1000, executor=None):
+    """
+    Bootstrap distribution of each statistic for every column of X (rows resampled jointly, so pair
+    differences are paired). Returns {statistic: array of shape (n_resamples, n_columns)}.
+    """
+    sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if executor is not None:
+        chunks = list(executor.map(_bootstrap_chunk, [X] * len(sizes), sizes, seeds, [statistics] * len(sizes)))
+    else:
+        chunks = [_bootstrap_chunk(X, size, s, statistics) for size, s in zip(sizes, seeds)]
+    return {name: np.concatenate([c[name] for c in chunks]) for name in statistics}
+
+def compare_models(X, models, confidence=0.95, n_resamples=10000, seed=0, statistics=("mean", "median"),
+                   chunk_size=1000, executor=None):
+    """
+    Every test of one family as a list of result dicts: Shapiro-Wilk per model (on its non-missing scores),
+    Wilcoxon per pair with Bonferroni-adjusted p-values as in the notebook, and bootstrap CIs of each
+    statistic per model and of its difference per pair. Wilcoxon and bootstrap use the rows where every
+    model has a score (the notebook's dropna(subset=cosine_cols)).
+    """
+    from scipy import stats
+
+    rows = []
+    pairs = list(combinations(range(len(models)), 2))
+    complete = X[~np.isnan(X).any(axis=1)]
+    alpha = (1 - confidence) / 2 * 100
+
+    counts = (~np.isnan(X)).sum(axis=0)
+    shapiro = stats.shapiro(X, axis=0, nan_policy="omit") if X.shape[0] >= 3 else None
+    for k, model in enumerate(models):
+        rows.append({"test": "shapiro", "model_1": model, "n": int(counts[k]),
+                     "statistic": shapiro.statistic[k] if shapiro else np.nan,
+                     "p_value": shapiro.pvalue[k] if shapiro else np.nan})
+
+    if pairs and len(complete) > 0:
+        i, j = np.array(pairs).T
+        # One test per pair, as the notebook's wilcoxon(subset[m1], subset[m2]) loop
+        wilcoxon = [stats.wilcoxon(complete[:, a], complete[:, b]) for a, b in pairs]
+        p_adj = np.minimum(1, np.array([w.pvalue for w in wilcoxon]) * len(pairs))
+        for k, (a, b) in enumerate(pairs):
+            rows.append({"test": "wilcoxon", "model_1": models[a], "model_2": models[b], "n": len(complete),
+                         "statistic": wilcoxon[k].statistic, "p_value": wilcoxon[k].pvalue, "p_adj": p_adj[k]})
+
+    if n_resamples and len(complete) > 0:
+        distributions = bootstrap(complete, n_resamples, seed, statistics, chunk_size, executor)
+        for name, dist in distributions.items():
+            observed = BOOTSTRAP_STATISTICS[name](complete, axis=0)
+            low, high = np.percentile(dist, [alpha, 100 - alpha], axis=0)
+            for k, model in enumerate(models):
+                rows.append({"test": f"bootstrap_{name}", "model_1": model, "n": len(complete),
+                             "estimate": observed[k], "ci_low": low[k], "ci_high": high[k]})
+            if pairs:
+                diff = dist[:, i] - dist[:, j]
+                diff_low, diff_high = np.percentile(diff, [alpha, 100 - alpha], axis=0)
+                for k, (a, b) in enumerate(pairs):
+                    rows.append({"test": f"bootstrap_{name}_difference", "model_1": models[a], "model_2": models[b],
+                                 "n": len(complete), "estimate": observed[a] - observed[b],
+                                 "ci_low": diff_low[k], "ci_high": diff_high[k]})
+    return rows
+
+def families(df, metrics, pooled=False):
+    """(group, metric, matrix, models) for every problem type (or the whole table) and metric."""
+    group_col = next((col for col in GROUP_COLUMNS if col in df.columns), None)
+    groups = [("all", df)] if group_col is None or pooled else []
+    if group_col is not None:
+        groups += [(str(g), sub) for g, sub in df.groupby(group_col, observed=True, sort=True)]
+    for group, sub in groups:
+        for metric in metrics:
+            X, models = score_matrix(sub, metric)
+            if models:
+                yield group, metric, X, models
+
+def results_table(tables, metrics, pooled=False, executor=None, **kwargs):
+    """Tidy table of every test for every task in tables ({task: DataFrame}), family by family."""
+    rows = []
+    for task, df in tables.items():
+        for group, metric, X, models in families(df, metrics, pooled):
+            for row in compare_models(X, models, executor=executor, **kwargs):
+                rows.append({"task": task, "group": group, "metric": metric, **row})
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+def check_wilcoxon(tables, results, metrics, pooled=False):
+    """
+    Recomputes every Wilcoxon test with the notebook's loop (dropna on the model columns, then
+    wilcoxon(subset[m1], subset[m2]) for each pair) and returns the results rows whose p-value differs.
+    """
+    from scipy import stats
+
+    expected = []
+    for task, df in tables.items():
+        for group, metric, X, models in families(df, metrics, pooled):
+            subset = pd.DataFrame(X, columns=models).dropna()
+            if len(subset) == 0:
+                continue
+            for m1, m2 in combinations(models, 2):
+                expected.append({"task": task, "group": group, "metric": metric, "model_1": m1, "model_2": m2,
+                                 "expected_p": stats.wilcoxon(subset[m1], subset[m2]).pvalue})
+    keys = ["task", "group", "metric", "model_1", "model_2"]
+    merged = results[results["test"] == "wilcoxon"].merge(pd.DataFrame(expected, columns=keys + ["expected_p"]),
+                                                          on=keys, how="outer")
+    same = np.isclose(merged["p_value"], merged["expected_p"], rtol=1e-12, atol=0, equal_nan=True)
+    return merged[~same]
+
+def load_scores(task, metrics, cache_dir=DEFAULT_CACHE_DIR):
+    """Id, problem type and '{model}_{metric}' columns of a task's cosine table, without the texts."""
+    available = table_columns(cosine_path(task), cache_dir)
+    wanted = [c for c in ID_COLUMNS + GROUP_COLUMNS if c in available]
+    wanted += [f"{m}_{metric}" for metric in metrics for m in MODELS if f"{m}_{metric}" in available]
+    return load_table(cosine_path(task), wanted, cache_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pairwise model comparisons (Shapiro-Wilk, Wilcoxon, bootstrap CIs) across tasks and metrics.")
+    parser.add_argument('--inputs', nargs='+', default=None,
+                        help='Score CSVs, wide ({model}_{metric}) or long (model column). Default: the cosine_datasets table of every task')
+    parser.add_argument('--metrics', default='cosine', help='Comma-separated metrics (column suffixes), e.g. cosine or bleu,rouge_l')
+    parser.add_argument('--pooled', action='store_true', help='Also test the whole task, not only each problem type')
+    parser.add_argument('--resamples', type=int, default=10000, help='Bootstrap resamples (0 to skip the bootstrap)')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the bootstrap intervals')
+    parser.add_argument('--chunk_size', type=int, default=1000, help='Resamples per index matrix')
+    parser.add_argument('--workers', type=int, default=1, help='Processes for the bootstrap chunks')
+    parser.add_argument('--seed', type=int, default=0, help='Bootstrap seed')
+    parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, help='Parquet cache directory of data_access.py')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Path of the tidy results CSV')
+    parser.add_argument('--check', action='store_true', help='Compare the Wilcoxon p-values with the notebook per-pair loop')
+    args = parser.parse_args()
+
+    metrics = args.metrics.split(",")
+    if args.inputs:
+        tables = {os.path.splitext(os.path.basename(p))[0]: load_table(p, cache_dir=args.cache_dir) for p in args.inputs}
+    else:
+        tables = {task: load_scores(task, metrics, args.cache_dir) for task in TASKS}
+
+    kwargs = dict(confidence=args.confidence, n_resamples=args.resamples, seed=args.seed, chunk_size=args.chunk_size)
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = results_table(tables, metrics, args.pooled, executor, **kwargs)
+    else:
+        results = results_table(tables, metrics, args.pooled, **kwargs)
+    results.to_csv(args.output, index=False)
+    print(f"{len(results)} test results for {len(tables)} tables -> {args.output}")
+    if args.check:
+        mismatches = check_wilcoxon(tables, results, metrics, args.pooled)
+        if len(mismatches):
+            print(f"{len(mismatches)} Wilcoxon p-values differ from the notebook loop:")
+            print(mismatches.to_string(index=False))
+            raise SystemExit(1)
+        print("Wilcoxon p-values match the notebook loop.")
+
+if __name__ == "__main__":
+    main()
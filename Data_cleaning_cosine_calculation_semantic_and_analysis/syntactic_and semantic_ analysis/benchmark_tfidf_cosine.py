@@ -0,0 +1,68 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.metrics.pairwise import cosine_similarity
+from tfidf_similarity import rowwise_cosine, stacked_rowwise_cosine
+
+# Compares the notebooks' cosine_similarity(A, B).diagonal() with the row-wise sparse cosine of
+# tfidf_similarity.py on random TF-IDF-like CSR matrices. The dense N x N matrix grows quadratically,
+# so the diagonal approach is only run up to --max_dense_rows.
+
+
+def random_tfidf(n_rows, vocab_size, nnz_per_row, rng):
+    indptr = np.arange(n_rows + 1, dtype=np.int64) * nnz_per_row
+    indices = rng.integers(0, vocab_size, size=n_rows * nnz_per_row)
+    data = rng.random(n_rows * nnz_per_row)
+    matrix = sp.csr_matrix((data, indices, indptr), shape=(n_rows, vocab_size))
+    matrix.sum_duplicates()
+    return matrix
+
+def best_time(fn, repeats):
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark row-wise sparse TF-IDF cosine against the diagonal of cosine_similarity.")
+    parser.add_argument('--rows', default='10000,100000,1000000', help='Comma separated numbers of rows to test')
+    parser.add_argument('--vocab_size', type=int, default=50000, help='Number of TF-IDF features')
+    parser.add_argument('--nnz_per_row', type=int, default=60, help='Non-zero features per text')
+    parser.add_argument('--max_dense_rows', type=int, default=20000, help='Largest size for which the N x N diagonal approach is run')
+    parser.add_argument('--repeats', type=int, default=3, help='Repetitions, the best time is reported')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = []
+    for n in [int(r) for r in args.rows.split(",")]:
+        # Reference block followed by four model blocks, as in the notebooks' corpus
+        X = random_tfidf(5 * n, args.vocab_size, args.nnz_per_row, rng)
+        reference, model = X[:n], X[n:2 * n]
+
+        rowwise_time, rowwise = best_time(lambda: rowwise_cosine(reference, model), args.repeats)
+        all_models_time, _ = best_time(lambda: stacked_rowwise_cosine(X, n), args.repeats)
+        row = {
+            "rows": n,
+            "rowwise_s": rowwise_time,
+            "rowwise_4_models_s": all_models_time,
+            "dense_matrix_gb": n * n * 8 / 1e9,
+            "diagonal_s": np.nan,
+            "speedup": np.nan,
+            "max_abs_diff": np.nan,
+        }
+        if n <= args.max_dense_rows:
+            diagonal_time, diagonal = best_time(lambda: cosine_similarity(reference, model).diagonal(), args.repeats)
+            row.update(diagonal_s=diagonal_time, speedup=diagonal_time / rowwise_time,
+                       max_abs_diff=float(np.abs(diagonal - rowwise).max()))
+        rows.append(row)
+        print(f"Done {n} rows")
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+
+if __name__ == "__main__":
+    main()
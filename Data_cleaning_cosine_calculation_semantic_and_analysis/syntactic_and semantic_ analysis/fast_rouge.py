@@ -0,0 +1,117 @@
+import re
+import time
+import argparse
+import pandas as pd
+from nltk.stem import porter
+
+# ROUGE-L F1 with the same tokenization and stemming as rouge_score (RougeScorer(['rougeL'], use_stemmer=True)),
+# but with tokens mapped to integer ids and the LCS length computed bit-parallel: one big-integer add and a few
+# bitwise operations per candidate token instead of a full Python O(n*m) table.
+
+# rouge_score.tokenize patterns
+NON_ALPHANUM_RE = re.compile(r"[^a-z0-9]+")
+SPACES_RE = re.compile(r"\s+")
+VALID_TOKEN_RE = re.compile(r"^[a-z0-9]+$")
+
+
+class RougeTokenizer:
+    """
+    rouge_score's DefaultTokenizer returning integer token ids. Stems and ids are memoised per word, and the
+    ids of whole texts are cached, so a reference compared with four models is tokenized once.
+    """
+
+    def __init__(self, use_stemmer=True, max_texts=100000):
+        self._stemmer = porter.PorterStemmer() if use_stemmer else None
+        self._ids = {}
+        self._words = {}
+        self._texts = {}
+        self.max_texts = max_texts
+
+    def _word_id(self, word):
+        token_id = self._words.get(word)
+        if token_id is None:
+            # Only words longer than 3 characters are stemmed, as in rouge_score
+            token = self._stemmer.stem(word) if self._stemmer and len(word) > 3 else word
+            token_id = self._ids.setdefault(token, len(self._ids)) if VALID_TOKEN_RE.match(token) else -1
+            self._words[word] = token_id
+        return token_id
+
+    def tokenize(self, text):
+        ids = self._texts.get(text)
+        if ids is None:
+            words = SPACES_RE.split(NON_ALPHANUM_RE.sub(" ", text.lower()))
+            ids = [i for i in map(self._word_id, words) if i >= 0]
+            if len(self._texts) >= self.max_texts:
+                self._texts.clear()
+            self._texts[text] = ids
+        return ids
+
+def lcs_length(a, b):
+    """
+    Length of the longest common subsequence of two id sequences (Allison-Dix / Hyyrö bit-vector algorithm).
+    The bits of v track the LCS table column of the shorter sequence; every zero bit is one matched token.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return 0
+    masks = {}
+    for i, token in enumerate(a):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    v = full
+    for token in b:
+        match = masks.get(token)
+        if match is not None:
+            u = v & match
+            v = ((v + u) | (v - u)) & full
+    return len(a) - v.bit_count()
+
+def rouge_l(target_ids, prediction_ids):
+    """ROUGE-L F1 of two id sequences, with the conventions of rouge_score (0 when either text has no tokens)."""
+    if not target_ids or not prediction_ids:
+        return 0.0
+    lcs = lcs_length(target_ids, prediction_ids)
+    precision = lcs / len(prediction_ids)
+    recall = lcs / len(target_ids)
+    return 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+def rouge_l_batch(references, candidates, tokenizer=None):
+    """ROUGE-L F1 for every (reference, candidate) pair of texts, sharing one tokenizer cache."""
+    tokenizer = tokenizer or RougeTokenizer()
+    return [rouge_l(tokenizer.tokenize(r), tokenizer.tokenize(c)) for r, c in zip(references, candidates)]
+
+def main():
+    from rouge_score import rouge_scorer
+    from syntactic_metrics import REASONING_MODELS, find_reference_column
+
+    parser = argparse.ArgumentParser(description="Check fast ROUGE-L against rouge_score on an NLP_analysis file and time both.")
+    parser.add_argument('--input', required=True, help='Path to an NLP_analysis CSV file')
+    parser.add_argument('--sample', type=int, default=200, help='Number of (reference, reasoning) pairs per model')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    reference_col = find_reference_column(df)
+    references, candidates = [], []
+    for model_name in REASONING_MODELS:
+        col = f"{model_name}_reasoning"
+        if col in df.columns:
+            pairs = df[[reference_col, col]].dropna().head(args.sample)
+            references.extend(pairs[reference_col])
+            candidates.extend(pairs[col])
+
+    scorer = rouge_scorer.RougeScorer(['rougeL'], use_stemmer=True)
+    start = time.perf_counter()
+    expected = [scorer.score(r, c)['rougeL'].fmeasure for r, c in zip(references, candidates)]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = rouge_l_batch(references, candidates)
+    fast_time = time.perf_counter() - start
+
+    max_diff = max((abs(a - b) for a, b in zip(expected, fast)), default=0.0)
+    print(f"{len(fast)} pairs, max absolute difference from rouge_score: {max_diff:.2e}")
+    print(f"rouge_score: {reference_time:.2f}s, fast ROUGE-L: {fast_time:.2f}s, speed-up: {reference_time / fast_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import numpy as np
+import xxhash
+
+# Word n-grams as sorted arrays of 64-bit integers instead of sets of joined strings. Tokens are hashed
+# once with xxhash, n-gram hashes are rolled from the token hashes with numpy, and the top bits of every
+# hash hold n, so a single array per text covers several n and one intersection scores all of them.
+
+_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_N_SHIFT = np.uint64(58)
+_HASH_MASK = np.uint64((1 << 58) - 1)
+MAX_N = 63
+
+
+def tokenize(text):
+    # Same tokenization as the notebooks' ngrams()
+    return text.lower().split()
+
+def token_hashes(tokens):
+    return np.fromiter((xxhash.xxh3_64_intdigest(t.encode("utf-8")) for t in tokens), dtype=np.uint64, count=len(tokens))
+
+def _mix(x):
+    # splitmix64 finaliser, so that n-grams sharing tokens do not get nearby hashes
+    x = x ^ (x >> np.uint64(30))
+    x = x * _MIX_1
+    x = x ^ (x >> np.uint64(27))
+    x = x * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+def ngram_hashes(hashes, n):
+    """Sorted unique hashes of the n-grams of a token hash array, tagged with n."""
+    if not 1 <= n <= MAX_N:
+        raise ValueError(f"n must be between 1 and {MAX_N}, got {n}.")
+    count = len(hashes) - n + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    rolled = hashes[:count].copy()
+    for k in range(1, n):
+        rolled = rolled * _MULTIPLIER + hashes[k:k + count]
+    return np.unique((_mix(rolled) & _HASH_MASK) | (np.uint64(n) << _N_SHIFT))
+
+def text_ngrams(text, ns=(3,)):
+    """Hashed n-grams of a text for every n in ns, as one sorted array."""
+    hashes = token_hashes(tokenize(text))
+    return np.concatenate([ngram_hashes(hashes, n) for n in ns]) if ns else np.empty(0, dtype=np.uint64)
+
+def counts_per_n(ngrams, ns):
+    counts = np.bincount((ngrams >> _N_SHIFT).astype(np.int64), minlength=MAX_N + 1)
+    return counts[list(ns)]
+
+def overlap(a, b, ns=(3,)):
+    """
+    Jaccard overlap of two hashed n-gram arrays for every n in ns, from a single sorted intersection.
+    Matches ngram_overlap() of the notebooks: 0.0 when both texts have no n-grams.
+    """
+    shared = counts_per_n(np.intersect1d(a, b, assume_unique=True), ns)
+    union = counts_per_n(a, ns) + counts_per_n(b, ns) - shared
+    return np.divide(shared, union, out=np.zeros(len(ns)), where=union > 0)
+
+
+class NgramCache:
+    """
+    Hashed n-grams per text, kept across models and metrics so that a reference text shared by the
+    four models, or a text repeated across rows, is tokenized and hashed only once.
+    """
+
+    def __init__(self, ns=(3,), maxsize=100000):
+        self.ns = tuple(ns)
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        ngrams = self._cache.get(text)
+        if ngrams is not None:
+            self.hits += 1
+            self._cache.move_to_end(text)
+            return ngrams
+        self.misses += 1
+        ngrams = text_ngrams(text, self.ns)
+        self._cache[text] = ngrams
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return ngrams
+
+    def overlap(self, reference, candidate):
+        return overlap(self.get(reference), self.get(candidate), self.ns)
+
+    def __len__(self):
+        return len(self._cache)
@@ -0,0 +1,195 @@
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from ngram_hashing import NgramCache, overlap as ngram_overlap
+
+# instrumentation.py lives in scripts/ and is shared with the generators, the judge and the cosine calculator
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "scripts"))
+import instrumentation
+
+# Syntactic similarity between the reference text of each question and the reasoning of every model:
+# BLEU, METEOR, ROUGE-L and n-gram overlap, with the same definitions used in the *_syntactic notebooks.
+# Every text is tokenized once per row and shared by all the metrics and models (n-grams are hashed to
+# integers and cached per text, see ngram_hashing.py, and ROUGE-L runs a bit-parallel LCS over token ids,
+# see fast_rouge.py), and blocks of rows are scored in parallel processes.
+
+REASONING_MODELS = ["deepseek-r1:1.5b", "deepseek-r1:14b", "qwen2.5:1.5b", "qwen2.5:14b"]
+METRICS = ["bleu", "meteor", "rouge_l", "ngram_overlap"]
+# The essay task keeps its reference text in the 'essay' column (renamed 'evaluation' in the notebook)
+REFERENCE_COLUMNS = ["solution", "evaluation", "essay"]
+ID_COLUMNS = ["uuid", "QuestionID"]
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INPUT_DIR = os.path.join(BASE_DIR, "NLP_analysis")
+ROWS_PER_TASK = 256
+
+_scorers = {}
+
+
+def find_reference_column(df):
+    lowered = {col.lower(): col for col in df.columns}
+    for candidate in REFERENCE_COLUMNS:
+        if candidate in lowered:
+            return lowered[candidate]
+    raise ValueError(f"No reference column found, expected one of {REFERENCE_COLUMNS} (case-insensitive).")
+
+def task_name(input_csv):
+    name = os.path.splitext(os.path.basename(input_csv))[0]
+    return name[:-len("_analysis")] if name.endswith("_analysis") else name
+
+def as_ns(n):
+    return (n,) if isinstance(n, int) else tuple(n)
+
+def metric_columns(metrics, n=3):
+    """Output column of every score: ngram_overlap gets one column per n when several n are requested."""
+    ns = as_ns(n)
+    columns = []
+    for metric in metrics:
+        if metric == "ngram_overlap" and len(ns) > 1:
+            columns.extend(f"ngram_overlap_{k}" for k in ns)
+        else:
+            columns.append(metric)
+    return columns
+
+def ngram_cache(n):
+    # One cache per process and set of n, shared by all the rows and models scored there
+    ns = as_ns(n)
+    if ("ngram_overlap", ns) not in _scorers:
+        _scorers["ngram_overlap", ns] = NgramCache(ns)
+    return _scorers["ngram_overlap", ns]
+
+def _scorer(name):
+    # Loaded once per process: the nltk imports and the stemmer are not free
+    if name not in _scorers:
+        if name == "bleu":
+            from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
+            smoothie = SmoothingFunction().method4
+            _scorers[name] = lambda ref, cand: sentence_bleu([ref], cand, smoothing_function=smoothie)
+        elif name == "meteor":
+            from nltk.translate.meteor_score import single_meteor_score
+            _scorers[name] = single_meteor_score
+        elif name == "rouge_l":
+            from fast_rouge import RougeTokenizer, rouge_l
+            _scorers[name] = (RougeTokenizer(use_stemmer=True), rouge_l)
+    return _scorers[name]
+
+def tokenize(text, metrics, n):
+    """All the token views of one text needed by the requested metrics, computed once."""
+    words = text.lower().split()
+    views = {"words": words}
+    if "rouge_l" in metrics:
+        views["rouge"] = _scorer("rouge_l")[0].tokenize(text)
+    if "ngram_overlap" in metrics:
+        views["ngrams"] = ngram_cache(n).get(text)
+    return views
+
+def score_pair(reference, candidate, metrics, n=3):
+    scores = []
+    for metric in metrics:
+        if metric == "bleu":
+            scores.append(_scorer("bleu")(reference["words"], candidate["words"]))
+        elif metric == "meteor":
+            scores.append(_scorer("meteor")(reference["words"], candidate["words"]))
+        elif metric == "rouge_l":
+            scores.append(_scorer("rouge_l")[1](reference["rouge"], candidate["rouge"]))
+        elif metric == "ngram_overlap":
+            scores.extend(ngram_overlap(reference["ngrams"], candidate["ngrams"], as_ns(n)))
+    return scores
+
+def score_rows(rows, metrics=METRICS, n=3):
+    """
+    Scores a block of rows, each a tuple (reference, reasoning of every model).
+    Returns an array of shape (len(rows), n_models, len(metric_columns(metrics, n))), NaN where a text is missing.
+    """
+    n_models = len(rows[0]) - 1 if rows else 0
+    scores = np.full((len(rows), n_models, len(metric_columns(metrics, n))), np.nan)
+    for i, (reference, *candidates) in enumerate(rows):
+        if not reference:
+            continue
+        reference = tokenize(reference, metrics, n)
+        for j, candidate in enumerate(candidates):
+            if candidate:
+                scores[i, j] = score_pair(reference, tokenize(candidate, metrics, n), metrics, n)
+    return scores
+
+def _text(x):
+    return x.strip() if isinstance(x, str) else ""
+
+def compute_metrics(df, metrics=METRICS, n=3, workers=None, rows_per_task=ROWS_PER_TASK):
+    """
+    Computes every metric for every model in one pass over the rows, spread over a process pool.
+    n is the n of the n-gram overlap, or a list of them to score several n at once.
+    Returns a tidy table with one row per (question, model) and one column per metric.
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}, expected a subset of {METRICS}.")
+
+    reference_col = find_reference_column(df)
+    models = [m for m in REASONING_MODELS if f"{m}_reasoning" in df.columns]
+    columns = [reference_col] + [f"{m}_reasoning" for m in models]
+    rows = [tuple(_text(x) for x in row) for row in df[columns].itertuples(index=False, name=None)]
+    blocks = [rows[start:start + rows_per_task] for start in range(0, len(rows), rows_per_task)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(blocks) > 1:
+        # Tokenizing and scoring happen in the workers: the parent only waits for their results
+        with instrumentation.span("queue_wait", target="score_rows"), ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(score_rows, blocks, [metrics] * len(blocks), [n] * len(blocks)))
+    else:
+        with instrumentation.span("score"):
+            results = [score_rows(block, metrics, n) for block in blocks]
+    instrumentation.count("scored_rows", len(rows))
+    columns = metric_columns(metrics, n)
+    scores = np.concatenate(results) if results else np.empty((0, len(models), len(columns)))
+
+    # Question-major order: the rows of one question are next to each other, models in REASONING_MODELS order
+    table = {}
+    id_col = next((col for col in ID_COLUMNS if col in df.columns), None)
+    if id_col:
+        table[id_col] = np.repeat(df[id_col].to_numpy(), len(models))
+    if "problem_type" in df.columns:
+        table["problem_type"] = np.repeat(df["problem_type"].to_numpy(), len(models))
+    table["model"] = np.tile(models, len(df))
+    for k, column in enumerate(columns):
+        table[column] = scores[:, :, k].reshape(-1)
+    return pd.DataFrame(table)
+
+def process_file(input_csv, output_csv=None, metrics=METRICS, n=3, workers=None):
+    start = time.perf_counter()
+    output_csv = output_csv or os.path.splitext(input_csv)[0] + "_syntactic.csv"
+    with instrumentation.span("load", file=os.path.basename(input_csv)):
+        df = pd.read_csv(input_csv)
+    output_df = compute_metrics(df, metrics, n, workers)
+    output_df.insert(0, "task", task_name(input_csv))
+    with instrumentation.span("io", file=os.path.basename(input_csv)):
+        output_df.to_csv(output_csv, index=False)
+    print(f"Scored {len(df)} rows of {os.path.basename(input_csv)} in {time.perf_counter() - start:.1f}s -> {output_csv}")
+    return output_csv
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute BLEU, METEOR, ROUGE-L and n-gram overlap against the reference for every model.")
+    parser.add_argument('--inputs', nargs='+', default=None, help='NLP_analysis CSV files (default: every *_analysis.csv in NLP_analysis)')
+    parser.add_argument('--metrics', default=",".join(METRICS), help='Comma separated metrics to compute')
+    parser.add_argument('--ngram_n', default='3', help='n of the n-gram overlap, or a comma separated list of n')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: number of cores)')
+    parser.add_argument('--metrics_dir', default=None, help='Directory for timing metrics: JSONL events and a Prometheus text file')
+    parser.add_argument('--profile', default=None, choices=instrumentation.PROFILERS, help='With --metrics_dir, also profile the run')
+    args = parser.parse_args()
+
+    if args.metrics_dir:
+        instrumentation.configure(args.metrics_dir, "syntactic_metrics", profile=args.profile)
+
+    inputs = args.inputs or sorted(glob.glob(os.path.join(INPUT_DIR, "*_analysis.csv")))
+    metrics = [m.strip() for m in args.metrics.split(",") if m.strip()]
+    ns = [int(k) for k in args.ngram_n.split(",")]
+    for input_csv in inputs:
+        process_file(input_csv, metrics=metrics, n=ns[0] if len(ns) == 1 else ns, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
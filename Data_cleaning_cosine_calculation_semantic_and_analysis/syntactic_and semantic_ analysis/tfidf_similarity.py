@@ -0,0 +1,92 @@
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from syntactic_metrics import REASONING_MODELS, ID_COLUMNS, BASE_DIR, INPUT_DIR, find_reference_column, task_name
+from tfidf_store import REFIT_POLICIES, TfidfStore
+
+# TF-IDF cosine between the reference text of each question and the reasoning of every model.
+# Only the N row-aligned similarities are needed, so they are computed as row-wise dot products of
+# L2-normalised CSR matrices instead of the diagonal of a dense N x N cosine_similarity matrix.
+
+# Same settings as the *_syntactic notebooks
+TFIDF_PARAMS = dict(analyzer='word', min_df=0.01, max_df=0.75, ngram_range=(1, 2), stop_words='english', sublinear_tf=True)
+DEFAULT_STORE_DIR = os.path.join(BASE_DIR, "tfidf_store")
+
+
+def corpus_for(df):
+    """Reference column followed by every reasoning column, as in the notebooks. Missing texts become ''."""
+    columns = [find_reference_column(df)] + [f"{m}_reasoning" for m in REASONING_MODELS if f"{m}_reasoning" in df.columns]
+    corpus = [str(x).strip() if pd.notna(x) else "" for col in columns for x in df[col]]
+    return corpus, columns
+
+def rowwise_cosine(a, b):
+    """Cosine between row i of a and row i of b, for sparse matrices of the same shape. Empty rows give 0."""
+    from sklearn.preprocessing import normalize
+
+    a = normalize(sp.csr_matrix(a), norm="l2", copy=True)
+    b = normalize(sp.csr_matrix(b), norm="l2", copy=True)
+    return np.asarray(a.multiply(b).sum(axis=1)).ravel()
+
+def stacked_rowwise_cosine(X, n):
+    """
+    Cosine of every block of n rows of X against the first block, normalising X once for all the models.
+    X holds the reference rows followed by one block per model; returns an array of shape (n_blocks - 1, n).
+    """
+    from sklearn.preprocessing import normalize
+
+    X = normalize(sp.csr_matrix(X), norm="l2", copy=True)
+    reference = X[:n]
+    return np.stack([
+        np.asarray(X[start:start + n].multiply(reference).sum(axis=1)).ravel()
+        for start in range(n, X.shape[0], n)
+    ]) if X.shape[0] > n else np.empty((0, n))
+
+def open_store(store_dir, input_csv):
+    return TfidfStore(store_dir, task_name(input_csv), TFIDF_PARAMS) if store_dir else None
+
+def tfidf_similarity(df, vectorizer=None, store=None, refit="never", max_new_fraction=0.2):
+    """
+    Fits TF-IDF on the reference plus reasoning corpus and returns a table with the id column and one
+    '{model}_tfidf_cosine' column per reasoning model. A vectorizer that is already fitted is only used to transform.
+    With a TfidfStore, the task's persisted vocabulary is reused according to the refit policy and only
+    texts missing from its cache are transformed.
+    """
+    corpus, columns = corpus_for(df)
+    if store is not None:
+        X = store.transform(corpus, refit, max_new_fraction)
+    elif vectorizer is None:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        X = TfidfVectorizer(**TFIDF_PARAMS).fit_transform(corpus)
+    else:
+        X = vectorizer.transform(corpus)
+    similarities = stacked_rowwise_cosine(X, len(df))
+
+    table = {}
+    id_col = next((col for col in ID_COLUMNS if col in df.columns), None)
+    if id_col:
+        table[id_col] = df[id_col].to_numpy()
+    for col, values in zip(columns[1:], similarities):
+        table[col[:-len("_reasoning")] + "_tfidf_cosine"] = values
+    return pd.DataFrame(table)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute row-aligned TF-IDF cosine similarities against the reference for every model.")
+    parser.add_argument('--inputs', nargs='+', default=None, help='NLP_analysis CSV files (default: every *_analysis.csv in NLP_analysis)')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='TF-IDF store directory with one fitted vocabulary per task')
+    parser.add_argument('--no_store', action='store_true', help='Refit from scratch in memory, as the notebooks do')
+    parser.add_argument('--refit', default='never', choices=REFIT_POLICIES, help='When to refit the stored vocabulary')
+    parser.add_argument('--max_new_fraction', type=float, default=0.2, help='Share of new texts that makes the vocabulary stale')
+    args = parser.parse_args()
+
+    for input_csv in args.inputs or sorted(glob.glob(os.path.join(INPUT_DIR, "*_analysis.csv"))):
+        output_csv = os.path.splitext(input_csv)[0] + "_tfidf_cosine.csv"
+        store = open_store(None if args.no_store else args.store, input_csv)
+        tfidf_similarity(pd.read_csv(input_csv), store=store, refit=args.refit,
+                         max_new_fraction=args.max_new_fraction).to_csv(output_csv, index=False)
+        print(f"Processed {os.path.basename(input_csv)} -> {output_csv}")
+
+if __name__ == "__main__":
+    main()
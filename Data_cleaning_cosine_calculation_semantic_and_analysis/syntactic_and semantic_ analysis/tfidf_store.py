@@ -0,0 +1,181 @@
+import os
+import re
+import json
+import pickle
+import numpy as np
+import scipy.sparse as sp
+import xxhash
+
+# Fitted TF-IDF vectorizer and transformed rows, persisted per task so that reruns reuse the same
+# vocabulary and IDF weights (scores stay comparable across runs) and only new texts are transformed.
+# Every task gets its own folder inside the store root:
+#   meta.json       -> vectorizer parameters, fit size and number of texts added since the fit
+#   vectorizer.pkl  -> the fitted TfidfVectorizer
+#   rows_NNNNN.npz  -> CSR shards of the texts transformed since the fit, one per call that added rows, so new
+#                      rows are written without rewriting the old ones
+#   index.txt       -> one text hash per line, appended after its shard; line i describes row i of the shards
+#                      taken in order
+META_FILE = "meta.json"
+VECTORIZER_FILE = "vectorizer.pkl"
+INDEX_FILE = "index.txt"
+SHARD_RE = re.compile(r"^rows_(\d+)\.npz$")
+# Single rows file of the stores written before the shards, read as the first shard
+LEGACY_ROWS_FILE = "rows.npz"
+
+# never  -> fit on the first corpus only, then always reuse that vocabulary
+# always -> refit on every call (the notebooks' behaviour)
+# stale  -> refit once the texts added since the fit exceed max_new_fraction of the fitted corpus
+REFIT_POLICIES = ["never", "always", "stale"]
+
+
+def text_hash(text):
+    return xxhash.xxh3_128_hexdigest(text.encode("utf-8"))
+
+
+class TfidfStore:
+    """Persistent TF-IDF model of one task, with an on-disk cache of transformed rows."""
+
+    def __init__(self, root, task, params=None):
+        self.task = task
+        self.path = os.path.join(root, task)
+        os.makedirs(self.path, exist_ok=True)
+
+        # Kept and compared in their JSON form, where tuples such as ngram_range become lists
+        params = json.loads(json.dumps(params)) if params is not None else None
+        meta_path = os.path.join(self.path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {"params": params, "fit_texts": 0, "added_texts": 0}
+        if params is not None and self.meta["params"] != params:
+            if self.fitted:
+                raise ValueError(f"TF-IDF store {self.path} was fitted with {self.meta['params']}, not {params}.")
+            # Never fitted: nothing was computed with the old parameters
+            self.meta["params"] = params
+        if self.meta["params"] is None:
+            raise ValueError(f"TF-IDF store {self.path} has never been fitted: vectorizer params are required.")
+        self.params = {k: tuple(v) if isinstance(v, list) else v for k, v in self.meta["params"].items()}
+
+        self.vectorizer = None
+        if self.fitted:
+            with open(os.path.join(self.path, VECTORIZER_FILE), "rb") as f:
+                self.vectorizer = pickle.load(f)
+        self._load_rows()
+
+    @property
+    def fitted(self):
+        return os.path.exists(os.path.join(self.path, VECTORIZER_FILE))
+
+    def _shard_files(self):
+        matches = [SHARD_RE.match(name) for name in os.listdir(self.path)]
+        return [m.group(0) for m in sorted((m for m in matches if m), key=lambda m: int(m.group(1)))]
+
+    def _load_rows(self):
+        legacy_path = os.path.join(self.path, LEGACY_ROWS_FILE)
+        if os.path.exists(legacy_path) and not self._shard_files():
+            os.replace(legacy_path, os.path.join(self.path, "rows_00000.npz"))
+        index_path = os.path.join(self.path, INDEX_FILE)
+        lines = [""]
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        # The last line is incomplete after a crash while appending
+        hashes = lines[:-1]
+
+        # An interrupted save can leave a shard without its index lines: it is dropped, with any shard after it
+        shards, n, files = [], 0, self._shard_files()
+        for k, name in enumerate(files):
+            shard = sp.load_npz(os.path.join(self.path, name)).tocsr()
+            if n + shard.shape[0] > len(hashes):
+                for stale in files[k:]:
+                    os.remove(os.path.join(self.path, stale))
+                break
+            shards.append(shard)
+            n += shard.shape[0]
+        self._shard_count = len(shards)
+        if n != len(lines) - 1 or lines[-1]:
+            with open(index_path, "w", encoding="utf-8") as f:
+                f.write("".join(h + "\n" for h in hashes[:n]))
+        self.rows = sp.vstack(shards, format="csr") if shards else None
+        self._index = {h: i for i, h in enumerate(hashes[:n])}
+
+    def _write(self, name, write):
+        # Write to a temporary file first so that a crash never leaves a half-written file behind
+        tmp_path = os.path.join(self.path, name + ".tmp")
+        write(tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def _write_meta(self):
+        def write(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, indent=2)
+        self._write(META_FILE, write)
+
+    def __len__(self):
+        return len(self._index)
+
+    def fit(self, corpus):
+        """Fits a new vectorizer on corpus and drops every cached row, since the vocabulary has changed."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.vectorizer = TfidfVectorizer(**self.params).fit(corpus)
+
+        def write(path):
+            with open(path, "wb") as f:
+                pickle.dump(self.vectorizer, f)
+        self._write(VECTORIZER_FILE, write)
+        for name in self._shard_files() + [INDEX_FILE, LEGACY_ROWS_FILE]:
+            if os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        self.rows, self._index, self._shard_count = None, {}, 0
+        self.meta.update(fit_texts=len(set(corpus)), added_texts=0)
+        self._write_meta()
+
+    def needs_refit(self, hashes, refit="never", max_new_fraction=0.2):
+        if refit not in REFIT_POLICIES:
+            raise ValueError(f"Unknown refit policy '{refit}', expected one of {REFIT_POLICIES}.")
+        if not self.fitted or refit == "always":
+            return True
+        if refit == "stale":
+            new = len(set(h for h in hashes if h not in self._index))
+            return self.meta["added_texts"] + new > max_new_fraction * self.meta["fit_texts"]
+        return False
+
+    def transform(self, texts, refit="never", max_new_fraction=0.2):
+        """
+        TF-IDF rows of texts, in order. Texts already in the cache are read back, the others are transformed
+        with the stored vectorizer and appended. The vectorizer is (re)fitted on texts first when the refit
+        policy asks for it, and always when the store has never been fitted.
+        """
+        hashes = [text_hash(t) for t in texts]
+        refitted = self.needs_refit(hashes, refit, max_new_fraction)
+        if refitted:
+            self.fit(texts)
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in self._index and h not in missing:
+                missing[h] = text
+        if missing:
+            new_rows = self.vectorizer.transform(list(missing.values())).tocsr()
+            self.rows = new_rows if self.rows is None else sp.vstack([self.rows, new_rows], format="csr")
+
+            def write_rows(path):
+                # Through a file handle: save_npz would add '.npz' to the temporary file name
+                with open(path, "wb") as f:
+                    sp.save_npz(f, new_rows)
+            # Only the new rows are written, as the next shard; its index lines follow once it is on disk
+            self._write(f"rows_{self._shard_count:05d}.npz", write_rows)
+            self._shard_count += 1
+            with open(os.path.join(self.path, INDEX_FILE), "a", encoding="utf-8") as f:
+                f.write("".join(h + "\n" for h in missing))
+            for h in missing:
+                self._index[h] = len(self._index)
+            if not refitted:
+                self.meta["added_texts"] += len(missing)
+                self._write_meta()
+
+        if not texts:
+            return sp.csr_matrix((0, len(self.vectorizer.vocabulary_)))
+        return self.rows[np.array([self._index[h] for h in hashes])]
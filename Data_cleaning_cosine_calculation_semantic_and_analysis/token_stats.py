@@ -0,0 +1,161 @@
+import os
+import re
+import argparse
+import numpy as np
+import pandas as pd
+import xxhash
+from data_access import BASE_DIR, ID_COLUMNS, TASKS, DEFAULT_CACHE_DIR, analysis_path, table_columns, load_table
+
+# Token counts of the problems, passages, solutions and reasonings, computed once per (tokenizer, text).
+# Texts are tokenized in batches by the fast (Rust) tokenizers, which spread every batch over all cores,
+# and each count is persisted under the hash of its text, so reruns and the analysis notebooks only
+# join precomputed counts instead of calling tokenizer.tokenize() row by row.
+# Every tokenizer gets its own file inside the store root:
+#   <tokenizer>.tsv -> one "text hash<TAB>token count" line per text, appended as new texts are counted
+
+DEFAULT_STORE_DIR = os.path.join(BASE_DIR, "token_counts")
+
+# Tokenizers of the problem_token_count columns in Data_visualization.ipynb
+MATH_TOKENIZER = "tbs17/MathBERT-custom"
+TEXT_TOKENIZER = "sentence-transformers/all-mpnet-base-v2"
+TASK_TOKENIZERS = {
+    "math": MATH_TOKENIZER,
+    "proofs": MATH_TOKENIZER,
+    "reading_comprehension": TEXT_TOKENIZER,
+    "critical_reasoning": TEXT_TOKENIZER,
+    "essay_evaluation": TEXT_TOKENIZER,
+}
+
+# Columns joined with a space into the problem text of every task, as in Data_visualization.ipynb
+PROBLEM_COLUMNS = {
+    "math": ["problem"],
+    "proofs": ["problem"],
+    "reading_comprehension": ["PassageText", "QuestionText"],
+    "critical_reasoning": ["QuestionText"],
+    "essay_evaluation": ["essay", "prompt"],
+}
+# Other text columns that get a '{column}_token_count' column when present
+TEXT_COLUMN_RE = re.compile(r"^(solution|evaluation|.+_reasoning|.+_solution)$")
+
+
+def text_hash(text):
+    return xxhash.xxh3_128_hexdigest(text.encode("utf-8"))
+
+
+class TokenCountStore:
+    """Persistent token counts of one tokenizer, keyed by text hash."""
+
+    def __init__(self, root, tokenizer_name, batch_size=1024):
+        self.tokenizer_name = tokenizer_name
+        self.batch_size = batch_size
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]+", "__", tokenizer_name) + ".tsv")
+        self._tokenizer = None
+        self._counts = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r+b") as f:
+                data = f.read()
+                # A crash while appending can leave an incomplete last line: drop it, it is simply counted again
+                if data and not data.endswith(b"\n"):
+                    data = data[:data.rfind(b"\n") + 1]
+                    f.truncate(len(data))
+            for line in data.decode("utf-8").splitlines():
+                text_key, count = line.split("\t")
+                self._counts[text_key] = int(count)
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name, use_fast=True)
+        return self._tokenizer
+
+    def __len__(self):
+        return len(self._counts)
+
+    def _tokenize_batch(self, texts):
+        # Same count as len(tokenizer.tokenize(text)): no special tokens and no truncation
+        encoded = self.tokenizer(texts, add_special_tokens=False, return_attention_mask=False,
+                                 return_token_type_ids=False, verbose=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def counts(self, texts):
+        """Token count of every text, in order. Only texts missing from the store are tokenized."""
+        hashes = [text_hash(t) for t in texts]
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in self._counts and h not in missing:
+                missing[h] = text
+        if missing:
+            items = list(missing.items())
+            with open(self.path, "a", encoding="utf-8") as f:
+                for start in range(0, len(items), self.batch_size):
+                    batch = items[start:start + self.batch_size]
+                    counts = self._tokenize_batch([text for _, text in batch])
+                    f.write("".join(f"{h}\t{c}\n" for (h, _), c in zip(batch, counts)))
+                    f.flush()
+                    self._counts.update((h, c) for (h, _), c in zip(batch, counts))
+        return np.array([self._counts[h] for h in hashes], dtype=np.int64)
+
+
+def problem_texts(df, task):
+    # str() of the joined columns, so a missing part gives "nan" exactly as the notebook's str(x)
+    columns = PROBLEM_COLUMNS[task]
+    joined = df[columns[0]].astype(object)
+    for col in columns[1:]:
+        joined = joined + " " + df[col].astype(object)
+    return joined.map(str).tolist()
+
+def text_columns(columns):
+    return [col for col in columns if TEXT_COLUMN_RE.match(col)]
+
+def token_counts(df, task, store, include_texts=True):
+    """
+    Table with the id column, 'problem_token_count' and, with include_texts, one '{column}_token_count'
+    column per solution/reasoning column. Missing texts get a missing count.
+    """
+    table = {}
+    id_col = next((col for col in ID_COLUMNS if col in df.columns), None)
+    if id_col:
+        table[id_col] = df[id_col].to_numpy()
+    table["problem_token_count"] = store.counts(problem_texts(df, task))
+    for col in text_columns(df.columns) if include_texts else []:
+        present = df[col].notna().to_numpy()
+        counts = np.full(len(df), np.nan)
+        counts[present] = store.counts(df.loc[present, col].map(str).tolist())
+        table[f"{col}_token_count"] = pd.array(counts, dtype="Int64")
+    return pd.DataFrame(table)
+
+def output_path(task):
+    return os.path.splitext(analysis_path(task))[0] + "_token_counts.csv"
+
+def load_token_counts(task):
+    """Precomputed counts of a task, ready to be merged on its id column."""
+    return pd.read_csv(output_path(task))
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the tokens of every problem, solution and reasoning text once per tokenizer.")
+    parser.add_argument('--tasks', nargs='+', default=TASKS, choices=TASKS, help='Tasks to process')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='Directory of the persisted counts')
+    parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, help='Parquet cache directory of data_access.py')
+    parser.add_argument('--problems_only', action='store_true', help='Only count the problem texts')
+    parser.add_argument('--batch_size', type=int, default=1024, help='Texts per tokenizer call')
+    args = parser.parse_args()
+
+    stores = {}
+    for task in args.tasks:
+        name = TASK_TOKENIZERS[task]
+        if name not in stores:
+            stores[name] = TokenCountStore(args.store, name, args.batch_size)
+        store = stores[name]
+        available = table_columns(analysis_path(task), args.cache_dir)
+        wanted = [c for c in ID_COLUMNS if c in available] + PROBLEM_COLUMNS[task]
+        if not args.problems_only:
+            wanted += text_columns(available)
+        df = load_table(analysis_path(task), wanted, args.cache_dir)
+        before = len(store)
+        token_counts(df, task, store, include_texts=not args.problems_only).to_csv(output_path(task), index=False)
+        print(f"{task}: {len(df)} rows, {len(store) - before} new texts tokenized with {name} -> {output_path(task)}")
+
+if __name__ == "__main__":
+    main()
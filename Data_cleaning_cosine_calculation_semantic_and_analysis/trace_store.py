@@ -0,0 +1,264 @@
+import os
+import json
+import zlib
+import argparse
+from importlib.util import find_spec
+import pandas as pd
+import xxhash
+from data_access import BASE_DIR, ID_COLUMNS, TASKS
+
+# Compressed, random-access store of the long model texts: raw responses with their <think> traces,
+# reasonings and solutions. Records are packed in blocks of about block_size raw bytes and every block is
+# compressed on its own (zstd when the zstandard package is installed, zlib otherwise), so fetching one
+# trace only decompresses its block and streaming the corpus holds a single block in memory.
+# Every task gets its own folder inside the store root:
+#   meta.json   -> codec, compression level and block size, fixed when the folder is created
+#   blocks.bin  -> compressed blocks, appended
+#   index.tsv   -> one "id<TAB>model<TAB>field<TAB>block offset<TAB>block size<TAB>start<TAB>length<TAB>hash" line per
+#                  record, start and length in the decompressed block, hash the xxh3 of the text; a key added again
+#                  with the same text is skipped, with another text it points to the new record
+
+DEFAULT_STORE_DIR = os.path.join(BASE_DIR, "trace_store")
+META_FILE = "meta.json"
+BLOCKS_FILE = "blocks.bin"
+INDEX_FILE = "index.tsv"
+CODECS = ["zstd", "zlib"]
+DEFAULT_LEVELS = {"zstd": 9, "zlib": 6}
+DEFAULT_BLOCK_SIZE = 1 << 16
+
+REASONING_MODELS = ["deepseek-r1:1.5b", "deepseek-r1:14b", "qwen2.5:1.5b", "qwen2.5:14b"]
+# field -> column of the wide NLP_analysis tables; the long generator tables only have a 'response' column
+FIELD_COLUMNS = {"response": "{model}", "think": "{model}_think", "reasoning": "{model}_reasoning", "solution": "{model}_solution"}
+# The generator of the verbal questions writes an 'id' column
+TRACE_ID_COLUMNS = ID_COLUMNS + ["id"]
+
+
+def default_codec():
+    return "zstd" if find_spec("zstandard") is not None else "zlib"
+
+def _codec(name, level):
+    """(compress, decompress) functions of a codec."""
+    if name == "zlib":
+        return (lambda data: zlib.compress(data, level)), zlib.decompress
+    if name == "zstd":
+        import zstandard
+        compressor, decompressor = zstandard.ZstdCompressor(level=level), zstandard.ZstdDecompressor()
+        return compressor.compress, decompressor.decompress
+    raise ValueError(f"Unknown codec '{name}', expected one of {CODECS}.")
+
+
+class TraceStore:
+    """Compressed texts of one task, keyed by (id, model, field)."""
+
+    def __init__(self, root, task, codec=None, level=None, block_size=DEFAULT_BLOCK_SIZE):
+        self.task = task
+        self.path = os.path.join(root, task)
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        else:
+            codec = codec or default_codec()
+            self.meta = {"task": task, "codec": codec, "level": level or DEFAULT_LEVELS.get(codec), "block_size": block_size}
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, indent=2)
+        self._compress, self._decompress = _codec(self.meta["codec"], self.meta["level"])
+        self._index = {}
+        self._hashes = {}
+        self._block = (None, None)
+        self._load_index()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load_index(self):
+        blocks_size = os.path.getsize(self._file(BLOCKS_FILE)) if os.path.exists(self._file(BLOCKS_FILE)) else 0
+        index_path = self._file(INDEX_FILE)
+        lines = [""]
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        # A crash can leave an incomplete last index line, or a block without its index lines: drop both
+        complete = lines[:-1]
+        end = 0
+        for n, line in enumerate(complete):
+            # Stores written before the hash column have 7 fields: their records are never skipped by add
+            key_id, model, field, offset, size, start, length, text_hash = (line.split("\t") + [None])[:8]
+            offset, size = int(offset), int(size)
+            if offset + size > blocks_size:
+                complete = complete[:n]
+                break
+            self._index[(key_id, model, field)] = (offset, size, int(start), int(length))
+            self._hashes[(key_id, model, field)] = text_hash
+            end = max(end, offset + size)
+        if len(complete) != len(lines) - 1 or lines[-1]:
+            with open(index_path, "w", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in complete))
+        if blocks_size != end:
+            with open(self._file(BLOCKS_FILE), "r+b") as f:
+                f.truncate(end)
+        self._end = end
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return tuple(map(str, key)) in self._index
+
+    def keys(self, model=None, field=None):
+        """(id, model, field) of every record, optionally only of one model and/or field."""
+        return [k for k in self._index if (model is None or k[1] == model) and (field is None or k[2] == field)]
+
+    def add(self, records):
+        """
+        Appends (id, model, field, text) records, packed into compressed blocks. Missing texts and keys already
+        stored with the same text are skipped, so importing a table again only adds its new or changed texts.
+        Returns the number of records written.
+        """
+        block_size = self.meta["block_size"]
+        pending, raw, written, queued = [], bytearray(), 0, {}
+        with open(self._file(BLOCKS_FILE), "ab") as blocks, open(self._file(INDEX_FILE), "a", encoding="utf-8") as index:
+            for key_id, model, field, text in records:
+                if not isinstance(text, str):
+                    continue
+                key = (str(key_id), str(model), str(field))
+                if any("\t" in part or "\n" in part for part in key):
+                    raise ValueError(f"Tabs and newlines are not allowed in a key, got {key}.")
+                data = text.encode("utf-8")
+                text_hash = xxhash.xxh3_64_hexdigest(data)
+                # Texts still waiting for their block count too, so a key repeated in records is stored once
+                if queued.get(key, self._hashes.get(key)) == text_hash:
+                    continue
+                queued[key] = text_hash
+                pending.append((key, len(raw), len(data), text_hash))
+                raw += data
+                if len(raw) >= block_size:
+                    written += self._write_block(blocks, index, pending, raw)
+                    pending, raw = [], bytearray()
+            if pending:
+                written += self._write_block(blocks, index, pending, raw)
+        return written
+
+    def _write_block(self, blocks, index, pending, raw):
+        compressed = self._compress(bytes(raw))
+        offset = self._end
+        blocks.write(compressed)
+        blocks.flush()
+        # Index lines only once their block is on disk, so a reader never follows an offset past the end of the file
+        index.write("".join(f"{k[0]}\t{k[1]}\t{k[2]}\t{offset}\t{len(compressed)}\t{start}\t{length}\t{text_hash}\n"
+                            for k, start, length, text_hash in pending))
+        index.flush()
+        self._end = offset + len(compressed)
+        for key, start, length, text_hash in pending:
+            self._index[key] = (offset, len(compressed), start, length)
+            self._hashes[key] = text_hash
+        return len(pending)
+
+    def _read_block(self, offset, size):
+        # The last decompressed block is kept, so consecutive records of one block are decompressed once
+        if self._block[0] != offset:
+            with open(self._file(BLOCKS_FILE), "rb") as f:
+                f.seek(offset)
+                self._block = (offset, self._decompress(f.read(size)))
+        return self._block[1]
+
+    def get(self, key_id, model, field="response"):
+        """The text of one record, or None when it is not stored."""
+        entry = self._index.get((str(key_id), str(model), str(field)))
+        if entry is None:
+            return None
+        offset, size, start, length = entry
+        return self._read_block(offset, size)[start:start + length].decode("utf-8")
+
+    def get_many(self, keys):
+        """Texts of (id, model, field) keys, in order (None when missing). Each block is decompressed once."""
+        keys = [tuple(map(str, k)) for k in keys]
+        order = sorted((i for i, k in enumerate(keys) if k in self._index), key=lambda i: self._index[keys[i]][0])
+        texts = [None] * len(keys)
+        for i in order:
+            texts[i] = self.get(*keys[i])
+        return texts
+
+    def iter_texts(self, model=None, field=None):
+        """Yields (id, model, field, text) in file order, holding one decompressed block at a time."""
+        for key in sorted(self.keys(model, field), key=lambda k: self._index[k][:3]):
+            yield (*key, self.get(*key))
+
+    def series(self, ids, model, field="response"):
+        """Texts of one model and field for ids, as a Series indexed like ids, ready to be joined to a table."""
+        return pd.Series(self.get_many([(i, model, field) for i in ids]), index=ids, dtype=object)
+
+    def stats(self):
+        """
+        Sizes of the live records (the latest text of every key): raw bytes, compressed bytes of the blocks
+        holding them and their ratio. dead_bytes is the part of blocks.bin no live record points to.
+        """
+        raw = sum(length for _, _, _, length in self._index.values())
+        stored = sum(size for _, size in {(offset, size) for offset, size, _, _ in self._index.values()})
+        return {"task": self.task, "records": len(self), "codec": self.meta["codec"], "raw_bytes": raw,
+                "stored_bytes": stored, "dead_bytes": self._end - stored, "ratio": raw / stored if stored else float("nan")}
+
+
+def table_records(df, models=REASONING_MODELS):
+    """(id, model, field, text) of a long generator table (id, response, model) or a wide NLP_analysis table."""
+    id_col = next(col for col in TRACE_ID_COLUMNS if col in df.columns)
+    # A missing id cannot be looked up: those rows are not stored
+    df = df[df[id_col].notna()]
+    if "model" in df.columns and "response" in df.columns:
+        return zip(df[id_col], df["model"], ["response"] * len(df), df["response"])
+    records = []
+    for model in models:
+        for field, pattern in FIELD_COLUMNS.items():
+            col = pattern.format(model=model)
+            if col in df.columns:
+                records.extend(zip(df[id_col], [model] * len(df), [field] * len(df), df[col]))
+    return records
+
+def import_csv(store, csv_path, chunksize=2000):
+    """Streams a CSV into the store in chunks, so the whole corpus is never in memory. Returns the records written."""
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    # Ids are read as text: inferred per chunk, a chunk with a missing id would turn 1 into "1.0"
+    dtype = {col: str for col in TRACE_ID_COLUMNS if col in columns}
+    written = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=dtype):
+        written += store.add(table_records(chunk))
+    return written
+
+def open_store(task, root=DEFAULT_STORE_DIR):
+    return TraceStore(root, task)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed random-access store of the model responses, reasonings and think traces.")
+    parser.add_argument('command', choices=['import', 'get', 'stats'],
+                        help='import: add the texts of CSVs; get: print one text; stats: records and compression ratio')
+    parser.add_argument('--task', required=True, choices=TASKS + ["verbal"], help='Task of the texts')
+    parser.add_argument('--inputs', nargs='+', default=[], help='CSVs to import: generator outputs, Models_answers or NLP_analysis tables')
+    parser.add_argument('--id', help='Question id of the text to get')
+    parser.add_argument('--model', help='Model of the text to get')
+    parser.add_argument('--field', default='response', help=f'Field of the text to get, one of {list(FIELD_COLUMNS)}')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='Directory of the store')
+    parser.add_argument('--codec', default=None, choices=CODECS, help='Codec of a new task folder (default: zstd if installed, else zlib)')
+    parser.add_argument('--level', type=int, default=None, help='Compression level of a new task folder')
+    parser.add_argument('--block_size', type=int, default=DEFAULT_BLOCK_SIZE, help='Raw bytes per compressed block of a new task folder')
+    parser.add_argument('--chunksize', type=int, default=2000, help='CSV rows read at a time while importing')
+    args = parser.parse_args()
+
+    store = TraceStore(args.store, args.task, args.codec, args.level, args.block_size)
+    if args.command == 'import':
+        for csv_path in args.inputs:
+            print(f"{os.path.basename(csv_path)}: {import_csv(store, csv_path, args.chunksize)} texts")
+        args.command = 'stats'
+    if args.command == 'get':
+        text = store.get(args.id, args.model, args.field)
+        if text is None:
+            print(f"No {args.field} stored for id {args.id} and model {args.model}.")
+            raise SystemExit(1)
+        print(text)
+    else:
+        stats = store.stats()
+        print(f"{stats['task']}: {stats['records']} texts, {stats['raw_bytes']} bytes stored in {stats['stored_bytes']} "
+              f"with {stats['codec']} (ratio {stats['ratio']:.1f}), {stats['dead_bytes']} bytes of replaced texts")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import os
+import csv
+import sys
+import time
+import sqlite3
+import argparse
+
+# Local SQLite store of the generated answers, one row per (task, question id, model).
+# The generators upsert every answer as it is written to their CSV, and collaborators' CSV files
+# (e.g. *_luca.csv) are imported into the same table, so merging runs no longer needs the
+# concat / drop_duplicates / pivot steps of the cleaning notebooks to be rebuilt from scratch.
+# A later answer replaces an earlier one, as keep='last' in most cleaning notebooks, except that an
+# "Error: ..." response never replaces a good answer. The math notebook is the exception: it keeps the
+# first deepseek-r1 answer of every uuid (keep='first'), so import those CSVs newest first to reproduce it.
+
+# Id column of the answer CSVs of every task
+TASK_ID_COLUMNS = {
+    "math": "uuid",
+    "proofs": "uuid",
+    "verbal": "id",
+    "essay_evaluation": "QuestionID",
+    "reading_comprehension": "QuestionID",
+    "critical_reasoning": "QuestionID",
+}
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  "data", "generated_data", "answers.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    task TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response TEXT,
+    time_taken_seconds REAL,
+    is_error INTEGER NOT NULL DEFAULT 0,
+    source TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (task, question_id, model)
+);
+CREATE INDEX IF NOT EXISTS answers_task_model ON answers (task, model, is_error);
+"""
+
+UPSERT = """
+INSERT INTO answers (task, question_id, model, response, time_taken_seconds, is_error, source, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (task, question_id, model) DO UPDATE SET
+    response = excluded.response,
+    time_taken_seconds = excluded.time_taken_seconds,
+    is_error = excluded.is_error,
+    source = excluded.source,
+    updated_at = excluded.updated_at
+WHERE excluded.is_error = 0 OR answers.is_error = 1
+"""
+
+
+def is_error(response):
+    return response is None or str(response).startswith("Error:")
+
+def _seconds(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class AnswerStore:
+    """SQLite table of generated answers keyed by (task, question id, model)."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Several generator runs may write to the same store: wait for locks instead of failing
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _row(self, task, question_id, model, response, time_taken, source):
+        return (task, str(question_id), model, response, _seconds(time_taken), int(is_error(response)), source, time.time())
+
+    def upsert(self, task, question_id, model, response, time_taken=None, source=None):
+        """Writes one answer, replacing the stored one unless this is an error and the stored one is not."""
+        with self.conn:
+            self.conn.execute(UPSERT, self._row(task, question_id, model, response, time_taken, source))
+
+    def import_csv(self, path, task, source=None):
+        """
+        Upserts every row of an answer CSV in one transaction, in file order, so the last row of a
+        (question id, model) pair wins. Returns the number of rows read.
+        """
+        id_col = TASK_ID_COLUMNS[task]
+        source = source or os.path.basename(path)
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            rows = [self._row(task, row[id_col], row["model"], row["response"], row.get("time_taken_seconds"), source)
+                    for row in csv.DictReader(f)]
+        with self.conn:
+            self.conn.executemany(UPSERT, rows)
+        return len(rows)
+
+    def models(self, task):
+        return [m for (m,) in self.conn.execute(
+            "SELECT DISTINCT model FROM answers WHERE task = ? ORDER BY model", (task,))]
+
+    def counts(self, task):
+        """Number of good and of error answers per model."""
+        return self.conn.execute(
+            "SELECT model, SUM(is_error = 0), SUM(is_error) FROM answers WHERE task = ? GROUP BY model ORDER BY model",
+            (task,)).fetchall()
+
+    def complete_ids(self, task, models=None):
+        """Question ids with a good answer from every model (every model of the task by default)."""
+        models = models or self.models(task)
+        if not models:
+            return []
+        placeholders = ",".join("?" * len(models))
+        return [q for (q,) in self.conn.execute(
+            f"SELECT question_id FROM answers WHERE task = ? AND is_error = 0 AND model IN ({placeholders}) "
+            f"GROUP BY question_id HAVING COUNT(DISTINCT model) = ? ORDER BY question_id",
+            (task, *models, len(models)))]
+
+    def wide(self, task, models=None, complete_only=True):
+        """
+        One row per question id with a response column and a '{model}_time' column per model, as the
+        pivots of the cleaning notebooks. Error answers are left empty. Returns (header, rows).
+        """
+        models = models or self.models(task)
+        if not models:
+            raise ValueError(f"No answers stored for task '{task}'.")
+        columns = ["MAX(CASE WHEN model = ? THEN response END)" for _ in models]
+        columns += ["MAX(CASE WHEN model = ? THEN time_taken_seconds END)" for _ in models]
+        query = f"SELECT question_id, {', '.join(columns)} FROM answers WHERE task = ? AND is_error = 0"
+        query += f" AND model IN ({','.join('?' * len(models))})"
+        params = [*models, *models, task, *models]
+        query += " GROUP BY question_id"
+        if complete_only:
+            query += " HAVING COUNT(DISTINCT model) = ?"
+            params.append(len(models))
+        query += " ORDER BY question_id"
+        header = [TASK_ID_COLUMNS[task], *models, *(f"{m}_time" for m in models)]
+        return header, self.conn.execute(query, params).fetchall()
+
+    def export_csv(self, path, task, models=None, complete_only=True):
+        header, rows = self.wide(task, models, complete_only)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge answer CSVs into the SQLite answer store and export wide tables from it.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Path of the SQLite answer store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Upsert the rows of one or more answer CSV files.")
+    import_parser.add_argument("--task", required=True, choices=sorted(TASK_ID_COLUMNS))
+    import_parser.add_argument("csv_files", nargs="+")
+
+    status_parser = subparsers.add_parser("status", help="Answers per model and number of complete question ids.")
+    status_parser.add_argument("--task", required=True, choices=sorted(TASK_ID_COLUMNS))
+
+    export_parser = subparsers.add_parser("export", help="Write the wide table of a task (one column per model).")
+    export_parser.add_argument("--task", required=True, choices=sorted(TASK_ID_COLUMNS))
+    export_parser.add_argument("--output", required=True)
+    export_parser.add_argument("--models", help="Comma-separated models to export. Defaults to every model of the task.")
+    export_parser.add_argument("--include-incomplete", action="store_true",
+                               help="Also export question ids that some model has not answered.")
+
+    args = parser.parse_args()
+    with AnswerStore(args.store) as store:
+        if args.command == "import":
+            for path in args.csv_files:
+                if not os.path.exists(path):
+                    print(f"Error: CSV file not found at {path}")
+                    sys.exit(1)
+                print(f"Imported {store.import_csv(path, args.task)} rows from {path}")
+        elif args.command == "status":
+            for model, good, errors in store.counts(args.task):
+                print(f"{model}: {good} answers, {errors} errors")
+            print(f"Complete across all models: {len(store.complete_ids(args.task))}")
+        else:
+            models = args.models.split(",") if args.models else None
+            try:
+                count = store.export_csv(args.output, args.task, models, complete_only=not args.include_incomplete)
+            except ValueError as e:
+                print(f"Error: {e}")
+                sys.exit(1)
+            print(f"Exported {count} question ids to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+from importlib.util import find_spec
+from pipeline import ROOT, DATA_DIR, GENERATORS, TASKS, BLOCKING, Pipeline, default_stages, read_lines
+
+# One entry point for every script of the project:
+#   python scripts/cli.py <command> [script arguments]
+# Script commands are only resolved to their module when they are run, and the scripts import torch,
+# transformers, ollama, scikit-learn and scipy.stats where they are first needed, so the top-level help,
+# a script's --help or an argument error never pay for them. The quick commands (status, dry-run,
+# validate) only read files and hash what changed. check-imports is the import-time budget test: every
+# module is imported in a fresh interpreter, timed and checked for heavy modules loaded at import.
+
+# command -> (directory relative to the project root, module, cwd the script expects or None, summary)
+COMMANDS = {
+    "answers": ("scripts", "answer_store", None, "Import, inspect and export the SQLite answer store"),
+    "judge": ("scripts", "cr_judge", None, "Rank the critical reasoning answers with an LLM judge"),
+    "pipeline": ("scripts", "pipeline", None, "Run the pipeline stages whose inputs changed"),
+    "parse": (f"{DATA_DIR}/jpynb_data_cleaning", "response_parsing", None, "Parse the raw answers of a generator CSV"),
+    "correctness": (f"{DATA_DIR}/jpynb_data_cleaning", "correctness", None,
+                    "Check the final answers against the references: exact, letter, numeric and symbolic"),
+    "embed": (f"{DATA_DIR}/Cosine_calculator_semantic", "cosine_similarity_calculator", None,
+              "Semantic cosine similarities of one NLP_analysis table"),
+    "embed-all": (f"{DATA_DIR}/Cosine_calculator_semantic", "cosine_calculator", None,
+                  "Semantic cosine similarities of every NLP_analysis table, one model load per embedding model"),
+    "ann": (f"{DATA_DIR}/Cosine_calculator_semantic", "ann_index", None, "Nearest-neighbour index over the stored embeddings"),
+    "metrics": (f"{DATA_DIR}/syntactic_and semantic_ analysis", "syntactic_metrics", None, "BLEU, METEOR, ROUGE-L and n-gram overlap"),
+    "tfidf": (f"{DATA_DIR}/syntactic_and semantic_ analysis", "tfidf_similarity", None, "TF-IDF cosine similarities"),
+    "cache": (DATA_DIR, "data_access", None, "Build or check the Parquet caches of the analysis tables"),
+    "tokens": (DATA_DIR, "token_stats", None, "Token counts of the problems and reasonings"),
+    "traces": (DATA_DIR, "trace_store", None, "Compressed random-access store of the responses and think traces"),
+    "stats": (DATA_DIR, "model_stats", None, "Pairwise model comparisons across tasks and metrics"),
+}
+# Imported by a command only when it does the actual work
+HEAVY_MODULES = ["torch", "transformers", "ollama", "onnxruntime", "sklearn", "scipy.stats"]
+# Python packages needed by each part of the pipeline, checked by validate without importing them
+REQUIREMENTS = {
+    "generate, judge": ["ollama", "pandas"],
+    "parse, stats, cache": ["pandas", "numpy", "scipy", "pyarrow", "xxhash"],
+    "embed": ["torch", "transformers", "tqdm"],
+    "metrics, tfidf": ["nltk", "sklearn"],
+}
+QUICK_BUDGET = 0.5
+MODULE_BUDGET = 1.5
+LFS_POINTER = b"version https://git-lfs"
+
+
+def generator_command(task):
+    script = GENERATORS[task][0]
+    return "scripts", os.path.splitext(script)[0], None, f"Ask the {task} questions to an Ollama model"
+
+def resolve(argv):
+    """(directory, module, cwd, arguments) of a script command line, or None for the built-in commands."""
+    if argv[0] == "generate":
+        if len(argv) < 2 or argv[1] not in GENERATORS:
+            raise ValueError(f"generate expects a task, one of {TASKS}.")
+        directory, module, cwd, _ = generator_command(argv[1])
+        return directory, module, cwd, argv[2:]
+    if argv[0] in COMMANDS:
+        directory, module, cwd, _ = COMMANDS[argv[0]]
+        return directory, module, cwd, argv[1:]
+    return None
+
+def run_script(directory, module, cwd, arguments):
+    """Runs module.main() in this process, as 'python <directory>/<module>.py arguments' would."""
+    path = os.path.join(ROOT, directory)
+    # The scripts import their siblings from their own folder
+    sys.path.insert(0, path)
+    if cwd:
+        os.chdir(os.path.join(ROOT, cwd))
+    sys.argv = [os.path.join(path, module + ".py")] + list(arguments)
+    importlib.import_module(module).main()
+
+def command_modules():
+    modules = [(directory, module) for directory, module, _, _ in COMMANDS.values()]
+    modules += [generator_command(task)[:2] for task in TASKS]
+    return sorted(set(modules))
+
+
+def check(ok, message, problems):
+    print(f"[{'ok' if ok else 'problem'}] {message}")
+    if not ok:
+        problems.append(message)
+
+def validate():
+    """Checks the files and packages every stage needs, without importing any of them. Returns the problems."""
+    problems = []
+    check(bool(read_lines(os.path.join(ROOT, "models.txt"))), "models.txt lists the models to query", problems)
+    berts = read_lines(os.path.join(ROOT, DATA_DIR, "Cosine_calculator_semantic", "berts.txt"))
+    check(len(berts) >= 2, "berts.txt lists the math and text embedding models", problems)
+    for task, (script, dataset, prompt) in GENERATORS.items():
+        for path in (f"scripts/{script}", dataset, f"data/prompts/{prompt}"):
+            check(os.path.exists(os.path.join(ROOT, path)), f"{task}: {path}", problems)
+    for directory, module in command_modules():
+        check(os.path.exists(os.path.join(ROOT, directory, module + ".py")), f"script {directory}/{module}.py", problems)
+    for task in TASKS:
+        path = os.path.join(DATA_DIR, "NLP_analysis", f"{task}_analysis.csv")
+        full = os.path.join(ROOT, path)
+        if not os.path.exists(full):
+            check(False, f"{path} exists", problems)
+            continue
+        with open(full, "rb") as f:
+            # An LFS file that was never pulled is a short text pointer instead of the table
+            pointer = f.read(len(LFS_POINTER)) == LFS_POINTER
+        check(not pointer, f"{path}: " + ("git-lfs pointer, run 'git lfs pull'" if pointer else "checked out"), problems)
+    for part, packages in REQUIREMENTS.items():
+        missing = [p for p in packages if find_spec(p) is None]
+        check(not missing, f"{part}: " + (f"missing {', '.join(missing)}" if missing else ", ".join(packages)), problems)
+    return problems
+
+
+def import_time(directory, module):
+    """Seconds to import module in a fresh interpreter, and the heavy modules the import loaded."""
+    probe = (
+        "import sys, time; "
+        f"sys.path.insert(0, {os.path.join(ROOT, directory)!r}); "
+        f"start = time.perf_counter(); import {module}; seconds = time.perf_counter() - start; "
+        f"print(seconds); print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr.strip()}")
+    seconds, heavy = result.stdout.splitlines()[-2:]
+    return float(seconds), [m for m in heavy.split(",") if m]
+
+def check_imports(quick_budget=QUICK_BUDGET, module_budget=MODULE_BUDGET):
+    """
+    The import-time budget test: the CLI and the pipeline (what the quick commands load) must import within
+    quick_budget seconds, every script within module_budget, and none of them may import a heavy module.
+    Returns the problems.
+    """
+    problems = []
+    targets = [("scripts", "cli", quick_budget), ("scripts", "pipeline", quick_budget)]
+    targets += [(directory, module, module_budget) for directory, module in command_modules() if module != "pipeline"]
+    for directory, module, budget in targets:
+        try:
+            seconds, heavy = import_time(directory, module)
+        except RuntimeError as e:
+            check(False, str(e), problems)
+            continue
+        message = f"{module}: {seconds:.2f}s (budget {budget:.2f}s)" + (f", imports {', '.join(heavy)}" if heavy else "")
+        check(seconds <= budget and not heavy, message, problems)
+    return problems
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    try:
+        script = resolve(argv) if argv else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+    if script is not None:
+        run_script(*script)
+        return
+
+    commands = [f"  generate <task>  Ask the questions of a task to an Ollama model ({', '.join(TASKS)})"]
+    commands += [f"  {name:<15}  {summary}" for name, (_, _, _, summary) in COMMANDS.items()]
+    parser = argparse.ArgumentParser(
+        description="Entry point for every script of the project. Script commands take the arguments of the script\n"
+                    "(see '<command> --help'); heavy packages are only imported by the command that needs them.",
+        epilog="script commands:\n" + "\n".join(commands),
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="{status,dry-run,validate,check-imports} | script command")
+    for name, help_text in [("status", "Show which pipeline stages are up to date and why the others would run."),
+                            ("dry-run", "Print the commands 'pipeline.py run' would execute, without running them.")]:
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("targets", nargs="*", help="Stages to check (default: all). Dependencies are included.")
+        sub.add_argument("--models", help="Comma-separated models for the generate stages (default: models.txt).")
+    subparsers.add_parser("validate", help="Check the inputs, prompts, model lists and packages of every stage.")
+    sub = subparsers.add_parser("check-imports", help="Import-time budget test of the CLI and of every script.")
+    sub.add_argument("--quick-budget", type=float, default=QUICK_BUDGET, help="Seconds allowed for the modules of the quick commands.")
+    sub.add_argument("--module-budget", type=float, default=MODULE_BUDGET, help="Seconds allowed for every script module.")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command in ("status", "dry-run"):
+        pipeline = Pipeline(default_stages(args.models.split(",") if args.models else None))
+        try:
+            status = pipeline.run(args.targets, dry_run=True)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if args.command == "dry-run":
+            for name, state in status.items():
+                if state == "would run":
+                    stage = pipeline.stages[name]
+                    for command in stage.commands:
+                        print(f"  ({os.path.relpath(stage.cwd, ROOT)}) " + subprocess.list2cmdline(command))
+        failed = any(s in BLOCKING for s in status.values())
+    elif args.command == "validate":
+        failed = bool(validate())
+    elif args.command == "check-imports":
+        failed = bool(check_imports(args.quick_budget, args.module_budget))
+    else:
+        parser.print_help()
+        return
+    print(f"{args.command} finished in {time.perf_counter() - start:.2f}s")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,21 @@
 import pandas as pd
-import ollama
 import json
 import random
 import os
+import sys
+import argparse
 from datetime import datetime
 import time
+import instrumentation
 
 class GMATJudge:
     def __init__(self, system_prompt_file, csv_file, judge_model="deepseek-r1:32b"):
         self.system_prompt_file = system_prompt_file
         self.csv_file = csv_file
         self.judge_model = judge_model
-        self.system_prompt = self._load_system_prompt()
-        self.data = self._load_csv_data()
+        with instrumentation.span("load"):
+            self.system_prompt = self._load_system_prompt()
+            self.data = self._load_csv_data()
         
         # Model names for mapping
         self.model_names = [
@@ -63,20 +66,24 @@ class GMATJudge:
     
     def _query_ollama(self, prompt, max_retries=3):
         """Query the Ollama model with retry logic."""
+        import ollama
+
         for attempt in range(max_retries):
             try:
-                response = ollama.generate(
-                    model=self.judge_model,
-                    prompt=prompt,
-                    system=self.system_prompt,
-                    options={
-                        "temperature": 0.1,  # Low temperature for consistency
-                        "top_p": 0.9
-                    }
-                )
+                with instrumentation.span("infer", model=self.judge_model):
+                    response = ollama.generate(
+                        model=self.judge_model,
+                        prompt=prompt,
+                        system=self.system_prompt,
+                        options={
+                            "temperature": 0.1,  # Low temperature for consistency
+                            "top_p": 0.9
+                        }
+                    )
                 return response['response'].strip()
             except Exception as e:
                 print(f"Attempt {attempt + 1} failed: {e}")
+                instrumentation.count("judge_failed_attempts", model=self.judge_model)
                 if attempt < max_retries - 1:
                     time.sleep(2 ** attempt)  # Exponential backoff
                 else:
@@ -158,7 +165,9 @@ Question ID: {question_id}
             
             if not judge_response:
                 print(f"Failed to get response for question {row['QuestionID']}")
+                instrumentation.count("judged_questions", status="error")
                 continue
+            instrumentation.count("judged_questions", status="ok")
             
             # Parse the ranking
             ranking = self._parse_judge_response(judge_response)
@@ -198,20 +207,27 @@ Question ID: {question_id}
         
         print("Evaluation completed!")
     
-    def save_results(self):
-        """Save all results to files."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def save_results(self, eval_results_file=None):
+        """
+        Save all results to files: the rankings to eval_results_file and the raw judge outputs to a JSON
+        file next to it. Without eval_results_file both get timestamped names in the working directory.
+        """
+        if eval_results_file:
+            judge_output_file = os.path.splitext(eval_results_file)[0] + "_outputs.json"
+        else:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            judge_output_file = f"judge_outputs_{timestamp}.json"
+            eval_results_file = f"evaluation_results_{timestamp}.csv"
         
         # Save judge outputs as JSON
-        judge_output_file = f"judge_outputs_{timestamp}.json"
-        with open(judge_output_file, 'w', encoding='utf-8') as f:
+        with instrumentation.span("io"), open(judge_output_file, 'w', encoding='utf-8') as f:
             json.dump(self.judge_outputs, f, indent=2, ensure_ascii=False)
         print(f"Judge outputs saved to: {judge_output_file}")
         
         # Save evaluation results as CSV
-        eval_results_file = f"evaluation_results_{timestamp}.csv"
         eval_df = pd.DataFrame(self.evaluation_results)
-        eval_df.to_csv(eval_results_file, index=False)
+        with instrumentation.span("io"):
+            eval_df.to_csv(eval_results_file, index=False)
         print(f"Evaluation results saved to: {eval_results_file}")
         
         return judge_output_file, eval_results_file
@@ -256,42 +272,91 @@ Question ID: {question_id}
         return model_stats
 
 def main():
-    # Configuration
-    SYSTEM_PROMPT_FILE = "../data/prompts/judge_gmat_cr.txt"
-    CSV_FILE = "../data/NLP_analysis/critical_reasoning_analysis.csv"  # Replace with your actual CSV file name
-    JUDGE_MODEL = "gemma3:1b"
+    # Determine the project root directory (the script is in the 'scripts' subdirectory)
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(
+        description="Rank the four models' critical reasoning answers with an LLM judge via Ollama.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+
+    parser.add_argument(
+        "--csv",
+        default=os.path.join(project_root, "Data_cleaning_cosine_calculation_semantic_and_analysis", "NLP_analysis",
+                             "critical_reasoning_analysis.csv"),
+        help="Critical reasoning analysis table with the questions and the answers of every model."
+    )
+
+    parser.add_argument(
+        "--prompt",
+        default=os.path.join(project_root, "data", "prompts", "judge_gmat_cr.txt"),
+        help="System prompt of the judge."
+    )
+
+    parser.add_argument(
+        "--model",
+        default="gemma3:1b",
+        help="The name of the Ollama model used as judge."
+    )
+
+    parser.add_argument(
+        "--output",
+        help="Path of the evaluation results CSV; the raw judge outputs go to <output>_outputs.json.\n"
+             "Timestamped files in the working directory if not specified."
+    )
+
+    parser.add_argument(
+        "--metrics-dir",
+        help="Optional directory for timing metrics: JSONL events and a Prometheus text file (see instrumentation.py)."
+    )
+
+    parser.add_argument(
+        "--profile",
+        choices=instrumentation.PROFILERS,
+        help="With --metrics-dir, also profile the run with cProfile or a stack sampler."
+    )
+
+    args = parser.parse_args()
     
     # Check if files exist
-    if not os.path.exists(SYSTEM_PROMPT_FILE):
-        print(f"Error: System prompt file '{SYSTEM_PROMPT_FILE}' not found.")
-        return
+    if not os.path.exists(args.prompt):
+        print(f"Error: System prompt file '{args.prompt}' not found.")
+        sys.exit(1)
     
-    if not os.path.exists(CSV_FILE):
-        print(f"Error: CSV file '{CSV_FILE}' not found.")
-        return
+    if not os.path.exists(args.csv):
+        print(f"Error: CSV file '{args.csv}' not found.")
+        sys.exit(1)
     
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    if args.metrics_dir:
+        instrumentation.configure(args.metrics_dir, "cr_judge", profile=args.profile, judge=args.model)
+
     # Initialize the judge
     judge = GMATJudge(
-        system_prompt_file=SYSTEM_PROMPT_FILE,
-        csv_file=CSV_FILE,
-        judge_model=JUDGE_MODEL
+        system_prompt_file=args.prompt,
+        csv_file=args.csv,
+        judge_model=args.model
     )
     
     # Run evaluation
     try:
         judge.evaluate_all_questions()
-        judge.save_results()
+        judge.save_results(args.output)
         judge.generate_summary_statistics()
     except KeyboardInterrupt:
         print("\nEvaluation interrupted by user.")
         if judge.evaluation_results:
             print("Saving partial results...")
-            judge.save_results()
+            judge.save_results(args.output)
+        # Partial results are not a finished run (the pipeline would record them as up to date)
+        sys.exit(1)
     except Exception as e:
         print(f"An error occurred: {e}")
         if judge.evaluation_results:
             print("Saving partial results...")
-            judge.save_results()
+            judge.save_results(args.output)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import atexit
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+# Lightweight instrumentation shared by the generators, the judge, the cosine calculator and the metrics code.
+# Spans (load, tokenize, infer, io, queue_wait, ...), counters and histograms are recorded in memory and,
+# once configure() has been called with a metrics directory, exported as:
+#   <stage>.jsonl   -> one JSON event per span / counter increment / observation, appended in batches
+#   <stage>.prom    -> Prometheus text exposition of the totals, rewritten at every flush
+#   <stage>.prof    -> cProfile stats (profile="cprofile"), readable with pstats or snakeviz
+#   <stage>.folded  -> sampled stacks in folded format (profile="sample"), the format of py-spy --format raw,
+#                      readable with flamegraph.pl, speedscope or inferno
+# Without configure() every call is a cheap no-op, so instrumented code runs unchanged.
+
+PROFILERS = ["cprofile", "sample"]
+# Histogram buckets in seconds, from a tokenizer call to a long model generation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _metric_name(name):
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval and counts the folded stacks."""
+
+    def __init__(self, thread_id, interval=0.01):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+
+
+class Recorder:
+    """In-memory spans, counters and histograms of one process, with JSONL and Prometheus export."""
+
+    def __init__(self):
+        self.stage = None
+        self.metrics_dir = None
+        self.labels = {}
+        self._pid = None
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._events = []
+        self._last_flush = time.time()
+        self.flush_every = 200
+        self.flush_interval = 30.0
+        self._profiler = None
+        self._sampler = None
+
+    @property
+    def enabled(self):
+        # Worker processes forked from an instrumented parent record nothing: only the configuring process exports
+        return self._pid is not None and self._pid == os.getpid()
+
+    def configure(self, metrics_dir, stage, profile=None, sample_interval=0.01, **labels):
+        """Starts recording for this process under the given stage name. labels are added to every metric."""
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError(f"Unknown profiler '{profile}', expected one of {PROFILERS}.")
+        self.metrics_dir, self.stage, self.labels = metrics_dir, stage, labels
+        os.makedirs(metrics_dir, exist_ok=True)
+        self._pid = os.getpid()
+        if profile == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif profile == "sample":
+            self._sampler = StackSampler(threading.main_thread().ident, sample_interval)
+            self._sampler.start()
+        atexit.register(self.close)
+
+    def _path(self, extension):
+        return os.path.join(self.metrics_dir, f"{self.stage}{extension}")
+
+    def _record(self, event):
+        event.update(ts=time.time(), stage=self.stage, pid=self._pid)
+        self._events.append(event)
+        if len(self._events) >= self.flush_every or event["ts"] - self._last_flush >= self.flush_interval:
+            self._flush_locked()
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        labels = {**self.labels, **labels}
+        with self._lock:
+            key = _key(name, labels)
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._record({"type": "counter", "name": name, "labels": labels, "value": value})
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        labels = {**self.labels, **labels}
+        with self._lock:
+            key = _key(name, labels)
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+            self._histograms[key].observe(value)
+            self._record({"type": "observation", "name": name, "labels": labels, "value": value})
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Times the enclosed block as a 'span_seconds' observation with span=name."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            labels = {**self.labels, **labels, "span": name}
+            with self._lock:
+                key = _key("span_seconds", labels)
+                if key not in self._histograms:
+                    self._histograms[key] = Histogram()
+                self._histograms[key].observe(duration)
+                self._record({"type": "span", "name": name, "labels": labels, "duration": duration, "error": error})
+
+    def prometheus_text(self):
+        lines = []
+        for (name, labels), value in sorted(self._counters.items()):
+            metric = _metric_name(name) + "_total"
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            metric = _metric_name(name)
+            cumulative = 0
+            for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def _flush_locked(self):
+        if self._events:
+            with open(self._path(".jsonl"), "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(e, default=str) + "\n" for e in self._events))
+            self._events = []
+        # Through a temporary file, so that a scraper never reads a half-written exposition
+        tmp_path = self._path(".prom.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, self._path(".prom"))
+        self._last_flush = time.time()
+
+    def flush(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Stops the profilers, writes their output and flushes every pending event."""
+        if not self.enabled:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self._path(".prof"))
+            self._profiler = None
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.write(self._path(".folded"))
+            self._sampler = None
+        self.flush()
+
+
+# Process-wide recorder used through the module-level functions
+recorder = Recorder()
+configure = recorder.configure
+span = recorder.span
+count = recorder.count
+observe = recorder.observe
+flush = recorder.flush
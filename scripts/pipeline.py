@@ -0,0 +1,327 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+import subprocess
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import xxhash
+
+# Incremental runner for the generate -> clean -> embed -> metrics -> judge -> stats pipeline.
+# Every stage declares the commands it runs and the files it reads and writes (paths or glob patterns relative
+# to the project root). The runner hashes the content of the inputs and outputs, records them in a state file
+# after every successful stage, and on the next run only recomputes the stages whose commands or inputs changed,
+# or whose outputs were modified or deleted since. A stage depends on every stage writing one of its inputs,
+# and stages without a dependency between them run in parallel.
+# The NLP_analysis tables are still built by the cleaning notebooks, so they are source inputs of the
+# embed and metrics stages rather than outputs of a stage.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = "Data_cleaning_cosine_calculation_semantic_and_analysis"
+DEFAULT_STATE_PATH = os.path.join(ROOT, ".pipeline_state.json")
+
+# task -> (generator script, dataset, prompt file); output is data/generated_data/<task>_answers.csv
+GENERATORS = {
+    "math": ("math_answer_generator.py", "data/datasets/math_questions_pool_1.csv", "math_question_prompt.txt"),
+    "proofs": ("proofs_answer_generator.py", "data/datasets/proofs_question_pool.csv", "proof_question_prompt.txt"),
+    "reading_comprehension": ("reading_comprehension_answer_generator.py", "data/datasets/reading_comprehension_pool.csv",
+                              "reading_comprehension_prompt.txt"),
+    "critical_reasoning": ("verbal_answer_generator_1.py", "data/datasets/critical_reasoning.db", "critical_reasoning_prompt.txt"),
+    "essay_evaluation": ("essays_evaluation_answer_generator.py", "data/datasets/ielts_essays_questions.csv",
+                         "essay_evaluation_prompt.txt"),
+}
+TASKS = list(GENERATORS)
+MATH_TASKS = ["math", "proofs"]
+# Statuses that stop the stages downstream
+BLOCKING = ("failed", "blocked", "missing input")
+
+
+class Stage:
+    """One node of the pipeline: argv commands run in order from cwd, with declared input and output paths."""
+
+    def __init__(self, name, commands, inputs, outputs=(), cwd=ROOT):
+        self.name = name
+        self.commands = [[str(arg) for arg in command] for command in commands]
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.cwd = cwd
+
+    def signature(self):
+        return json.dumps({"commands": self.commands, "cwd": os.path.relpath(self.cwd, ROOT)}, sort_keys=True)
+
+
+def read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def default_stages(models=None):
+    """The stages of this repository, for the models of models.txt unless models is given."""
+    python = sys.executable
+    models = models or read_lines(os.path.join(ROOT, "models.txt"))
+    berts = read_lines(os.path.join(ROOT, DATA_DIR, "Cosine_calculator_semantic", "berts.txt"))
+    analysis = f"{DATA_DIR}/NLP_analysis"
+    stages = []
+
+    for task, (script, dataset, prompt) in GENERATORS.items():
+        answers = f"data/generated_data/{task}_answers.csv"
+        # The generators append: the first model rewrites the file so that a rerun does not duplicate rows
+        commands = [[python, f"scripts/{script}", "--model", model] + (["--reset-output"] if i == 0 else [])
+                    for i, model in enumerate(models)]
+        stages.append(Stage(f"generate:{task}", commands, [f"scripts/{script}", dataset, f"data/prompts/{prompt}", "models.txt"],
+                            [answers]))
+        stages.append(Stage(f"clean:{task}",
+                            [[python, f"{DATA_DIR}/jpynb_data_cleaning/response_parsing.py", "--input", answers, "--task", task]],
+                            [answers, f"{DATA_DIR}/jpynb_data_cleaning/response_parsing.py"],
+                            [f"data/generated_data/{task}_answers_parsed.csv"]))
+
+        table = f"{analysis}/{task}_analysis.csv"
+        if len(berts) >= 2:
+            stages.append(Stage(f"embed:{task}",
+                                [[python, f"{DATA_DIR}/Cosine_calculator_semantic/cosine_similarity_calculator.py",
+                                  "--input", table, "--embedding_model", berts[0] if task in MATH_TASKS else berts[1]]],
+                                [table, f"{DATA_DIR}/Cosine_calculator_semantic/*.py",
+                                 f"{DATA_DIR}/Cosine_calculator_semantic/berts.txt"],
+                                [f"{analysis}/{task}_analysis_cosine.csv"]))
+        stages.append(Stage(f"metrics:{task}",
+                            [[python, f"{DATA_DIR}/syntactic_and semantic_ analysis/syntactic_metrics.py", "--inputs", table],
+                             [python, f"{DATA_DIR}/syntactic_and semantic_ analysis/tfidf_similarity.py", "--inputs", table]],
+                            [table, f"{DATA_DIR}/syntactic_and semantic_ analysis/*.py"],
+                            [f"{analysis}/{task}_analysis_syntactic.csv", f"{analysis}/{task}_analysis_tfidf_cosine.csv"]))
+
+    table = f"{analysis}/critical_reasoning_analysis.csv"
+    judged = f"{analysis}/critical_reasoning_judge.csv"
+    stages.append(Stage("judge:critical_reasoning",
+                        [[python, "scripts/cr_judge.py", "--csv", table, "--output", judged]],
+                        ["scripts/cr_judge.py", "data/prompts/judge_gmat_cr.txt", table],
+                        [judged, f"{analysis}/critical_reasoning_judge_outputs.json"]))
+
+    cosine_tables = [f"{analysis}/{task}_analysis_cosine.csv" for task in TASKS]
+    syntactic_tables = [f"{analysis}/{task}_analysis_syntactic.csv" for task in TASKS]
+    stages.append(Stage("stats:cosine",
+                        [[python, f"{DATA_DIR}/model_stats.py", "--inputs", *cosine_tables, "--metrics", "cosine",
+                          "--output", f"{analysis}/model_comparisons_cosine.csv"]],
+                        cosine_tables + [f"{DATA_DIR}/model_stats.py"], [f"{analysis}/model_comparisons_cosine.csv"]))
+    stages.append(Stage("stats:syntactic",
+                        [[python, f"{DATA_DIR}/model_stats.py", "--inputs", *syntactic_tables, "--metrics", "bleu,meteor,rouge_l,ngram_overlap",
+                          "--output", f"{analysis}/model_comparisons_syntactic.csv"]],
+                        syntactic_tables + [f"{DATA_DIR}/model_stats.py"], [f"{analysis}/model_comparisons_syntactic.csv"]))
+    return stages
+
+
+class FileHasher:
+    """xxh3 content hashes of files, reused while a file keeps the same size and mtime."""
+
+    def __init__(self, known=None):
+        self.known = dict(known or {})
+        self._lock = threading.Lock()
+
+    def hash(self, path):
+        full = os.path.join(ROOT, path)
+        if not os.path.isfile(full):
+            return None
+        stat = os.stat(full)
+        with self._lock:
+            entry = self.known.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["hash"]
+        h = xxhash.xxh3_128()
+        with open(full, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        with self._lock:
+            self.known[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": h.hexdigest()}
+        return h.hexdigest()
+
+
+def expand(patterns):
+    """Project-relative paths of the declared patterns; a pattern matching nothing is kept as a missing path."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(os.path.relpath(p, ROOT) for p in glob.glob(os.path.join(ROOT, glob.escape(pattern).replace("[*]", "*"))))
+        paths.extend(matches or [pattern])
+    return sorted(set(paths))
+
+def digest(paths, hasher):
+    return {path: hasher.hash(path) for path in paths}
+
+
+class Pipeline:
+    def __init__(self, stages, state_path=DEFAULT_STATE_PATH):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.state = {"files": {}, "stages": {}}
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        self.hasher = FileHasher(self.state.get("files"))
+        self._lock = threading.Lock()
+        self.dependencies = {name: self._upstream(stage) for name, stage in self.stages.items()}
+
+    def _upstream(self, stage):
+        return sorted(other.name for other in self.stages.values() if other is not stage and any(
+            fnmatch(output, pattern) or fnmatch(pattern, output) for output in other.outputs for pattern in stage.inputs))
+
+    def closure(self, targets):
+        """targets and every stage they depend on, in dependency order."""
+        order, seen = [], set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            order.append(name)
+        for name in targets:
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage '{name}', expected one of {sorted(self.stages)}.")
+            visit(name)
+        return order
+
+    def reason(self, name):
+        """Why a stage has to run, or None when it is up to date."""
+        stage = self.stages[name]
+        inputs = digest(expand(stage.inputs), self.hasher)
+        missing = [p for p, h in inputs.items() if h is None]
+        if missing:
+            return f"missing input {missing[0]}"
+        recorded = self.state["stages"].get(name)
+        if recorded is None:
+            return "never run"
+        if recorded["signature"] != stage.signature():
+            return "command changed"
+        if inputs != recorded["inputs"]:
+            changed = sorted(p for p in inputs if recorded["inputs"].get(p) != inputs[p])
+            return f"input changed: {changed[0]}" if changed else "inputs changed"
+        outputs = digest(expand(stage.outputs), self.hasher)
+        if outputs != recorded["outputs"]:
+            return "outputs changed or missing"
+        return None
+
+    def _record(self, name):
+        stage = self.stages[name]
+        with self._lock:
+            self.state["stages"][name] = {
+                "signature": stage.signature(),
+                "inputs": digest(expand(stage.inputs), self.hasher),
+                "outputs": digest(expand(stage.outputs), self.hasher),
+                "finished_at": time.time(),
+            }
+            self.state["files"] = self.hasher.known
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp_path, self.state_path)
+
+    def _execute(self, name, log_dir=None):
+        stage = self.stages[name]
+        start = time.perf_counter()
+        for command in stage.commands:
+            log = None
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+                log = open(os.path.join(log_dir, name.replace(":", "_") + ".log"), "a", encoding="utf-8")
+            try:
+                result = subprocess.run(command, cwd=stage.cwd, stdout=log, stderr=subprocess.STDOUT if log else None)
+            finally:
+                if log:
+                    log.close()
+            if result.returncode != 0:
+                return False, time.perf_counter() - start
+        return True, time.perf_counter() - start
+
+    def run(self, targets=None, jobs=1, force=(), dry_run=False, log_dir=None):
+        """
+        Runs the stages of targets (every stage by default) that are out of date, as soon as their dependencies
+        are done, at most jobs at a time. A failed stage blocks the stages downstream of it. Returns {stage: status}.
+        """
+        order = self.closure(targets or list(self.stages))
+        status = {}
+        pending = list(order)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            while pending or running:
+                for name in list(pending):
+                    deps = self.dependencies[name]
+                    if any(status.get(d) in BLOCKING for d in deps):
+                        status[name] = "blocked"
+                        pending.remove(name)
+                        print(f"[blocked] {name}")
+                    elif all(d in status for d in deps) and len(running) < max(1, jobs):
+                        pending.remove(name)
+                        if name in force:
+                            why = "forced"
+                        elif any(status[d] == "would run" for d in deps):
+                            why = "upstream would run"
+                        else:
+                            why = self.reason(name)
+                        if why is not None and why.startswith("missing input"):
+                            status[name] = "missing input"
+                            print(f"[missing input] {name} ({why[len('missing input '):]})")
+                        elif why is None:
+                            status[name] = "up to date"
+                            print(f"[up to date] {name}")
+                        elif dry_run:
+                            status[name] = "would run"
+                            print(f"[would run] {name} ({why})")
+                        else:
+                            print(f"[running] {name} ({why})")
+                            running[executor.submit(self._execute, name, log_dir)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    ok, seconds = future.result()
+                    if ok:
+                        self._record(name)
+                    status[name] = "done" if ok else "failed"
+                    print(f"[{status[name]}] {name} in {seconds:.1f}s")
+        return status
+
+    def adopt(self, targets=None):
+        """Records the current inputs and outputs of the stages as up to date, without running them."""
+        for name in self.closure(targets or list(self.stages)):
+            self._record(name)
+            print(f"[adopted] {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the pipeline stages whose inputs changed since their last successful run.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("command", choices=["run", "status", "list", "adopt"],
+                        help="run: recompute out-of-date stages; status: show what would run; list: stages and dependencies;\n"
+                             "adopt: mark the current files as up to date without running anything.")
+    parser.add_argument("targets", nargs="*", help="Stages to bring up to date (default: all). Dependencies are included.")
+    parser.add_argument("--jobs", type=int, default=1, help="Independent stages run at the same time.")
+    parser.add_argument("--force", nargs="*", default=[], help="Stages to run even when up to date.")
+    parser.add_argument("--models", help="Comma-separated models for the generate stages (default: models.txt).")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="Path of the state file.")
+    parser.add_argument("--log-dir", help="Write the output of every stage to <log-dir>/<stage>.log.")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(default_stages(args.models.split(",") if args.models else None), args.state)
+    try:
+        if args.command == "list":
+            for name in pipeline.closure(args.targets or list(pipeline.stages)):
+                deps = pipeline.dependencies[name]
+                print(f"{name}" + (f" <- {', '.join(deps)}" if deps else ""))
+        elif args.command == "adopt":
+            pipeline.adopt(args.targets)
+        else:
+            status = pipeline.run(args.targets, args.jobs, set(args.force), dry_run=args.command == "status", log_dir=args.log_dir)
+            if any(s in BLOCKING for s in status.values()):
+                sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import sys
-import ollama
 import argparse
 import os
 import time # For timing API calls
 import csv # For CSV file operations
+from answer_store import AnswerStore
+import instrumentation
 
 def query_ollama(model_name: str, problem_text: str, sys_prompt:str):
     """
@@ -18,6 +19,7 @@ def query_ollama(model_name: str, problem_text: str, sys_prompt:str):
         A tuple containing the model's response (str) and the time taken (float).
         Returns (error_message, 0) if an error occurs.
     """
+    import ollama
     try:
         start_time = time.time()
         response_data = ollama.generate(
@@ -72,6 +74,22 @@ def main():
         help="If enabled, the output file is cleared and rewritten. Otherwise, results are appended."
     )
 
+    parser.add_argument(
+        "--answer-store",
+        help="Optional path of a SQLite answer store (see answer_store.py). Every answer is also upserted there."
+    )
+
+    parser.add_argument(
+        "--metrics-dir",
+        help="Optional directory for timing metrics: JSONL events and a Prometheus text file (see instrumentation.py)."
+    )
+
+    parser.add_argument(
+        "--profile",
+        choices=instrumentation.PROFILERS,
+        help="With --metrics-dir, also profile the run with cProfile or a stack sampler."
+    )
+
     args = parser.parse_args()
     model_name = args.model
 
@@ -124,6 +142,9 @@ def main():
 
     # Determine file mode for output CSV
     output_file_mode = 'w' if args.reset_output else 'a'
+    answer_store = AnswerStore(args.answer_store) if args.answer_store else None
+    if args.metrics_dir:
+        instrumentation.configure(args.metrics_dir, "proofs_generator", profile=args.profile, model=model_name)
     # Check if header needs to be written (if file is new, empty, or being reset)
     write_header_flag = False
     if output_file_mode == 'w':
@@ -163,7 +184,8 @@ def main():
 
                     print(f"\nProcessing Question UUID: {question_uuid} (Row {current_row_index + 1})...")
 
-                    response_text, time_taken = query_ollama(model_name, problem_text, sys_prompt)
+                    with instrumentation.span("infer"):
+                        response_text, time_taken = query_ollama(model_name, problem_text, sys_prompt)
 
                     result_data = {
                         "uuid": question_uuid,
@@ -179,7 +201,11 @@ def main():
                         print(f"Response received in {time_taken:.2f} seconds.")
                         # print(f"Response snippet: {response_text[:100]}...") # Uncomment for quick check
 
-                    csv_writer.writerow(result_data)
+                    with instrumentation.span("io"):
+                        csv_writer.writerow(result_data)
+                        if answer_store is not None:
+                            answer_store.upsert("proofs", question_uuid, model_name, response_text, time_taken)
+                    instrumentation.count("answers", status="error" if "Error:" in response_text and time_taken == 0 else "ok")
                     processed_count += 1
 
                 if processed_count == 0:
@@ -47,6 +47,11 @@ while IFS= read -r model; do
     # Remove the model to free up space
     ollama rm "$model"
 
+    # Parse the responses appended by this model (resumes after the rows parsed last time)
+    python Data_cleaning_cosine_calculation_semantic_and_analysis/jpynb_data_cleaning/response_parsing.py \
+        --input data/generated_data/proofs_answers.csv \
+        --task proofs
+
     echo "-----------------------------"
 done < models1.txt
 
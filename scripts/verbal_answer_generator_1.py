@@ -1,12 +1,14 @@
 import sys
-import ollama
 import argparse
 import os
 import time
 import csv
 import sqlite3
+from answer_store import AnswerStore
+import instrumentation
 
 def query_ollama(model_name: str, problem_text: str, sys_prompt:str):
+    import ollama
     try:
         start_time = time.time()
         response_data = ollama.generate(
@@ -45,6 +47,22 @@ def main():
         help="If enabled, the output file is cleared and rewritten. Otherwise, results are appended."
     )
 
+    parser.add_argument(
+        "--answer-store",
+        help="Optional path of a SQLite answer store (see answer_store.py). Every answer is also upserted there."
+    )
+
+    parser.add_argument(
+        "--metrics-dir",
+        help="Optional directory for timing metrics: JSONL events and a Prometheus text file (see instrumentation.py)."
+    )
+
+    parser.add_argument(
+        "--profile",
+        choices=instrumentation.PROFILERS,
+        help="With --metrics-dir, also profile the run with cProfile or a stack sampler."
+    )
+
     args = parser.parse_args()
     model_name = args.model
 
@@ -87,6 +105,9 @@ def main():
             sys.exit(1)
 
     output_file_mode = 'w' if args.reset_output else 'a'
+    answer_store = AnswerStore(args.answer_store) if args.answer_store else None
+    if args.metrics_dir:
+        instrumentation.configure(args.metrics_dir, "critical_reasoning_generator", profile=args.profile, model=model_name)
     write_header_flag = False
     if output_file_mode == 'w':
         write_header_flag = True
@@ -119,7 +140,8 @@ def main():
                     continue
 
                 print(f"\nProcessing QuestionID: {question_id} (Row {current_row_index + 1})...")
-                response_text, time_taken = query_ollama(model_name, problem_text, sys_prompt)
+                with instrumentation.span("infer"):
+                    response_text, time_taken = query_ollama(model_name, problem_text, sys_prompt)
 
                 result_data = {
                     "QuestionID": question_id,
@@ -133,7 +155,11 @@ def main():
                 else:
                     print(f"Response received in {time_taken:.2f} seconds.")
 
-                csv_writer.writerow(result_data)
+                with instrumentation.span("io"):
+                    csv_writer.writerow(result_data)
+                    if answer_store is not None:
+                        answer_store.upsert("critical_reasoning", question_id, model_name, response_text, time_taken)
+                instrumentation.count("answers", status="error" if "Error:" in response_text and time_taken == 0 else "ok")
                 processed_count += 1
 
             if processed_count == 0: